@@ -0,0 +1,223 @@
+'''
+analysis 和 backtest 热点函数的基准测试
+
+每个 SymbolStr 生成固定 seed 的随机游走蜡烛, 按 size 逐档计时, 同时用 tracemalloc 记录峰值内存
+结果写成 json, 给了 baseline 的话逐项对比, 变慢超过 tolerance 的标出来并以 1 退出
+
+    python -m benchmarks.bench --out bench.json
+    python -m benchmarks.bench --sizes 1000 100000 --baseline bench.json --out new.json
+
+默认的 size 从 1e3 到 1e7, 全部跑完需要很久, 平时用 --sizes / --symbols / --stages 挑一部分
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable
+import numpy as np
+from tradepy.model import SymbolStr, CandlePeriod
+from tradepy.model.candle import Candle, CandleSeries
+from tradepy.model.signal import Signal
+from tradepy.analysis import get_peaks_valleys, get_signals, get_emas, get_atrs, get_rsis
+from tradepy.analysis.chief import Chief
+from tradepy.analysis.dashboard import Dashboard, _Transaction
+
+STAGE_LIST = ['peaks_valleys', 'signals', 'emas', 'atrs', 'rsis', 'chief', 'trans', 'summarize']
+SIZE_LIST = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+# 随机游走的起始价格, 大概贴近真实行情就行
+_INIT_PRICE_DICT = {
+    SymbolStr.EURUSD: 1.08,
+    SymbolStr.USDJPY: 150.0,
+    SymbolStr.GBPUSD: 1.27,
+    SymbolStr.AUDUSD: 0.66,
+    SymbolStr.USDCHF: 0.88,
+    SymbolStr.USDCAD: 1.36,
+    SymbolStr.NZDUSD: 0.61,
+    SymbolStr.BTCUSD: 60000.0,
+    SymbolStr.ETHUSD: 3000.0,
+    SymbolStr.XAUUSD: 2300.0,
+    SymbolStr.XAGUSD: 27.0,
+    SymbolStr.XBRUSD: 82.0,
+    SymbolStr.XNGUSD: 2.5,
+    SymbolStr.XTIUSD: 78.0,
+    SymbolStr.XPTUSD: 950.0,
+}
+_START_SEC = 1_600_000_000.0
+_PERIOD = CandlePeriod.H1
+_PERIOD_SEC = 3600.0
+
+class _BenchAnalyst:
+    '''
+    valley 买 peak 卖, 只是给 Chief 一个会出信号的策略
+    '''
+    @staticmethod
+    def analyze(candles, peaks:set[Candle], valleys:set[Candle]) -> list[Signal]:
+        return get_signals(candles, valleys, peaks)
+
+class _ZeroFee:
+    @staticmethod
+    def get_commission_fee(order_amt_usd: Decimal) -> Decimal:
+        return Decimal(0)
+
+    @staticmethod
+    def get_swap_fee(symstr:SymbolStr, lot:Decimal, from_sec:float, to_sec:float, is_buy:bool) -> Decimal:
+        return Decimal(0)
+
+def gen_series(symstr:SymbolStr, size:int, seed:int) -> CandleSeries:
+    # 每个 symstr 独立的 seed, 只跑一部分 symstr 时数据也不变
+    rng = np.random.default_rng([seed, list(SymbolStr).index(symstr), size])
+    digits = symstr.point_digits
+    rets = rng.normal(0, 0.002, size)
+    c = np.round(_INIT_PRICE_DICT[symstr] * np.exp(np.cumsum(rets)), digits)
+    o = np.empty_like(c)
+    o[0] = _INIT_PRICE_DICT[symstr]
+    o[1:] = c[:-1]
+    wick = np.abs(rng.normal(0, 0.001, (2, size))) * c
+    h = np.round(np.maximum(o, c) + wick[0], digits)
+    l = np.round(np.minimum(o, c) - wick[1], digits)
+    open_sec = _START_SEC + _PERIOD_SEC * np.arange(size, dtype=np.float64)
+    return CandleSeries(o, h, l, c, open_sec, symstr, _PERIOD)
+
+def _measure(func:Callable, repeat:int, with_mem:bool) -> tuple:
+    # 计时和内存分开跑, tracemalloc 本身会拖慢很多
+    best_sec = float('inf')
+    result = None
+    for _ in range(repeat):
+        start_sec = time.perf_counter()
+        result = func()
+        best_sec = min(best_sec, time.perf_counter() - start_sec)
+    peak_bytes = None
+    if with_mem:
+        result = None
+        tracemalloc.start()
+        try:
+            result = func()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return best_sec, peak_bytes, result
+
+def run(size_list:list[int], symstr_list:list[SymbolStr], stage_list:list[str], seed:int, repeat:int, with_mem:bool, spread:Decimal, use_points:bool=False) -> dict:
+    result_dict = {}
+    for size in size_list:
+        stage_dict = {stage: dict(sec=0.0, peak_mb=None, symbol_cnt=0) for stage in stage_list}
+
+        def record(stage:str, func:Callable, symbol_cnt:int=1):
+            if stage not in stage_dict:
+                return func()
+            sec, peak_bytes, result = _measure(func, repeat, with_mem)
+            row = stage_dict[stage]
+            # 同一 size 所有 symstr 的时间累加, 内存取最大
+            row['sec'] += sec
+            row['symbol_cnt'] += symbol_cnt
+            if peak_bytes is not None:
+                row['peak_mb'] = max(row['peak_mb'] or 0.0, peak_bytes / (1 << 20))
+            return result
+
+        all_tran_list:list[_Transaction] = []
+        for symstr in symstr_list:
+            series = gen_series(symstr, size, seed)
+            if use_points:
+                series = series.with_points()
+            c = series.c
+            peaks, valleys = record('peaks_valleys', lambda: get_peaks_valleys(series))
+            if 'signals' in stage_dict:
+                record('signals', lambda: get_signals(series, valleys, peaks))
+            if 'emas' in stage_dict:
+                record('emas', lambda: get_emas(c, win=60))
+            if 'atrs' in stage_dict:
+                record('atrs', lambda: get_atrs(series.h, series.l, c, win=14))
+            if 'rsis' in stage_dict:
+                record('rsis', lambda: get_rsis(c, win=7))
+            if not {'chief', 'trans', 'summarize'} & stage_dict.keys():
+                continue
+            signal_list = record('chief', lambda: Chief.analyze(series, peaks, valleys, [_BenchAnalyst]))
+            if not signal_list:
+                continue
+            all_tran_list.extend(record('trans', lambda: Dashboard._get_trans(series, signal_list, spread)))
+        if 'summarize' in stage_dict and all_tran_list:
+            # summarize 是把所有 symstr 的 trans 放一起模拟, 只跑一次, symbol_cnt 记参与的 symstr 个数
+            record('summarize',
+                   lambda: Dashboard._summarize_paral_trade_asset_with_alltrans(
+                       list(all_tran_list), Decimal('0.01'), Decimal(10000), Decimal(100), _ZeroFee),
+                   len({tran.symstr for tran in all_tran_list}))
+        for stage, row in stage_dict.items():
+            if row['symbol_cnt']:
+                result_dict[f"{stage}/{size}"] = row
+                peak_str = f"{row['peak_mb']:10.1f}MB" if row['peak_mb'] is not None else ''
+                print(f"{stage:>14} {size:>10} {row['sec']:10.4f}s{peak_str}", flush=True)
+    return result_dict
+
+def compare(result_dict:dict, baseline_dict:dict, tolerance:float, min_diff_sec:float) -> list[str]:
+    '''
+    返回变慢的 key, 相差太小的不算, 避免小 size 的抖动
+    sec 是所有 symstr 加起来的, 比的是每个 symstr 的平均时间; symbol_cnt 不一样的 key 没法比, 标出来跳过
+    '''
+    slow_key_list = []
+    for key, row in result_dict.items():
+        base_row = baseline_dict.get(key)
+        if not base_row:
+            continue
+        if row['symbol_cnt'] != base_row.get('symbol_cnt'):
+            print(f"{key:>24} symbol_cnt {base_row.get('symbol_cnt')} -> {row['symbol_cnt']}, skipped")
+            continue
+        sec, base_sec = row['sec'] / row['symbol_cnt'], base_row['sec'] / base_row['symbol_cnt']
+        ratio = sec / base_sec if base_sec > 0 else float('inf')
+        is_slow = ratio > 1 + tolerance and sec - base_sec > min_diff_sec
+        flag = 'SLOWER' if is_slow else ''
+        print(f"{key:>24} {base_sec:10.4f}s -> {sec:10.4f}s {ratio:6.2f}x {flag}")
+        if is_slow:
+            slow_key_list.append(key)
+    return slow_key_list
+
+def main(argv:list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=lambda s: int(float(s)), nargs='+', default=SIZE_LIST)
+    parser.add_argument('--symbols', nargs='+', default=[str(s) for s in SymbolStr], choices=[str(s) for s in SymbolStr])
+    parser.add_argument('--stages', nargs='+', default=STAGE_LIST, choices=STAGE_LIST)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='取最快的一次')
+    parser.add_argument('--no-mem', action='store_true', help='不测峰值内存')
+    parser.add_argument('--spread', type=Decimal, default=Decimal(1))
+    parser.add_argument('--points', action='store_true', help='用定点模式的 CandleSeries')
+    parser.add_argument('--out', type=Path)
+    parser.add_argument('--baseline', type=Path)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='比 baseline 慢多少算变慢, 0.2 就是 20%%')
+    parser.add_argument('--min-diff-sec', type=float, default=0.005)
+    args = parser.parse_args(argv)
+
+    result_dict = run(args.sizes,
+                      [SymbolStr(s) for s in args.symbols],
+                      args.stages,
+                      args.seed,
+                      args.repeat,
+                      not args.no_mem,
+                      args.spread,
+                      args.points)
+    if args.out:
+        report = dict(
+            meta=dict(python=platform.python_version(),
+                      numpy=np.__version__,
+                      machine=platform.machine(),
+                      seed=args.seed,
+                      points=args.points,
+                      repeat=args.repeat,
+                      created_sec=time.time()),
+            results=result_dict
+        )
+        args.out.write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        baseline_dict = json.loads(args.baseline.read_text())['results']
+        slow_key_list = compare(result_dict, baseline_dict, args.tolerance, args.min_diff_sec)
+        if slow_key_list:
+            print(f"{len(slow_key_list)} stage(s) slower than baseline: {', '.join(slow_key_list)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
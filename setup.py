@@ -8,6 +8,7 @@ setup(
         # list your project's dependencies here
         # e.g., 'requests >= 2.23.0',
         # 'tortoise-orm',
+        'numpy',
         'pandas',
         'plotly',
         'websockets',
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from tradepy.model import SymbolStr, CandlePeriod
+from tradepy.net.aggregator import CandleAggregator
+from tradepy.net.replay import FrameRecorder, ReplayServer
+from tradepy.net.websocket import Websocket
+
+class _Listener:
+    def __init__(self) -> None:
+        self.candle_list = []
+        self.other_list = []
+
+    async def will_connect(self):
+        pass
+
+    async def connected(self, connection):
+        pass
+
+    async def received(self, connection, jsonstr:str):
+        self.other_list.append(json.loads(jsonstr))
+
+    async def received_batch(self, connection, messages:list):
+        self.other_list.extend(messages)
+
+    async def closed(self, e:Exception):
+        pass
+
+    async def candle_closed(self, candle):
+        self.candle_list.append((candle.period, candle.open_sec, candle.o, candle.h, candle.l, candle.c))
+
+def _parse_tick_msg(msg:dict):
+    if msg.get('type') != 'tick':
+        return None
+    return SymbolStr(msg['sym']), msg['sec'], msg['price']
+
+def _parse_tick(jsonstr:str):
+    return _parse_tick_msg(json.loads(jsonstr))
+
+def _write_feed(filepath):
+    recorder = FrameRecorder(filepath)
+    for i in range(2000):
+        msg = dict(type='tick', sym='eurusd', sec=1_600_000_000 + i * 7, price=1.1 + (i * 37 % 101) / 10000)
+        recorder.write(i * 0.001, json.dumps(msg))
+        if i % 100 == 0:
+            recorder.write(i * 0.001, json.dumps(dict(type='status', i=i)))
+    recorder.close()
+
+async def _run(filepath, batch_recv:bool, with_msg_parser:bool) -> _Listener:
+    server = ReplayServer(filepath, speed=None)
+    await server.start()
+    listener = _Listener()
+    aggregator = CandleAggregator(listener,
+                                  [CandlePeriod.M1, CandlePeriod.M5, CandlePeriod.H1],
+                                  _parse_tick,
+                                  _parse_tick_msg if with_msg_parser else None)
+    websocket = Websocket(aggregator, False, 'localhost', server.port,
+                          batch_recv=batch_recv, use_ssl=False, heartbeat_interval_sec=None)
+    try:
+        await websocket.connect()
+    finally:
+        await server.stop()
+    return listener
+
+def test_batch_and_single_modes_close_same_candles(tmp_path):
+    filepath = tmp_path / 'feed.bin'
+    _write_feed(filepath)
+    single = asyncio.run(_run(filepath, False, True))
+    assert len(single.candle_list) > 200
+    assert len(single.other_list) == 20
+    for with_msg_parser in [True, False]:
+        batch = asyncio.run(_run(filepath, True, with_msg_parser))
+        assert batch.candle_list == single.candle_list
+        assert batch.other_list == single.other_list
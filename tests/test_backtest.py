@@ -0,0 +1,84 @@
+import random
+from decimal import Decimal
+from tradepy.model import SymbolStr
+from tradepy.model.signal import Signal
+from tradepy.analysis.dashboard import Dashboard
+from benchmarks.bench import gen_series
+
+def _get_half_spread(symstr:SymbolStr, spread:Decimal) -> Decimal:
+    return spread / (100 if symstr.quote == 'jpy' else pow(10, 4)) / 2
+
+def _get_ref_hits(candle_list, sig_list, sig_idxs, spread:Decimal) -> tuple[list, list, list]:
+    # 逐根蜡烛用 Decimal 比较, 同一根蜡烛 sl tp 都触发算 sl
+    half = _get_half_spread(candle_list[0].symstr, spread)
+    hit_list = []
+    for pos, (signal, idx) in enumerate(zip(sig_list, sig_idxs)):
+        for bar in range(idx + 1, len(candle_list)):
+            candle = candle_list[bar]
+            if signal.is_buy:
+                is_sl, is_tp = candle.l - half <= signal.sl, candle.h - half >= signal.tp
+            else:
+                is_sl, is_tp = candle.h + half >= signal.sl, candle.l + half <= signal.tp
+            if is_sl or is_tp:
+                hit_list.append((bar, idx, pos, not is_sl))
+                break
+    hit_list.sort()
+    return [pos for _,_,pos,_ in hit_list], [bar for bar,_,_,_ in hit_list], [is_tp for _,_,_,is_tp in hit_list]
+
+def _gen_signals(candle_list, spread:Decimal, seed:int) -> tuple[list[Signal], list[int]]:
+    # sl tp 正好等于后面某根蜡烛加减半个 spread 的价格, 或者差一个点, 压在触发的边界上
+    # 差 tiny 的转成 float 之后和边界一样, 只有 Decimal 比较才分得出来
+    rng = random.Random(seed)
+    symstr = candle_list[0].symstr
+    half = _get_half_spread(symstr, spread)
+    point = Decimal(1).scaleb(-symstr.point_digits)
+    tiny = Decimal('1e-20')
+    sig_idxs = sorted(rng.sample(range(len(candle_list) - 1), 200))
+    sig_list = []
+    for idx in sig_idxs:
+        is_buy = rng.random() < 0.5
+        # 有的信号持续时间超过 get_first_hits 向量化检查的轮数
+        max_gap = rng.choice([5, 30, 150])
+        sl_candle, tp_candle = [candle_list[min(idx + rng.randint(1, max_gap), len(candle_list) - 1)] for _ in range(2)]
+        sl_delta, tp_delta = [rng.choice([-point, -tiny, 0, 0, tiny, point]) for _ in range(2)]
+        if is_buy:
+            sl, tp = sl_candle.l - half + sl_delta, tp_candle.h - half + tp_delta
+        else:
+            sl, tp = sl_candle.h + half + sl_delta, tp_candle.l + half + tp_delta
+        candle = candle_list[idx]
+        sig_list.append(Signal(is_buy, candle.c, candle.open_sec, sl, tp, symstr))
+    return sig_list, sig_idxs
+
+def test_first_hits_match_decimal_reference():
+    for symstr in (SymbolStr.EURUSD, SymbolStr.USDJPY):
+        series = gen_series(symstr, 1500, 4)
+        candle_list = series.to_candles()
+        for seed, spread in enumerate([Decimal(0), Decimal('1.3'), Decimal(2)]):
+            sig_list, sig_idxs = _gen_signals(candle_list, spread, seed)
+            expected = _get_ref_hits(candle_list, sig_list, sig_idxs, spread)
+            assert expected[0] and any(expected[2]) and not all(expected[2])
+            for candles in (series, series.with_points(), candle_list):
+                assert Dashboard._get_first_hits(candles, sig_list, sig_idxs, spread) == expected
+
+def test_first_hits_window_matches_reference():
+    # 和 walk-forward 一样一段一段检查, 合起来和 Decimal 逐根比较一样
+    series = gen_series(SymbolStr.EURUSD, 900, 8)
+    candle_list = series.to_candles()
+    spread = Decimal('1.3')
+    sig_list, sig_idxs = _gen_signals(candle_list, spread, 3)
+    expected_pos_list, expected_bar_list, expected_is_tp_list = _get_ref_hits(candle_list, sig_list, sig_idxs, spread)
+    hit_list = []
+    pending_list = []
+    for start in range(0, len(series), 100):
+        stop = start + 100
+        pending_list += [pos for pos, idx in enumerate(sig_idxs) if start <= idx < stop]
+        pos_list, bar_list, is_tp_list = Dashboard._get_first_hits(series,
+                                                                   [sig_list[pos] for pos in pending_list],
+                                                                   [sig_idxs[pos] for pos in pending_list],
+                                                                   spread,
+                                                                   start,
+                                                                   stop)
+        hit_list += [(pending_list[pos], bar, is_tp) for pos, bar, is_tp in zip(pos_list, bar_list, is_tp_list)]
+        closed_set = {pending_list[pos] for pos in pos_list}
+        pending_list = [pos for pos in pending_list if pos not in closed_set]
+    assert hit_list == list(zip(expected_pos_list, expected_bar_list, expected_is_tp_list))
@@ -0,0 +1,32 @@
+import numpy as np
+from tradepy.model import SymbolStr
+from tradepy.analysis import get_peaks_valleys, get_me_to_prev_valley, get_me_to_prev_peak
+from benchmarks.bench import gen_series
+
+def test_slice_view_equals_parent_view():
+    series = gen_series(SymbolStr.EURUSD, 300, 3)
+    sl = series[100:]
+    assert sl[0] == series[100]
+    assert hash(sl[0]) == hash(series[100])
+    assert sl[0] != series[101]
+    assert series.with_points()[5] == series[5]
+    assert sl.get_idx(series[150]) == 50
+    assert sl.get_idx(series[50]) is None
+    assert series[::2].get_idx(series[4]) == 2
+    assert series[::2].get_idx(series[3]) is None
+    # 另外建的 series, 数据一样也不是同一根蜡烛
+    other = gen_series(SymbolStr.EURUSD, 300, 3)
+    assert other[100] != series[100]
+    assert other.get_idx(series[100]) is None
+
+def test_parent_pivots_on_slice():
+    series = gen_series(SymbolStr.EURUSD, 300, 3)
+    candle_list = series.to_candles()
+    peaks, valleys = get_peaks_valleys(series)
+    list_peaks, list_valleys = get_peaks_valleys(candle_list)
+    sl = series[100:]
+    list_sl = candle_list[100:]
+    assert {c.idx + 100 for c in sl if c in peaks} == {i + 100 for i, c in enumerate(list_sl) if c in list_peaks}
+    for me_idx in [10, 100, 199]:
+        assert len(get_me_to_prev_valley(sl, me_idx, valleys)) == len(get_me_to_prev_valley(list_sl, me_idx, list_valleys))
+        assert len(get_me_to_prev_peak(sl, me_idx, peaks)) == len(get_me_to_prev_peak(list_sl, me_idx, list_peaks))
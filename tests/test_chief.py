@@ -0,0 +1,68 @@
+from decimal import Decimal
+import numpy as np
+from tradepy.model import SymbolStr
+from tradepy.model.signal import Signal
+from tradepy.analysis import get_peaks_valleys, get_columns
+from tradepy.analysis.chief import Chief
+from benchmarks.bench import gen_series
+
+class _LimitAnalyst:
+    '''
+    挂单价不是收盘价的策略, 每 7 根蜡烛出一个信号
+    '''
+    @staticmethod
+    def analyze(candles, peaks, valleys) -> list[Signal]:
+        signal_list = []
+        for idx in range(0, len(candles), 7):
+            candle = candles[idx]
+            price = candle.c - Decimal('0.0003')
+            signal_list.append(Signal(is_buy=True,
+                                      price=price,
+                                      candle_sec=candle.open_sec,
+                                      sl=price - Decimal('0.0017'),
+                                      tp=price + Decimal('0.0031'),
+                                      symstr=candle.symstr))
+        return signal_list
+
+class _NoopVecAnalyst:
+    @staticmethod
+    def analyze_vec(o, h, l, c, open_sec):
+        bar_cnt = len(c)
+        return np.zeros(bar_cnt, dtype=bool), np.zeros(bar_cnt, dtype=bool), np.full(bar_cnt, np.nan), np.full(bar_cnt, np.nan)
+
+class _CloseVecAnalyst:
+    '''
+    不返回 prices, price 应该是收盘价
+    '''
+    @staticmethod
+    def analyze_vec(o, h, l, c, open_sec):
+        buy_mask = np.zeros(len(c), dtype=bool)
+        buy_mask[3::11] = True
+        return buy_mask, np.zeros(len(c), dtype=bool), c - 0.002, c + 0.004
+
+def _get_keys(signal_list:list[Signal]) -> list[tuple]:
+    return [(s.is_buy, s.price, s.candle_sec, s.sl, s.tp, s.symstr) for s in signal_list]
+
+def _get_candles_list() -> list:
+    series = gen_series(SymbolStr.EURUSD, 500, 7)
+    return [series, series.to_candles()]
+
+def test_noop_vec_analyst_keeps_analyzable_output():
+    for candles in _get_candles_list():
+        peaks, valleys = get_peaks_valleys(candles)
+        expected = Chief.analyze(candles, peaks, valleys, [_LimitAnalyst])
+        actual = Chief.analyze(candles, peaks, valleys, [_LimitAnalyst, _NoopVecAnalyst])
+        assert expected
+        assert _get_keys(actual) == _get_keys(expected)
+        assert [str(s) for s in actual] == [str(s) for s in expected]
+
+def test_vec_analyst_without_prices_uses_close():
+    for candles in _get_candles_list():
+        peaks, valleys = get_peaks_valleys(candles)
+        closes, = get_columns(candles, 'c')
+        idxs, _, prices, _, _ = Chief.analyze_arrays(candles, peaks, valleys, [_LimitAnalyst, _CloseVecAnalyst])
+        for idx, price in zip(idxs.tolist(), prices.tolist()):
+            if idx % 11 == 3:
+                assert price == closes[idx]
+            else:
+                assert price == candles[idx].c - Decimal('0.0003')
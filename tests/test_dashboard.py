@@ -0,0 +1,99 @@
+import random
+from decimal import Decimal
+from tradepy.model import SymbolStr
+from tradepy.analysis.dashboard import Dashboard, _Transaction
+
+class _Fee:
+    @staticmethod
+    def get_commission_fee(order_amt_usd: Decimal) -> Decimal:
+        return -order_amt_usd * Decimal('0.00003')
+
+    @staticmethod
+    def get_swap_fee(symstr:SymbolStr, lot:Decimal, from_sec:float, to_sec:float, is_buy:bool) -> Decimal:
+        return -lot * Decimal((to_sec - from_sec) // 3600) * Decimal('0.1')
+
+def _gen_trans(seed:int) -> list[_Transaction]:
+    # 时间都在 4 小时的格子上, 同一时间很多笔平仓和开仓; 一部分是 price sl tp 都一样的重复订单
+    rng = random.Random(seed)
+    tran_list = []
+    for _ in range(300):
+        symstr = rng.choice([SymbolStr.EURUSD, SymbolStr.USDJPY])
+        from_sec = rng.randrange(0, 60) * 4 * 3600
+        to_sec = from_sec + rng.randrange(1, 8) * 4 * 3600
+        is_buy = rng.random() < 0.5
+        base = Decimal('1.08') if symstr == SymbolStr.EURUSD else Decimal('150.1')
+        price = base + Decimal(rng.randrange(0, 4)) * base / 1000
+        dist = base / 200
+        sl, tp = (price - dist, price + 2 * dist) if is_buy else (price + dist, price - 2 * dist)
+        tran = _Transaction(from_sec, to_sec, is_buy, price, tp, sl, symstr)
+        tran.is_tp = rng.random() < 0.4
+        tran_list.append(tran)
+    return tran_list
+
+def _summarize_ref(all_tran_list, risk_perc, init_balance_usd, leverage, fee_calc) -> tuple:
+    # 逐个时间点处理, 同一时间先按顺序平仓再按顺序开仓, 重复订单和总风险每次重新算
+    balance_usd = init_balance_usd
+    used_margin_usd = Decimal(0)
+    min_risk_amt_usd = init_balance_usd * risk_perc
+    time_balance_usedmargin_list = []
+    tp_cnt = sl_cnt = 0
+    pending_list = []
+    all_tran_list = sorted(all_tran_list, key=lambda x: x.from_candle_open_sec)
+    time_list = sorted({t for tran in all_tran_list for t in (tran.from_candle_open_sec, tran.to_candle_open_sec)})
+    for t_sec in time_list:
+        for tran in [tran for tran in pending_list if tran.to_candle_open_sec == t_sec]:
+            fill_price = tran.sl if tran.is_sl else tran.tp
+            diff_order_amt_quote = tran.unit * abs(fill_price - tran.price)
+            diff_order_amt_usd = diff_order_amt_quote if tran.symstr.quote == 'usd' else diff_order_amt_quote / fill_price
+            balance_usd += (diff_order_amt_usd if tran.is_tp else -diff_order_amt_usd)
+            balance_usd += fee_calc.get_commission_fee(tran.order_amt_usd)
+            balance_usd += fee_calc.get_swap_fee(tran.symstr, tran.unit/pow(10,5), tran.from_candle_open_sec, tran.to_candle_open_sec, tran.is_buy)
+            used_margin_usd = max(0, used_margin_usd - tran.used_margin_usd)
+            time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
+            tp_cnt += 1 if tran.is_tp else 0
+            sl_cnt += 1 if tran.is_sl else 0
+            pending_list.remove(tran)
+        for tran in [tran for tran in all_tran_list if tran.from_candle_open_sec == t_sec]:
+            risk_amt_usd = max(balance_usd * risk_perc, min_risk_amt_usd)
+            tot_risk_amt_usd = sum((t.risk_amt_usd for t in pending_list), Decimal(0))
+            if balance_usd - used_margin_usd - tot_risk_amt_usd < risk_amt_usd:
+                continue
+            if any((t.symstr, t.price, t.sl, t.tp) == (tran.symstr, tran.price, tran.sl, tran.tp) for t in pending_list):
+                continue
+            risk_amt_quote = risk_amt_usd if tran.symstr.quote == 'usd' else risk_amt_usd * tran.price
+            tran.unit = risk_amt_quote / abs(tran.sl - tran.price)
+            order_amt_quote = tran.unit * tran.price
+            tran.order_amt_usd = order_amt_quote if tran.symstr.quote == 'usd' else order_amt_quote / tran.price
+            tran.risk_amt_usd = risk_amt_usd
+            tran.used_margin_usd = tran.order_amt_usd / leverage
+            used_margin_usd += tran.used_margin_usd
+            time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
+            balance_usd += fee_calc.get_commission_fee(tran.order_amt_usd)
+            pending_list.append(tran)
+    return tp_cnt, sl_cnt, time_balance_usedmargin_list
+
+def test_summarize_matches_reference():
+    # risk_perc 大的时候会因为 margin 不够拒绝下单
+    for seed, risk_perc, leverage in [(1, Decimal('0.01'), Decimal(100)), (2, Decimal('0.05'), Decimal(30)), (3, Decimal('0.2'), Decimal(500))]:
+        expected = _summarize_ref(_gen_trans(seed), risk_perc, Decimal(10000), leverage, _Fee)
+        actual = Dashboard._summarize_paral_trade_asset_with_alltrans(_gen_trans(seed), risk_perc, Decimal(10000), leverage, _Fee)
+        assert expected[0] and expected[1]
+        assert actual == expected
+
+def test_summarize_close_before_open_and_duplicates():
+    symstr = SymbolStr.EURUSD
+    def new_tran(from_sec, to_sec, price='1.1'):
+        tran = _Transaction(from_sec, to_sec, True, Decimal(price), Decimal('1.3'), Decimal('1.0'), symstr)
+        tran.is_tp = True
+        return tran
+    # a 在 10 平仓, b 和 a 完全一样, 在 10 开仓, 先平仓所以 b 能下单
+    # c 和 b 一样, 同时开仓, 是重复订单; d price 不一样, 不算重复
+    tran_list = [new_tran(0, 10), new_tran(10, 20), new_tran(10, 30), new_tran(10, 20, '1.11')]
+    tp_cnt, sl_cnt, time_list = Dashboard._summarize_paral_trade_asset_with_alltrans(tran_list, Decimal('0.01'), Decimal(10000), Decimal(100), _Fee)
+    assert (tp_cnt, sl_cnt) == (3, 0)
+    assert [t for t,_,_ in time_list] == [0, 10, 10, 10, 20, 20]
+    assert tran_list[2].unit == 0
+    # 用同样的 sl tp 的 Decimal 写法不同, 按报价精度取整之后也是重复
+    tran_list = [new_tran(0, 10), new_tran(5, 20, '1.10000000000000001')]
+    tp_cnt, _, _ = Dashboard._summarize_paral_trade_asset_with_alltrans(tran_list, Decimal('0.01'), Decimal(10000), Decimal(100), _Fee)
+    assert tp_cnt == 1
@@ -0,0 +1,97 @@
+from decimal import Decimal
+from tradepy.model import SymbolStr
+from tradepy.model.signal import Signal
+from tradepy.analysis.chief import Chief
+from tradepy.analysis.dedup import SignalDedupIndex
+from benchmarks.bench import gen_series
+
+class _FixedAnalyst:
+    '''
+    每根蜡烛都出 price tp sl 一样的信号, 和 h12 / 最后一根 h4 的重复一样
+    '''
+    @staticmethod
+    def analyze(candles, peaks, valleys) -> list[Signal]:
+        return [
+            Signal(is_buy=True,
+                   price=Decimal('1.1'),
+                   candle_sec=candle.open_sec,
+                   sl=Decimal('1.0'),
+                   tp=Decimal('1.3'),
+                   symstr=candle.symstr)
+            for candle in candles
+        ]
+
+class _CloseAnalyst:
+    '''
+    每根蜡烛一个收盘价的信号, 每根的 fingerprint 都不一样
+    '''
+    @staticmethod
+    def analyze(candles, peaks, valleys) -> list[Signal]:
+        return [
+            Signal(is_buy=True,
+                   price=candle.c,
+                   candle_sec=candle.open_sec,
+                   sl=candle.c - Decimal('0.01'),
+                   tp=candle.c + Decimal('0.02'),
+                   symstr=candle.symstr)
+            for candle in candles
+        ]
+
+def _get_last_signals(candles, dedup_index:SignalDedupIndex, analyst=_FixedAnalyst) -> list[Signal]:
+    signal_list = Chief.analyze(candles, set(), set(), [analyst], dedup_index=dedup_index)
+    last_sec = candles[-1].open_sec
+    return [signal for signal in signal_list if signal.candle_sec == last_sec]
+
+def test_claim_only_last_bar():
+    h4 = gen_series(SymbolStr.EURUSD, 50, 1)
+    h12 = gen_series(SymbolStr.EURUSD, 20, 2)
+    dedup_index = SignalDedupIndex(ttl_sec=3600)
+    # h4 先收盘, 占住; h12 同一时间的相同信号被去掉
+    assert len(_get_last_signals(h4[:30], dedup_index)) == 1
+    assert _get_last_signals(h12[:10], dedup_index) == []
+    # 历史信号原样返回, 不重新 claim
+    signal_list = Chief.analyze(h4[:30], set(), set(), [_FixedAnalyst], dedup_index=dedup_index)
+    assert len(signal_list) == 29
+    assert len(dedup_index) == 1
+
+def test_release_does_not_revive_history():
+    candles = gen_series(SymbolStr.EURUSD, 50, 1)
+    dedup_index = SignalDedupIndex(ttl_sec=3600)
+    last_list = _get_last_signals(candles[:30], dedup_index, _CloseAnalyst)
+    assert len(last_list) == 1
+    assert dedup_index.release(last_list[0])
+    # 平仓之后下一根蜡烛收盘, 窗口里还有刚才的信号, 它不会被重新 claim
+    signal_list = Chief.analyze(candles[:31], set(), set(), [_CloseAnalyst], dedup_index=dedup_index)
+    assert len(signal_list) == 31
+    assert not dedup_index.is_claimed(last_list[0])
+    assert dedup_index.is_claimed(signal_list[-1])
+    assert len(dedup_index) == 1
+
+def test_ttl_eviction():
+    signal = Signal(True, Decimal('1.1'), 0, Decimal('1.0'), Decimal('1.3'), SymbolStr.EURUSD)
+    dedup_index = SignalDedupIndex(ttl_sec=10)
+    assert dedup_index.claim(signal, now_sec=100)
+    assert not dedup_index.claim(signal, now_sec=109)
+    assert dedup_index.claim(signal, now_sec=110)
+
+def test_ttl_eviction_out_of_order_now():
+    signal_a = Signal(True, Decimal('1.1'), 0, Decimal('1.0'), Decimal('1.3'), SymbolStr.EURUSD)
+    signal_b = Signal(False, Decimal('1.2'), 0, Decimal('1.3'), Decimal('1.0'), SymbolStr.EURUSD)
+    dedup_index = SignalDedupIndex(ttl_sec=10)
+    # 先 claim 的 a 过期时间反而更晚
+    assert dedup_index.claim(signal_a, now_sec=200)
+    assert dedup_index.claim(signal_b, now_sec=100)
+    assert not dedup_index.is_claimed(signal_b, now_sec=110)
+    assert dedup_index.is_claimed(signal_a, now_sec=110)
+    assert len(dedup_index) == 1
+    assert dedup_index.claim(signal_b, now_sec=110)
+
+def test_release_then_reclaim_keeps_new_expiry():
+    signal = Signal(True, Decimal('1.1'), 0, Decimal('1.0'), Decimal('1.3'), SymbolStr.EURUSD)
+    dedup_index = SignalDedupIndex(ttl_sec=10)
+    assert dedup_index.claim(signal, now_sec=100)
+    assert dedup_index.release(signal)
+    assert dedup_index.claim(signal, now_sec=105)
+    # 第一次 claim 留在堆里的过期时间不能把第二次的删掉
+    assert dedup_index.is_claimed(signal, now_sec=111)
+    assert not dedup_index.is_claimed(signal, now_sec=115)
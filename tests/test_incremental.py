@@ -0,0 +1,79 @@
+import numpy as np
+from tradepy.model import SymbolStr
+from tradepy.analysis import get_ema_floats, get_atr_floats, get_rsi_floats, get_pivot_idxs, get_columns
+from tradepy.analysis.incremental import EmaState, AtrState, RsiState, PivotTracker
+from benchmarks.bench import gen_series
+
+_CHUNK_LIST = [1, 2, 7, 50, 140]
+
+def _get_chunks(size:int) -> list[tuple[int, int]]:
+    # 长短不一的几段, 最后一段到结尾
+    chunk_list = []
+    start = 0
+    for chunk_size in _CHUNK_LIST:
+        chunk_list.append((start, start + chunk_size))
+        start += chunk_size
+    chunk_list.append((start, size))
+    return chunk_list
+
+def _run_chunks(new_state, update_many, cols:list, size:int) -> np.ndarray:
+    # 每段之后 snapshot 到一个新的 state 上接着跑, 模拟进程重启
+    state = new_state()
+    out_list = []
+    for start, stop in _get_chunks(size):
+        out_list.append(update_many(state, *[col[start:stop] for col in cols]))
+        restored = new_state()
+        restored.restore(state.snapshot())
+        state = restored
+    return np.concatenate(out_list)
+
+def test_ema_parity():
+    series = gen_series(SymbolStr.EURUSD, 400, 5)
+    for win in (1, 14, 60):
+        expected = get_ema_floats(series.c, win)
+        state = EmaState(win)
+        np.testing.assert_array_equal([float(state.update(c)) for c in series.c.tolist()], expected)
+        assert float(state.value) == expected[-1]
+        np.testing.assert_array_equal(EmaState(win).update_many(series.c), expected)
+        np.testing.assert_array_equal(_run_chunks(lambda: EmaState(win), EmaState.update_many, [series.c], len(series)), expected)
+
+def test_atr_parity():
+    series = gen_series(SymbolStr.USDJPY, 400, 5)
+    cols = [series.h, series.l, series.c]
+    for win in (1, 14):
+        expected = get_atr_floats(*cols, win)
+        state = AtrState(win)
+        np.testing.assert_array_equal([float(state.update(h, l, c)) for h, l, c in zip(*[col.tolist() for col in cols])], expected)
+        assert float(state.value) == expected[-1]
+        np.testing.assert_array_equal(AtrState(win).update_many(*cols), expected)
+        np.testing.assert_array_equal(_run_chunks(lambda: AtrState(win), AtrState.update_many, cols, len(series)), expected)
+
+def test_rsi_parity():
+    series = gen_series(SymbolStr.GBPUSD, 400, 5)
+    for win in (2, 7, 14):
+        expected = get_rsi_floats(series.c, win)
+        # 前 win 根是 nan
+        assert np.isnan(expected[:win]).all() and not np.isnan(expected[win:]).any()
+        state = RsiState(win)
+        np.testing.assert_array_equal([float(state.update(c)) for c in series.c.tolist()], expected)
+        np.testing.assert_array_equal(RsiState(win).update_many(series.c), expected)
+        np.testing.assert_array_equal(_run_chunks(lambda: RsiState(win), RsiState.update_many, [series.c], len(series)), expected)
+
+def test_pivot_parity():
+    series = gen_series(SymbolStr.EURUSD, 600, 9)
+    for candles in (series, series.to_candles()):
+        closes, = get_columns(candles, 'c')
+        one_tracker = PivotTracker()
+        many_tracker = PivotTracker()
+        for start, stop in _get_chunks(len(candles)):
+            for idx in range(start, stop):
+                one_tracker.update(candles[idx])
+            many_tracker.update_many(candles, start, stop)
+            # 每段之后都和对收到的蜡烛跑一次 get_pivot_idxs 一样
+            peak_idxs, valley_idxs = get_pivot_idxs(np.array(closes[:stop], dtype=object if isinstance(closes, list) else None))
+            for tracker in (one_tracker, many_tracker):
+                assert tracker.peak_idxs == peak_idxs.tolist()
+                assert tracker.valley_idxs == valley_idxs.tolist()
+                assert tracker.peaks == {candles[idx] for idx in peak_idxs.tolist()}
+                assert tracker.valleys == {candles[idx] for idx in valley_idxs.tolist()}
+        assert many_tracker.peak_idxs and many_tracker.valley_idxs
@@ -0,0 +1,71 @@
+import threading
+from tradepy.cache.logcacher import LogCacher
+
+def test_torn_tail_truncated(tmp_path):
+    filepath = tmp_path / 'cache.log'
+    cacher = LogCacher(filepath)
+    cacher.update({'a': 1, 'b': [2, 3]})
+    cacher.close()
+    size = filepath.stat().st_size
+    # 进程在写最后一条记录的时候崩溃
+    with open(filepath, 'ab') as file:
+        file.write(b'0badc0de ["c", 4')
+    cacher = LogCacher(filepath)
+    assert filepath.stat().st_size == size
+    assert cacher.get_val('a') == 1
+    assert cacher.get_val('b') == [2, 3]
+    assert cacher.get_val('c') is None
+    # 截掉之后接着追加, 重新打开也能读到
+    cacher.update({'c': 5})
+    cacher.close()
+    cacher = LogCacher(filepath)
+    assert cacher.get_val('c') == 5
+    cacher.close()
+
+def test_corrupt_middle_record_skipped(tmp_path):
+    filepath = tmp_path / 'cache.log'
+    cacher = LogCacher(filepath)
+    cacher.update({'a': 1})
+    cacher.update({'b': 2})
+    cacher.update({'c': 3})
+    cacher.close()
+    lines = filepath.read_bytes().splitlines(keepends=True)
+    lines[1] = lines[1].replace(b'2', b'9')
+    filepath.write_bytes(b''.join(lines))
+    cacher = LogCacher(filepath)
+    assert cacher.get_val('a') == 1
+    assert cacher.get_val('b') is None
+    assert cacher.get_val('c') == 3
+    assert cacher.garbage_bytes == len(lines[1])
+    cacher.compact()
+    assert cacher.garbage_bytes == 0
+    assert cacher.get_val('c') == 3
+    cacher.close()
+
+def test_concurrent_update_with_compact(tmp_path):
+    filepath = tmp_path / 'cache.log'
+    cacher = LogCacher(filepath, compact_ratio=0.5, compact_min_bytes=1 << 10)
+    thread_cnt, round_cnt, key_cnt = 4, 300, 8
+    errors = []
+    def write(tid:int):
+        try:
+            for n in range(round_cnt):
+                cacher.update({f'{tid}-{key}': n for key in range(key_cnt)})
+                if n % 50 == 0:
+                    cacher.compact()
+        except Exception as e:
+            errors.append(e)
+    thread_list = [threading.Thread(target=write, args=(tid,)) for tid in range(thread_cnt)]
+    for thread in thread_list:
+        thread.start()
+    for thread in thread_list:
+        thread.join()
+    cacher.wait_compact()
+    assert errors == []
+    expected = {f'{tid}-{key}': round_cnt - 1 for tid in range(thread_cnt) for key in range(key_cnt)}
+    assert {key: cacher.get_val(key) for key in expected} == expected
+    assert not filepath.with_name(filepath.name + '.compact').exists()
+    cacher.close()
+    cacher = LogCacher(filepath)
+    assert {key: cacher.get_val(key) for key in expected} == expected
+    cacher.close()
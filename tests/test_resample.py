@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+import numpy as np
+from tradepy.model import SymbolStr, CandlePeriod
+from tradepy.model.candle import CandleSeries
+from tradepy.model.resample import is_resamplable, resample, Resampler
+
+def _get_month_series(year_cnt:int) -> CandleSeries:
+    open_secs = [
+        datetime(2020 + i // 12, i % 12 + 1, 1, tzinfo=timezone.utc).timestamp()
+        for i in range(year_cnt * 12)
+    ]
+    c = 1 + np.arange(len(open_secs)) / 100
+    return CandleSeries(o=c - 0.001, h=c + 0.01, l=c - 0.01, c=c, open_sec=open_secs, symstr=SymbolStr.EURUSD, period=CandlePeriod.MO1)
+
+def test_month_periods_resamplable():
+    assert is_resamplable(CandlePeriod.MO1, CandlePeriod.MO3)
+    assert is_resamplable(CandlePeriod.MO1, CandlePeriod.Y1)
+    assert is_resamplable(CandlePeriod.MO3, CandlePeriod.Y1)
+    assert is_resamplable(CandlePeriod.MO6, CandlePeriod.Y1)
+    assert not is_resamplable(CandlePeriod.MO6, CandlePeriod.MO3)
+    assert not is_resamplable(CandlePeriod.MO3, CandlePeriod.D1)
+    assert not is_resamplable(CandlePeriod.W1, CandlePeriod.MO1)
+    assert is_resamplable(CandlePeriod.D1, CandlePeriod.MO1)
+
+def test_resample_months():
+    series = _get_month_series(3)
+    quarters = resample(series, CandlePeriod.MO3)
+    years = resample(series, CandlePeriod.Y1)
+    assert len(quarters) == 12 and len(years) == 3
+    assert np.array_equal(resample(quarters, CandlePeriod.Y1).c, years.c)
+    assert np.array_equal(resample(quarters, CandlePeriod.Y1).h, years.h)
+    resampler = Resampler(SymbolStr.EURUSD, CandlePeriod.MO1, [CandlePeriod.MO3, CandlePeriod.Y1])
+    closed_dict = resampler.update(series)
+    assert np.array_equal(closed_dict[CandlePeriod.Y1].c, years.c[:-1])
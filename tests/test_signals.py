@@ -0,0 +1,42 @@
+from tradepy.model import SymbolStr
+from tradepy.analysis import get_peaks_valleys, get_signals
+from tradepy.analysis.dedup import get_signal_key
+from tradepy.analysis.dashboard import _Transaction, _get_tran_key
+from benchmarks.bench import gen_series
+
+def _get_keys(signal_list) -> list[tuple]:
+    return [(s.is_buy, s.price, s.candle_sec, s.sl, s.tp) for s in signal_list]
+
+def test_series_slice_with_parent_pivots():
+    series = gen_series(SymbolStr.EURUSD, 600, 11)
+    candle_list = series.to_candles()
+    for candles in [series, candle_list]:
+        peaks, valleys = get_peaks_valleys(candles)
+        full_list = get_signals(candles, valleys, peaks)
+        assert full_list
+        # 切片用整个序列的 peaks valleys, 和 list[Candle] 切片一样
+        assert _get_keys(get_signals(candles[:], valleys, peaks)) == _get_keys(full_list)
+    series_peaks, series_valleys = get_peaks_valleys(series)
+    list_peaks, list_valleys = get_peaks_valleys(candle_list)
+    # series 的 sl tp 是 float 算的, 和 Decimal 的尾数不一样, 只比较信号的位置和方向
+    series_list = get_signals(series[-200:], series_valleys, series_peaks)
+    list_list = get_signals(candle_list[-200:], list_valleys, list_peaks)
+    assert series_list
+    assert [(s.is_buy, s.candle_sec) for s in series_list] == [(s.is_buy, s.candle_sec) for s in list_list]
+
+
+def test_dedup_keys_match_across_input_types():
+    series = gen_series(SymbolStr.EURUSD, 600, 11)
+    candle_list = series.to_candles()
+    signal_lists = [get_signals(candles, valleys, peaks)
+                    for candles in (series, candle_list)
+                    for peaks, valleys in [get_peaks_valleys(candles)]]
+    assert signal_lists[0]
+    # sl tp 的尾数不一样, 去重的 key 按报价精度取整后一样
+    assert [s.sl for s in signal_lists[0]] != [s.sl for s in signal_lists[1]]
+    assert [get_signal_key(s) for s in signal_lists[0]] == [get_signal_key(s) for s in signal_lists[1]]
+    tran_key_lists = [
+        [_get_tran_key(_Transaction(s.candle_sec, s.candle_sec, s.is_buy, s.price, s.tp, s.sl, s.symstr)) for s in signal_list]
+        for signal_list in signal_lists
+    ]
+    assert tran_key_lists[0] == tran_key_lists[1]
@@ -0,0 +1,27 @@
+from decimal import Decimal
+from tradepy.model import SymbolStr, CandlePeriod
+from tradepy.analysis.sweep import get_task_list, run_sweep, load_rows
+from benchmarks.bench import gen_series, _BenchAnalyst, _ZeroFee
+
+def _load_candles(symstr:SymbolStr, period:CandlePeriod):
+    return gen_series(symstr, 2000, 3)
+
+def test_sweep_keys_stable(tmp_path):
+    result_path = tmp_path / 'sweep.jsonl'
+    # 一个传类, 一个传实例
+    task_list = get_task_list([SymbolStr.EURUSD],
+                              [CandlePeriod.H1],
+                              [[_BenchAnalyst], [_BenchAnalyst()]],
+                              [Decimal('0.0001')],
+                              [Decimal('0.01')],
+                              [Decimal(100)])
+    key_list = [task.key for task in task_list]
+    assert len(key_list) == 2
+    assert all('_BenchAnalyst' in key for key in key_list)
+    row_list = list(run_sweep(task_list, _load_candles, Decimal(10000), _ZeroFee, result_path, max_workers=2))
+    assert sorted(row.key for row in row_list) == sorted(key_list)
+    assert sorted(row.key for row in load_rows(result_path)) == sorted(key_list)
+    # 两个 task 是同一个策略, 结果一样
+    assert len({(row.tp_cnt, row.sl_cnt, row.final_balance_usd) for row in row_list}) == 1
+    # 续跑时 key 和上次写的一样, 全部跳过
+    assert list(run_sweep(task_list, _load_candles, Decimal(10000), _ZeroFee, result_path, max_workers=2)) == []
@@ -0,0 +1,34 @@
+from decimal import Decimal
+from tradepy.model import SymbolStr
+from tradepy.analysis import get_peaks_valleys
+from tradepy.analysis.chief import Chief
+from tradepy.analysis.dashboard import Dashboard
+from tradepy.analysis.walkforward import WalkForward, run_walk_forward
+from benchmarks.bench import gen_series, _BenchAnalyst
+
+def _get_full_pass(candles) -> tuple[int, int, int]:
+    peaks, valleys = get_peaks_valleys(candles)
+    signal_list = Chief.analyze(candles, peaks, valleys, [_BenchAnalyst])
+    tran_list = Dashboard._get_trans(candles, signal_list, Decimal(1))
+    return len(signal_list), sum(tran.is_tp for tran in tran_list), sum(not tran.is_tp for tran in tran_list)
+
+def test_chunk_metrics_equal_full_pass():
+    series = gen_series(SymbolStr.EURUSD, 2000, 3)
+    for candles in [series, series.with_points(), series.to_candles()]:
+        walk = WalkForward(candles, [_BenchAnalyst], Decimal(1), test_size=100)
+        while walk.stop < len(candles):
+            walk.step()
+        signal_cnt, tp_cnt, sl_cnt = _get_full_pass(candles)
+        assert sum(chunk['signal_cnt'] for chunk in walk.chunk_list) == signal_cnt
+        assert sum(chunk['tp_cnt'] for chunk in walk.chunk_list) == tp_cnt
+        assert sum(chunk['sl_cnt'] for chunk in walk.chunk_list) == sl_cnt
+        assert walk.pending_cnt == signal_cnt - tp_cnt - sl_cnt
+
+def test_fold_table():
+    candles = gen_series(SymbolStr.USDJPY, 1000, 5)
+    df = run_walk_forward(candles, [_BenchAnalyst], Decimal(1), train_size=300, test_size=100)
+    assert len(df) == 7
+    assert (df.test_start > df.train_stop).all()
+    test_signal_cnts = df.test_signal_cnt.tolist()
+    # 第 n 个 fold 的 train 是它前面 3 段, 也就是前面 3 个 fold 的 test
+    assert df.train_signal_cnt.iloc[3] == sum(test_signal_cnts[:3])
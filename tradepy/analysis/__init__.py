@@ -1,18 +1,35 @@
 import pandas as pd
-from ..model.candle import Candle
+import numpy as np
+from ..model.candle import Candle, CandleSeries
 from ..model.signal import Signal
-from typing import Protocol
+from typing import Protocol, TYPE_CHECKING
+from concurrent.futures import Executor
 from ..model import SymbolStr
 from decimal import Decimal
+from ..common import to_dec
+from .dedup import SignalDedupIndex
+from .context import get_features
+if TYPE_CHECKING:
+    from .feature import FeatureContext
 
 class Analyzable(Protocol):
     @staticmethod
-    def analyze(candles: list[Candle], peaks:set[Candle], valleys:set[Candle]) -> list[Signal]:
+    def analyze(candles: list[Candle] | CandleSeries, peaks:set[Candle], valleys:set[Candle]) -> list[Signal]:
+        raise NotImplementedError()
+
+class VectorAnalyzable(Protocol):
+    '''
+    向量化的策略, 输入是 float64 的列, 返回和 candles 等长的 (buy_mask, sell_mask, sls, tps) 或者 (buy_mask, sell_mask, sls, tps, prices)
+    没有信号的位置 sls tps prices 随便填, 一般是 nan; 同一根蜡烛既 buy 又 sell 算 buy
+    不返回 prices 的话, 信号的 price 是这根蜡烛的收盘价
+    '''
+    @staticmethod
+    def analyze_vec(o:np.ndarray, h:np.ndarray, l:np.ndarray, c:np.ndarray, open_sec:np.ndarray) -> tuple[np.ndarray, ...]:
         raise NotImplementedError()
 
 class ChiefAnalyzable(Protocol):
     @staticmethod
-    def analyze(candles: list[Candle], peaks:set[Candle], valleys:set[Candle], analysts:list[Analyzable]) -> list[Signal]:
+    def analyze(candles: list[Candle] | CandleSeries, peaks:set[Candle], valleys:set[Candle], analysts:list[Analyzable | VectorAnalyzable], executor:Executor | None = None, features:'FeatureContext | None' = None, dedup_index:'SignalDedupIndex | None' = None) -> list[Signal]:
         raise NotImplementedError()
 
 class FeeCalculable(Protocol):
@@ -25,17 +42,36 @@ class FeeCalculable(Protocol):
     def get_swap_fee(symstr:SymbolStr, lot:Decimal, from_sec:float, to_sec:float, is_buy:bool) -> Decimal:
         raise NotImplementedError()
 
+def get_columns(candles: list[Candle] | CandleSeries, *names:str) -> list:
+    '''
+    CandleSeries 直接返回对应的 numpy 列, 不复制
+    list[Candle] 才需要逐个取值拼成 list
+    '''
+    if isinstance(candles, CandleSeries):
+        return [getattr(candles, name) for name in names]
+    return [[getattr(c, name) for c in candles] for name in names]
+
 def get_emas(nums: list[Decimal], win:int) -> list[Decimal]:
-    if not nums:
+    if len(nums) == 0:
         return []
-    ema_series = pd.Series(nums).ewm(span=win, adjust=False).mean()
-    ema_floats = list(ema_series)
+    ema_floats = list(get_ema_floats(nums, win))
     ema_decimals = [Decimal(ema) for ema in ema_floats]
     return ema_decimals
 
+def get_ema_floats(nums, win:int) -> np.ndarray:
+    '''
+    get_emas 的 float64 数组版本, 不转 Decimal, 给 CandleSeries 和定点模式用
+    '''
+    return pd.Series(nums).ewm(span=win, adjust=False).mean().to_numpy(dtype=np.float64)
+
 def get_atrs(highs: list[Decimal], lows: list[Decimal], closes: list[Decimal], win=int) -> list[Decimal]:
-    if not highs or not lows or not closes:
+    if len(highs) == 0 or len(lows) == 0 or len(closes) == 0:
         return []
+    atr_flts = list(get_atr_floats(highs, lows, closes, win))
+    atr_decs = [Decimal(atr) for atr in atr_flts]
+    return atr_decs
+
+def get_atr_floats(highs: list[Decimal], lows: list[Decimal], closes: list[Decimal], win:int) -> np.ndarray:
     df = pd.DataFrame(dict(
         h=highs,
         l=lows,
@@ -45,13 +81,16 @@ def get_atrs(highs: list[Decimal], lows: list[Decimal], closes: list[Decimal], w
     df['h-prev_c'] = abs(df.h - df.c.shift())
     df['l-prev_c'] = abs(df.l - df.c.shift())
     df['tr'] = df[['h-l', 'h-prev_c', 'l-prev_c']].max(axis=1)
-    atr_flts = list(df.tr.ewm(span=win, adjust=False).mean())
-    atr_decs = [Decimal(atr) for atr in atr_flts]
-    return atr_decs
+    return df.tr.ewm(span=win, adjust=False).mean().to_numpy(dtype=np.float64)
 
 def get_rsis(nums:list[Decimal], win:int) -> list[Decimal]:
-    if not nums:
+    if len(nums) == 0:
         return []
+    rsi_flts = list(get_rsi_floats(nums, win))
+    rsi_decs = [Decimal(rsi) for rsi in rsi_flts]
+    return rsi_decs
+
+def get_rsi_floats(nums, win:int) -> np.ndarray:
     close_delta = pd.Series(nums).diff()
     up = close_delta.clip(lower=0)
     down = -1 * close_delta.clip(upper=0)
@@ -59,44 +98,66 @@ def get_rsis(nums:list[Decimal], win:int) -> list[Decimal]:
     ma_up = up.ewm(com=win - 1, adjust=True, min_periods=win).mean()
     ma_down = down.ewm(com=win - 1, adjust=True, min_periods=win).mean()
     rsi_series = 100 - (100 / (1 + ma_up / ma_down))
-    rsi_flts = list(rsi_series)
-    rsi_decs = [Decimal(rsi) for rsi in rsi_flts]
-    return rsi_decs
+    return rsi_series.to_numpy(dtype=np.float64)
+
+def get_pivot_idxs(closes) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    get_peaks_valleys 的数组版本, closes 可以是 float 数组, 也可以是 Decimal 的 object 数组
+    返回过滤完回撤之后 peak 和 valley 的下标
+    '''
+    closes = np.asarray(closes)
+    if len(closes) < 3:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    me = closes[1:-1]
+    prevs = closes[:-2]
+    nexts = closes[2:]
+    is_peaks = np.concatenate(([False], me > np.maximum(prevs, nexts), [False]))
+    is_valleys = np.concatenate(([False], me < np.minimum(prevs, nexts), [False])) & ~is_peaks
+
+    # calc retracement, 用的是没过滤的 peak/valley 序列, 一次遍历
+    pivot_idxs = np.flatnonzero(is_peaks | is_valleys)
+    pivot_closes = closes[pivot_idxs].tolist()
+    is_kepts = np.ones(len(pivot_idxs), dtype=bool)
+    for i in range(3, len(pivot_closes)):
+        retracement = pivot_closes[i] - pivot_closes[i - 1]
+        prev_retracement = pivot_closes[i - 1] - pivot_closes[i - 2]
+        retracement_perc = retracement / prev_retracement if prev_retracement != 0 else None
+        if not ((not retracement_perc) or retracement_perc < -0.382):
+            is_kepts[i] = False
+    pivot_idxs = pivot_idxs[is_kepts]
+    return pivot_idxs[is_peaks[pivot_idxs]], pivot_idxs[is_valleys[pivot_idxs]]
 
-def get_peaks_valleys(candles: list[Candle]) -> tuple[set[Candle], set[Candle]]:
+def get_peaks_valleys(candles: list[Candle] | CandleSeries) -> tuple[set[Candle], set[Candle]]:
     if not candles:
         return set(), set()
-    # peaks and valleys
-    peaks = set()
-    valleys = set()
-    for i in range(1,len(candles)-1):
-        candle = candles[i]
-        prev_candle = candles[i - 1]
-        next_candle = candles[i + 1]
-        if candle.c > max(prev_candle.c, next_candle.c):
-            peaks.add(candle)
-        elif candle.c < min(prev_candle.c, next_candle.c):
-            valleys.add(candle)
-
-    # calc retracement
-    peak_valleys = [c for c in candles if c in {*peaks, *valleys}]
-    for i in range(3, len(peak_valleys)):
-        candle = peak_valleys[i]
-        prev_candle = peak_valleys[i - 1]
-        prev_prev_candle = peak_valleys[i - 2]
-        retracement = candle.c - prev_candle.c
-        prev_retracement = prev_candle.c - prev_prev_candle.c
-        retracement_perc = retracement / prev_retracement if prev_retracement != 0 else None
-        if (not retracement_perc) or retracement_perc < -0.382:
-            continue
-        else:
-            try:
-                peaks.remove(candle)
-            except:
-                valleys.remove(candle)
+    peak_idxs, valley_idxs = get_pivot_idxs(_get_array(candles, 'c'))
+    peaks = {candles[i] for i in peak_idxs.tolist()}
+    valleys = {candles[i] for i in valley_idxs.tolist()}
     return peaks, valleys
 
-def get_signals(candles: list[Candle],
+def get_signal_arrays(highs: np.ndarray,
+                      lows: np.ndarray,
+                      closes: np.ndarray,
+                      atrs: np.ndarray,
+                      buy_mask: np.ndarray,
+                      sell_mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    get_signals 的数组版本, 返回 (下标, is_buy, price, sl, tp)
+    同一根蜡烛既是 buy 又是 sell 的话算 buy, 第一根蜡烛没有 prev 不出信号
+    '''
+    is_signals = buy_mask | sell_mask
+    is_signals[:1] = False
+    idxs = np.flatnonzero(is_signals)
+    is_buys = buy_mask[idxs]
+    prices = closes[idxs]
+    min_ls = np.minimum(lows[idxs], lows[idxs - 1])
+    max_hs = np.maximum(highs[idxs], highs[idxs - 1])
+    sls = np.where(is_buys, min_ls - atrs[idxs], max_hs + atrs[idxs])
+    diff_prices = prices - sls
+    tps = prices + diff_prices
+    return idxs, is_buys, prices, sls, tps
+
+def get_signals(candles: list[Candle] | CandleSeries,
                 buys: set[Candle],
                 sells: set[Candle]) -> list['Signal']:
     if not candles or not buys or not sells:
@@ -105,42 +166,54 @@ def get_signals(candles: list[Candle],
     因为sl和tp的逻辑，对策略的成功率也是有很大影响，所以构造 signal的方法，每个策略都应该独立，放在对应策略的内部
     '''
     # compose signals
-    atrs = get_atrs([c.h for c in candles],
-                         [c.l for c in candles],
-                         [c.c for c in candles],
-                         win=14)
-    atrs = {c: atrs[i] for i, c in enumerate(candles)}
-
-    signals = []
-    for i, candle in enumerate(candles):
-        prev_candle = candles[i - 1] if (i - 1) >= 0 else None
-        if not prev_candle:
-            continue
-        if not (candle in {*buys, *sells}):
-            continue
-        price = candle.c
-        atr = atrs[candle]
-        if candle in buys:
-            min_l = min(candle.l, prev_candle.l)
-            sl = min_l - atr
-            is_buy = True
-        else:
-            max_h = max(candle.h, prev_candle.h)
-            sl = max_h + atr
-            is_buy = False
-
-        diff_price = price - sl
-        tp = price + diff_price
-        signal = Signal(is_buy=is_buy,
-                        price=price,
-                        candle_sec=candle.open_sec,
-                        sl=sl,
-                        tp=tp,
-                        symstr=candle.symstr)
-        signals.append(signal)
+    highs, lows, closes = [_get_array(candles, name) for name in ('h', 'l', 'c')]
+    # 在 Chief.analyze 里的话, 同一批 candles 的 atr 所有 analyst 只算一次
+    ctx = get_features(candles)
+    if isinstance(candles, CandleSeries):
+        atrs = ctx.atr_floats(14) if ctx else get_atr_floats(highs, lows, closes, win=14)
+    else:
+        atrs = np.array(ctx.atrs(14) if ctx else get_atrs(highs, lows, closes, win=14), dtype=object)
+    idxs, is_buys, prices, sls, tps = get_signal_arrays(highs,
+                                                        lows,
+                                                        closes,
+                                                        atrs,
+                                                        _get_mask(candles, buys),
+                                                        _get_mask(candles, sells))
+    open_secs = _get_array(candles, 'open_sec')
+    symstr = candles[0].symstr
+    signals = [
+        Signal(is_buy=is_buy,
+               price=_as_dec(price),
+               candle_sec=open_sec,
+               sl=_as_dec(sl),
+               tp=_as_dec(tp),
+               symstr=symstr)
+        for is_buy, price, open_sec, sl, tp in zip(is_buys.tolist(),
+                                                   prices.tolist(),
+                                                   open_secs[idxs].tolist(),
+                                                   sls.tolist(),
+                                                   tps.tolist())
+    ]
     return signals
 
-def get_me_to_prev_valley(candles: list[Candle],
+def _get_array(candles: list[Candle] | CandleSeries, name:str) -> np.ndarray:
+    # list[Candle] 用 object 数组, 保留 Decimal 的精确计算
+    col, = get_columns(candles, name)
+    return col if isinstance(candles, CandleSeries) else np.array(col, dtype=object)
+
+def _get_mask(candles: list[Candle] | CandleSeries, candle_set:set[Candle]) -> np.ndarray:
+    if isinstance(candles, CandleSeries):
+        mask = np.zeros(len(candles), dtype=bool)
+        # 切片和原 series 的 view 相等, get_idx 按内存位置找到在 candles 里的下标, 和 c in candle_set 一致
+        idxs = [candles.get_idx(c) for c in candle_set]
+        mask[[idx for idx in idxs if idx is not None]] = True
+        return mask
+    return np.fromiter((c in candle_set for c in candles), dtype=bool, count=len(candles))
+
+def _as_dec(num) -> Decimal:
+    return num if isinstance(num, Decimal) else to_dec(num)
+
+def get_me_to_prev_valley(candles: list[Candle] | CandleSeries,
                             me_idx: int,
                             valleys:set[Candle]) -> list[Candle]:
     
@@ -155,7 +228,7 @@ def get_me_to_prev_valley(candles: list[Candle],
         i -= 1
     return up_trends
 
-def get_me_to_prev_peak(candles: list[Candle],
+def get_me_to_prev_peak(candles: list[Candle] | CandleSeries,
                     me_idx: int,
                     peaks:set[Candle]) -> list[Candle]:
     me = candles[me_idx]
@@ -0,0 +1,128 @@
+from typing import Callable
+from functools import partial
+import numpy as np
+
+# 前面这么多根蜡烛所有信号一起向量化逐根检查, 大部分信号在这之内就触发了
+_SCAN_ROUNDS = 32
+_MIN_BLOCK = 64
+_MAX_BLOCK = 1 << 16
+# float 的 lim 是从 Decimal 转过来的, 离 lim 这么近的蜡烛用 is_hit 精确确认, 保证和 Decimal 比较结果一致
+_REL_EPS = 1e-9
+
+def get_first_cross(nums: np.ndarray, start:int, stop:int, lim:float, is_below:bool) -> int:
+    '''
+    在 [start, stop) 里找第一个 nums[j] <= lim (is_below) 或者 nums[j] >= lim 的下标, 没有就返回 -1
+    分块扫描, 块大小翻倍, 不用每次扫完整个数组
+    '''
+    block = _MIN_BLOCK
+    while start < stop:
+        end = min(stop, start + block)
+        chunk = nums[start:end]
+        mask = chunk <= lim if is_below else chunk >= lim
+        i = int(mask.argmax())
+        if mask[i]:
+            return start + i
+        start = end
+        block = min(block * 2, _MAX_BLOCK)
+    return -1
+
+def _get_first_hit(nums: np.ndarray,
+                   start:int,
+                   stop:int,
+                   lim:float,
+                   is_below:bool,
+                   is_hit:Callable[[int], bool] | None) -> int:
+    if is_hit is None:
+        return get_first_cross(nums, start, stop, lim, is_below)
+    eps = _REL_EPS * max(abs(lim), 1.0)
+    wide_lim = lim + eps if is_below else lim - eps
+    sure_lim = lim - eps if is_below else lim + eps
+    while start < stop:
+        bar = get_first_cross(nums, start, stop, wide_lim, is_below)
+        if bar < 0:
+            return -1
+        num = nums[bar]
+        if (num <= sure_lim if is_below else num >= sure_lim) or is_hit(bar):
+            return bar
+        start = bar + 1
+    return -1
+
+def get_first_hits(highs: np.ndarray,
+                   lows: np.ndarray,
+                   sig_idxs: list[int],
+                   is_buys: list[bool],
+                   sl_lims: list[float],
+                   tp_lims: list[float],
+                   is_hit:Callable[[int, int, bool], bool] | None = None) -> tuple[list[int], list[int], list[bool]]:
+    '''
+    每个信号从它的下一根蜡烛开始, 找第一根触发 sl 或 tp 的蜡烛
+    sl_lims tp_lims 是已经算上 spread 的价格:
+    buy  sl 触发是 low <= sl_lim, tp 触发是 high >= tp_lim
+    sell sl 触发是 high >= sl_lim, tp 触发是 low <= tp_lim
+    同一根蜡烛 sl 和 tp 都触发, 算 sl
+    is_hit(sig_pos, bar, is_sl) 不为 None 时, 离 lim 很近的蜡烛用它做精确判断, 例如用 Decimal 重新比较
+    返回触发了的 (信号位置, 蜡烛下标, 是否 tp), 按蜡烛下标排序, 没有触发的信号不返回
+    '''
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    sig_idxs = np.asarray(sig_idxs, dtype=np.int64)
+    is_buys = np.asarray(is_buys, dtype=bool)
+    sl_lims = np.asarray(sl_lims, dtype=np.float64)
+    tp_lims = np.asarray(tp_lims, dtype=np.float64)
+    bar_cnt = len(highs)
+    sig_cnt = len(sig_idxs)
+    signs = np.where(is_buys, 1.0, -1.0)
+    sl_eps = np.zeros(sig_cnt) if is_hit is None else _REL_EPS * np.maximum(np.abs(sl_lims), 1.0)
+    tp_eps = np.zeros(sig_cnt) if is_hit is None else _REL_EPS * np.maximum(np.abs(tp_lims), 1.0)
+    hit_bars = np.full(sig_cnt, -1, dtype=np.int64)
+    hit_tps = np.zeros(sig_cnt, dtype=bool)
+
+    # 所有还没触发的信号一起, 每轮检查各自后面第 k 根蜡烛
+    # d <= 0 就是触发, buy 和 sell 用 sign 统一成同一个方向
+    active = np.arange(sig_cnt)
+    for k in range(1, _SCAN_ROUNDS + 1):
+        bars = sig_idxs[active] + k
+        in_range = bars < bar_cnt
+        active = active[in_range]
+        bars = bars[in_range]
+        if not len(active):
+            break
+        buys = is_buys[active]
+        signs_k = signs[active]
+        lows_k = lows[bars]
+        highs_k = highs[bars]
+        sl_d = signs_k * (np.where(buys, lows_k, highs_k) - sl_lims[active])
+        tp_d = signs_k * (tp_lims[active] - np.where(buys, highs_k, lows_k))
+        sl_e = sl_eps[active]
+        tp_e = tp_eps[active]
+        sl_hits = sl_d <= -sl_e
+        tp_hits = tp_d <= -tp_e
+        if is_hit is not None:
+            for i in np.flatnonzero((sl_d > -sl_e) & (sl_d <= sl_e)).tolist():
+                sl_hits[i] = is_hit(int(active[i]), int(bars[i]), True)
+            for i in np.flatnonzero((tp_d > -tp_e) & (tp_d <= tp_e) & ~sl_hits).tolist():
+                tp_hits[i] = is_hit(int(active[i]), int(bars[i]), False)
+        hits = sl_hits | tp_hits
+        hit_bars[active[hits]] = bars[hits]
+        hit_tps[active[hits]] = ~sl_hits[hits]
+        active = active[~hits]
+
+    # 剩下的信号持续时间比较长, 每个信号单独分块扫描
+    for pos in active.tolist():
+        start = int(sig_idxs[pos]) + _SCAN_ROUNDS + 1
+        is_buy = bool(is_buys[pos])
+        sl_is_hit = None if is_hit is None else partial(is_hit, pos, is_sl=True)
+        tp_is_hit = None if is_hit is None else partial(is_hit, pos, is_sl=False)
+        sl_bar = _get_first_hit(lows if is_buy else highs, start, bar_cnt, float(sl_lims[pos]), is_buy, sl_is_hit)
+        # tp 只需要找到 sl 之前, 同一根蜡烛也算 sl
+        tp_stop = sl_bar if sl_bar >= 0 else bar_cnt
+        tp_bar = _get_first_hit(highs if is_buy else lows, start, tp_stop, float(tp_lims[pos]), not is_buy, tp_is_hit)
+        if tp_bar >= 0:
+            hit_bars[pos] = tp_bar
+            hit_tps[pos] = True
+        elif sl_bar >= 0:
+            hit_bars[pos] = sl_bar
+
+    hit_poss = np.flatnonzero(hit_bars >= 0)
+    hit_poss = hit_poss[np.lexsort((sig_idxs[hit_poss], hit_bars[hit_poss]))]
+    return hit_poss.tolist(), hit_bars[hit_poss].tolist(), hit_tps[hit_poss].tolist()
@@ -1,26 +1,200 @@
-from ..model.candle import Candle
+from concurrent.futures import Executor
+import numpy as np
+from ..model.candle import Candle, CandleSeries
 from ..model.signal import Signal
-from . import ChiefAnalyzable, Analyzable
+from . import ChiefAnalyzable, Analyzable, VectorAnalyzable, get_columns, _as_dec
+from .feature import FeatureContext, run_with_features, current_features
+from .dedup import SignalDedupIndex
+from ..common.instrument import timed, span, incr
 
 class Chief(ChiefAnalyzable):
 
     @staticmethod
-    def analyze(candle_list: list[Candle], peak_set:set[Candle], valley_set:set[Candle], analyst_list:list[Analyzable]) -> list[Signal]:
+    @timed('chief.analyze')
+    def analyze(candle_list: list[Candle] | CandleSeries,
+                peak_set:set[Candle],
+                valley_set:set[Candle],
+                analyst_list:list[Analyzable | VectorAnalyzable],
+                executor:Executor | None = None,
+                features:FeatureContext | None = None,
+                dedup_index:SignalDedupIndex | None = None) -> list[Signal]:
+        '''
+        所有 analyst 共用一个 FeatureContext, 指标只算一次
+        executor 不为 None 时 analyst 并发执行, ThreadPoolExecutor 和 ProcessPoolExecutor 都可以,
+        进程池要求 analyst 和 candles 可以 pickle; 结果还是按 analyst_list 的顺序合并
+        analyst_list 里有 VectorAnalyzable 的话走 analyze_arrays, 最后才生成 Signal
+        features 是调用方预先填好指标的 FeatureContext, 比如 walk-forward 增量算好的, 它的 candles 必须就是 candle_list
+        dedup_index 不为 None 时, 只有最后一根蜡烛(刚收盘的那根)的信号去 claim, claim 失败的去掉,
+        之前蜡烛的信号在它们是最后一根的时候已经 claim 过, 原样返回, 不会因为 release 或者过期又被当成新信号;
+        live 的时候传 get_dedup_index(), 只对最后一根蜡烛的信号下单, 不同 period 之间也能去重
+        '''
         if (not candle_list) or (not analyst_list):
             return []
         symstr = candle_list[0].symstr
         period = candle_list[0].period
         assert symstr.quote == 'usd' or symstr.base == 'usd', "other currency need to convert riskamt from usd into quote"
-        
+
+        if any(_is_vec(analyst) for analyst in analyst_list):
+            idxs, is_buys, prices, sls, tps = Chief.analyze_arrays(candle_list, peak_set, valley_set, analyst_list, executor, features)
+            open_secs, = get_columns(candle_list, 'open_sec')
+            open_secs = open_secs.tolist() if isinstance(open_secs, np.ndarray) else open_secs
+            signal_list = [
+                Signal(is_buy=is_buy,
+                       price=_as_dec(price),
+                       candle_sec=open_secs[idx],
+                       sl=_as_dec(sl),
+                       tp=_as_dec(tp),
+                       symstr=symstr)
+                for idx, is_buy, price, sl, tp in zip(idxs.tolist(), is_buys.tolist(), prices.tolist(), sls.tolist(), tps.tolist())
+            ]
+            return _claim(signal_list, open_secs[-1], dedup_index)
+
+        ctx = _get_ctx(candle_list, peak_set, valley_set, features)
+        if executor is None:
+            signal_lists = [_run_analyst(analyst, ctx) for analyst in analyst_list]
+        else:
+            future_list = [executor.submit(_run_analyst, analyst, ctx) for analyst in analyst_list]
+            signal_lists = [future.result() for future in future_list]
         signal_list = [
-            signal  # The signal to include in the final list
-            for analyst in analyst_list  # For each analyst in the list of analysts
-            for signal in analyst.analyze(candle_list, peak_set, valley_set)  # For each signal returned by the analyze method
+            signal
+            for analyst_signal_list in signal_lists
+            for signal in analyst_signal_list
         ]
         # 虽然在 _Transaction 生成过程中会去重，但是 live 并不会走到 dashboard 中，所以这里去重很必要
-        signal_list = _sort(_rm_repeat(signal_list))
-        return signal_list
+        with span('chief.merge'):
+            signal_list = _sort(_rm_repeat(signal_list))
+        return _claim(signal_list, candle_list[-1].open_sec, dedup_index)
+
+    @staticmethod
+    @timed('chief.analyze_arrays')
+    def analyze_arrays(candle_list: list[Candle] | CandleSeries,
+                       peak_set:set[Candle],
+                       valley_set:set[Candle],
+                       analyst_list:list[Analyzable | VectorAnalyzable],
+                       executor:Executor | None = None,
+                       features:FeatureContext | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        和 get_signal_arrays 一样返回 (下标, is_buy, price, sl, tp), 可以直接给 get_first_hits 用
+        普通的 Analyzable 用 AnalystAdapter 包一下
+        合并规则和 _rm_repeat 一样, 同一根蜡烛有多个 analyst 出信号时, 排在后面的 analyst 为准, price 也是
+        analyst 没返回 prices 的话, 它的信号 price 用收盘价
+        list[Candle] 的 price sl tp 是 Decimal 的 object 数组, CandleSeries 的是 float64,
+        但只要有 analyst 返回 object 数组(比如 AnalystAdapter 保留的 Decimal), 就都是 object 数组
+        '''
+        ctx = _get_ctx(candle_list, peak_set, valley_set, features)
+        vec_analyst_list = [analyst if _is_vec(analyst) else AnalystAdapter(analyst) for analyst in analyst_list]
+        if executor is None:
+            result_list = [_run_vec_analyst(analyst, ctx) for analyst in vec_analyst_list]
+        else:
+            future_list = [executor.submit(_run_vec_analyst, analyst, ctx) for analyst in vec_analyst_list]
+            result_list = [future.result() for future in future_list]
+
+        with span('chief.merge'):
+            bar_cnt = len(candle_list)
+            is_objs = (not isinstance(candle_list, CandleSeries)) or any(
+                np.asarray(arr).dtype == object
+                for result in result_list
+                for arr in result[2:]
+            )
+            dtype = object if is_objs else np.float64
+            closes, = get_columns(candle_list, 'c')
+            closes = np.asarray(closes, dtype=dtype)
+            has_signals = np.zeros(bar_cnt, dtype=bool)
+            is_buys = np.zeros(bar_cnt, dtype=bool)
+            prices = np.full(bar_cnt, np.nan, dtype=dtype)
+            sls = np.full(bar_cnt, np.nan, dtype=dtype)
+            tps = np.full(bar_cnt, np.nan, dtype=dtype)
+            for buy_mask, sell_mask, analyst_sls, analyst_tps, *analyst_prices in result_list:
+                buy_mask = np.asarray(buy_mask, dtype=bool)
+                is_signals = buy_mask | np.asarray(sell_mask, dtype=bool)
+                has_signals |= is_signals
+                is_buys[is_signals] = buy_mask[is_signals]
+                prices[is_signals] = (np.asarray(analyst_prices[0]) if analyst_prices else closes)[is_signals]
+                sls[is_signals] = np.asarray(analyst_sls)[is_signals]
+                tps[is_signals] = np.asarray(analyst_tps)[is_signals]
+            idxs = np.flatnonzero(has_signals)
+            return idxs, is_buys[idxs], prices[idxs], sls[idxs], tps[idxs]
+
+
+class AnalystAdapter(VectorAnalyzable):
+    '''
+    把 Analyzable 包成 VectorAnalyzable, 只能在 Chief 里用, candles peaks valleys 从 current_features() 拿
+    Signal 的 price sl tp 原样放进 object 数组返回, 和直接调用 analyze 的结果一样
+    '''
+    def __init__(self, analyst:Analyzable) -> None:
+        self.analyst = analyst
+        self.__name__ = _get_name(analyst)
+
+    def analyze_vec(self, o, h, l, c, open_sec) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        ctx = current_features()
+        assert ctx is not None, "AnalystAdapter only runs inside Chief"
+        signal_list = self.analyst.analyze(ctx.candles, ctx.peaks, ctx.valleys)
+        # 同一个 open_sec 出现多次的话, 用第一次出现的蜡烛
+        idx_dict = ctx.memo(('open_sec_idx_dict',), lambda: _get_idx_dict(open_sec))
+        bar_cnt = len(open_sec)
+        buy_mask = np.zeros(bar_cnt, dtype=bool)
+        sell_mask = np.zeros(bar_cnt, dtype=bool)
+        sls = np.full(bar_cnt, np.nan, dtype=object)
+        tps = np.full(bar_cnt, np.nan, dtype=object)
+        prices = np.full(bar_cnt, np.nan, dtype=object)
+        for signal in signal_list:
+            idx = idx_dict.get(signal.candle_sec)
+            if idx is None:
+                continue
+            # 逐个赋值, 同一根蜡烛后面的信号覆盖前面的, 和 _rm_repeat 一样
+            buy_mask[idx] = signal.is_buy
+            sell_mask[idx] = not signal.is_buy
+            sls[idx] = signal.sl
+            tps[idx] = signal.tp
+            prices[idx] = signal.price
+        return buy_mask, sell_mask, sls, tps, prices
+
+
+def _get_ctx(candle_list: list[Candle] | CandleSeries,
+             peak_set:set[Candle],
+             valley_set:set[Candle],
+             features:FeatureContext | None) -> FeatureContext:
+    if features is None:
+        return FeatureContext(candle_list, peak_set, valley_set)
+    assert features.candles is candle_list, "features must be built on candle_list"
+    return features
 
+def _is_vec(analyst) -> bool:
+    return hasattr(analyst, 'analyze_vec')
+
+def _get_name(analyst) -> str:
+    return getattr(analyst, "__name__", type(analyst).__name__)
+
+def _get_idx_dict(open_secs:np.ndarray) -> dict:
+    idx_dict = {}
+    for idx, open_sec in enumerate(np.asarray(open_secs).tolist()):
+        idx_dict.setdefault(open_sec, idx)
+    return idx_dict
+
+def _run_vec_analyst(analyst:VectorAnalyzable, ctx:FeatureContext) -> tuple:
+    with span(f'chief.analyst.{_get_name(analyst)}'):
+        cols = ctx.memo(('float_columns',), lambda: [
+            np.asarray(col, dtype=np.float64)
+            for col in get_columns(ctx.candles, 'o', 'h', 'l', 'c', 'open_sec')
+        ])
+        return run_with_features(ctx, analyst.analyze_vec, *cols)
+
+
+def _run_analyst(analyst:Analyzable, ctx:FeatureContext) -> list[Signal]:
+    # 放在模块级别, 进程池才能 pickle
+    with span(f'chief.analyst.{_get_name(analyst)}'):
+        return run_with_features(ctx, analyst.analyze, ctx.candles, ctx.peaks, ctx.valleys)
+
+def _claim(signal_list:list[Signal], last_sec:float, dedup_index:SignalDedupIndex | None) -> list[Signal]:
+    if dedup_index is None:
+        return signal_list
+    uniq_signal_list = [
+        signal
+        for signal in signal_list
+        if signal.candle_sec != last_sec or dedup_index.claim(signal)
+    ]
+    incr('chief.dedup_drop', len(signal_list) - len(uniq_signal_list))
+    return uniq_signal_list
 
 def _sort(signal_list:list[Signal]) -> list[Signal]:
     return sorted(signal_list, key=lambda x: x.candle_sec)
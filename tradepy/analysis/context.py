@@ -0,0 +1,26 @@
+from contextvars import ContextVar
+from typing import Callable, TYPE_CHECKING
+from ..model.candle import Candle, CandleSeries
+if TYPE_CHECKING:
+    from .feature import FeatureContext
+
+# 不依赖 analysis 里的其他模块, analysis/__init__ 的 get_signals 可以直接 import
+_current_features:ContextVar['FeatureContext | None'] = ContextVar('current_features', default=None)
+
+def current_features() -> 'FeatureContext | None':
+    '''
+    在 Chief.analyze 里运行的 analyst 可以用这个拿到共享的 FeatureContext, 其他时候是 None
+    '''
+    return _current_features.get()
+
+def get_features(candles: list[Candle] | CandleSeries) -> 'FeatureContext | None':
+    # 只有 candles 是同一个对象时才能用缓存的指标
+    ctx = _current_features.get()
+    return ctx if ctx is not None and ctx.candles is candles else None
+
+def run_with_features(ctx:'FeatureContext', func:Callable, *args):
+    token = _current_features.set(ctx)
+    try:
+        return func(*args)
+    finally:
+        _current_features.reset(token)
@@ -1,13 +1,18 @@
-from ..model.candle import Candle, STRTIME_FMT
-from ..model.signal import Signal
+from ..model.candle import Candle, CandleSeries, TimeAxis, get_strtimes
+from ..model.signal import Signal, round_to_point
 from plotly import graph_objects as go
 from plotly.subplots import make_subplots
 from decimal import Decimal
 import pandas as pd
-from . import FeeCalculable, Analyzable, get_rsis, get_emas, get_atrs, get_peaks_valleys
+import numpy as np
+from . import FeeCalculable, Analyzable, get_rsis, get_emas, get_atrs, get_peaks_valleys, get_columns, get_ema_floats, get_atr_floats, get_rsi_floats
+from .backtest import get_first_hits
+from . import render
 from ..common import utc_date, trunc
+from ..common.instrument import timed, get_instrument
 from ..model import SymbolStr
-from functools import reduce
+import heapq
+import math
 
 class _Transaction:
     def __init__(self,
@@ -39,6 +44,15 @@ class _Transaction:
     def is_sl(self) -> bool:
         return not self.is_tp
 
+def _to_point_lim(price:Decimal, digits:int, is_floor:bool) -> int:
+    pts = price.scaleb(digits)
+    return math.floor(pts) if is_floor else math.ceil(pts)
+
+def _get_tran_key(tran:_Transaction) -> tuple:
+    # 同 symstr 不同 period 的重复订单, price sl tp 都一样
+    symstr = tran.symstr
+    return (symstr, *[round_to_point(price, symstr) for price in (tran.price, tran.sl, tran.tp)])
+
 class Dashboard:
     '''
     现实中的交易过程是， 同时监听 eurusd h12 h4 的数据， symbol 不一样的情况不需要去重，就不用考虑了
@@ -51,9 +65,11 @@ class Dashboard:
     这种情况重复的条件是 symbol, price, tp, sl, is_buy 都对应想等
     '''
     @staticmethod
-    def draw_paral_trade_asset(data_list:list, spread:Decimal, risk_perc:Decimal, init_balance_usd:Decimal, leverage:Decimal, fee_calc:FeeCalculable, balance_title:str):
+    @timed('dashboard.draw_paral_trade_asset')
+    def draw_paral_trade_asset(data_list:list, spread:Decimal, risk_perc:Decimal, init_balance_usd:Decimal, leverage:Decimal, fee_calc:FeeCalculable, balance_title:str, max_points:int | None = None):
         """
         只画资产走势图
+        max_points 不为 None 时, 资产曲线用 LTTB 降到这么多个点, 用 WebGL 画
         """
         #只保留有信号的组合
         data_list = [data for data in data_list if data[1]]
@@ -72,23 +88,10 @@ class Dashboard:
         tp_cnt, sl_cnt, time_balance_usedmargin_list = Dashboard._summarize_paral_trade_asset_with_alltrans(all_tran_list, risk_perc, init_balance_usd, leverage, fee_calc)
         _, balance_start, _ = time_balance_usedmargin_list[0]
         _, balance_end, _ = time_balance_usedmargin_list[-1]
-        date_list = [utc_date(t_sec) for t_sec,_,_ in time_balance_usedmargin_list]
-        strtime_list = [date.strftime(STRTIME_FMT) for date in date_list]
+        strtime_list = get_strtimes([t_sec for t_sec,_,_ in time_balance_usedmargin_list])
         Dashboard._print_paral_trade_asset(tp_cnt, sl_cnt, balance_start, balance_end, strtime_list[0], strtime_list[-1])
-        # balance
-        print('start draw balance')
-        balance_trace = go.Scatter(
-            x=strtime_list,
-            y=[b for _,b,_ in time_balance_usedmargin_list],
-            line=dict(width=1, color='#2962FF')
-        )
-        # used margin
-        print('start draw usermargin')
-        used_margin_trace = go.Scatter(
-            x=strtime_list,
-            y=[um for _,_,um in time_balance_usedmargin_list],
-            line=dict(width=1, color='rgba(8, 153, 129, 1)')
-        )
+        print('start draw balance and usermargin')
+        balance_trace, used_margin_trace = Dashboard._get_balance_traces(time_balance_usedmargin_list, strtime_list, max_points)
         fig.add_trace(balance_trace, row=1, col=1)
         fig.add_trace(used_margin_trace, row=2, col=1)
         layout_update_dict = {
@@ -103,14 +106,17 @@ class Dashboard:
         fig.show()
 
     @staticmethod
+    @timed('dashboard.draw_paral_trade_symbolperiod_asset')
     def draw_paral_trade_symbolperiod_asset(data_list: list, 
                                                   spread:Decimal, 
                                                   risk_perc:Decimal, 
                                                   init_balance_usd:Decimal, 
                                                   leverage:Decimal, 
-                                                  fee_calc:FeeCalculable):
+                                                  fee_calc:FeeCalculable,
+                                                  max_points:int | None = None):
         """
         画所有交易对的图, 以及资产走势图
+        max_points 不为 None 时, 蜡烛和折线降采样到这么多个点, 交易方框合并成几条 trace, 历史很长时浏览器也不会卡
         """
         #只保留有信号的组合
         data_list = [data for data in data_list if data[1]]
@@ -135,12 +141,13 @@ class Dashboard:
             trace_y_end = min(1.0, 1-idx*trace_y_perc)
             trace_y_start = max(0.0, trace_y_end-trace_y_perc)
             trace_y_domain = [trace_y_start, trace_y_end]
-            shape_list = Dashboard._get_shapes(tran_list)
-            candle_trace = Dashboard._get_candle_traces(candle_list)
-            trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set)
-            ema_trace = Dashboard._get_ema_traces(candle_list)
-            buy_trace = Dashboard._get_buy_signals_traces(candle_list, signal_list)
-            sell_trace = Dashboard._get_sell_signals_traces(candle_list, signal_list)
+            # 时间轴只转一次, 各个 trace 和 shape 共用
+            axis = TimeAxis.of(candle_list)
+            candle_trace = Dashboard._get_candle_traces(candle_list, max_points, axis)
+            trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set, max_points, axis)
+            ema_trace = Dashboard._get_ema_traces(candle_list, max_points, axis)
+            buy_trace = Dashboard._get_buy_signals_traces(candle_list, signal_list, max_points, axis)
+            sell_trace = Dashboard._get_sell_signals_traces(candle_list, signal_list, max_points, axis)
             row = idx+1
             fig.add_traces([candle_trace, trend_trace, ema_trace, buy_trace, sell_trace], rows=row, cols=1)
             layout_update_dict = {
@@ -148,28 +155,20 @@ class Dashboard:
                 f'yaxis{idx+1}': {'showgrid':False, 'domain':trace_y_domain, 'zeroline':False}
             }
             fig.update_layout(**layout_update_dict)
-            [fig.add_shape(shape, row=row, col=1) for shape in shape_list]
+            if max_points is not None:
+                box_trace_list = render.get_tran_box_traces(tran_list)
+                fig.add_traces(box_trace_list, rows=[row]*len(box_trace_list), cols=[1]*len(box_trace_list))
+            else:
+                shape_list = Dashboard._get_shapes(tran_list, axis)
+                [fig.add_shape(shape, row=row, col=1) for shape in shape_list]
         
         tp_cnt, sl_cnt, time_balance_usedmargin_list = Dashboard._summarize_paral_trade_asset_with_alltrans(all_tran_list, risk_perc, init_balance_usd, leverage, fee_calc)
         _, balance_start, _ = time_balance_usedmargin_list[0]
         _, balance_end, _ = time_balance_usedmargin_list[-1]
-        date_list = [utc_date(t_sec) for t_sec,_,_ in time_balance_usedmargin_list]
-        strtime_list = [date.strftime(STRTIME_FMT) for date in date_list]
+        strtime_list = get_strtimes([t_sec for t_sec,_,_ in time_balance_usedmargin_list])
         Dashboard._print_paral_trade_asset(tp_cnt, sl_cnt, balance_start, balance_end, strtime_list[0], strtime_list[-1])
-        # balance
-        print('start draw balance')
-        balance_trace = go.Scatter(
-            x=strtime_list,
-            y=[b for _,b,_ in time_balance_usedmargin_list],
-            line=dict(width=1, color='#2962FF')
-        )
-        # used margin
-        print('start draw usermargin')
-        used_margin_trace = go.Scatter(
-            x=strtime_list,
-            y=[um for _,_,um in time_balance_usedmargin_list],
-            line=dict(width=1, color='rgba(8, 153, 129, 1)')
-        )
+        print('start draw balance and usermargin')
+        balance_trace, used_margin_trace = Dashboard._get_balance_traces(time_balance_usedmargin_list, strtime_list, max_points)
         fig.add_trace(balance_trace, row=len(data_list) + 1, col=1)
         fig.add_trace(used_margin_trace, row=len(data_list) + 2, col=1)
         balance_trace_y_end = 1-len(data_list)*trace_y_perc
@@ -192,6 +191,33 @@ class Dashboard:
             fig.layout.annotations[idx].update(y=1-idx*trace_y_perc)
         fig.show()
 
+    @staticmethod
+    def _get_balance_traces(time_balance_usedmargin_list:list[tuple], strtime_list:list[str], max_points:int | None = None) -> tuple:
+        if max_points is not None:
+            t_secs = [t_sec for t_sec,_,_ in time_balance_usedmargin_list]
+            balance_trace = render.get_line_trace(t_secs,
+                                                  [b for _,b,_ in time_balance_usedmargin_list],
+                                                  max_points,
+                                                  line=dict(width=1, color='#2962FF'))
+            used_margin_trace = render.get_line_trace(t_secs,
+                                                      [um for _,_,um in time_balance_usedmargin_list],
+                                                      max_points,
+                                                      line=dict(width=1, color='rgba(8, 153, 129, 1)'))
+            return balance_trace, used_margin_trace
+        # balance
+        balance_trace = go.Scatter(
+            x=strtime_list,
+            y=[b for _,b,_ in time_balance_usedmargin_list],
+            line=dict(width=1, color='#2962FF')
+        )
+        # used margin
+        used_margin_trace = go.Scatter(
+            x=strtime_list,
+            y=[um for _,_,um in time_balance_usedmargin_list],
+            line=dict(width=1, color='rgba(8, 153, 129, 1)')
+        )
+        return balance_trace, used_margin_trace
+
     @staticmethod
     def _print_paral_trade_asset(tp_cnt:int, 
                                  sl_cnt:int, 
@@ -222,6 +248,7 @@ class Dashboard:
         return Dashboard._summarize_paral_trade_asset_with_alltrans(all_tran_list, risk_perc, init_balance_usd, leverage, fee_calc)
 
     @staticmethod
+    @timed('dashboard.simulate')
     def _summarize_paral_trade_asset_with_alltrans(all_tran_list: list[_Transaction], 
                                                          risk_perc:Decimal, 
                                                          init_balance_usd:Decimal, 
@@ -233,89 +260,95 @@ class Dashboard:
         time_balance_usedmargin_list:list[tuple] = [] # for drawing line chart
         tp_cnt = 0
         sl_cnt = 0
-        pending_tran_list:list[_Transaction] = [] # 去除同 symstr 不同 period 之间，重复下单
 
         # 相同symbolstr不同period，比如h4和h12，一根h12就是三根h4, 因为是open sec, 如果在第一个h4，都出现了信号，那就是同样的opensec，不同的period，其他的price，tp sl 也可能一样，这种情况会被合并掉了，没问题
         # 但是如果是 第三根 h4, 虽然open_sec 不一样，其他的price，tp sl 也可能一样， 这种情况并不会合并， 那么实际上会是重复的订单
         all_tran_list = sorted(all_tran_list, key=lambda x: x.from_candle_open_sec)
-        time_set_list:list[set] = [
-            {tran.from_candle_open_sec, tran.to_candle_open_sec}
-            for tran in all_tran_list
+        # 事件是 (时间, 0平仓/1开仓, 在 all_tran_list 里的顺序)
+        # 同一时间先平仓释放 used margin 再开仓, 同类事件按 all_tran_list 的顺序处理
+        event_heap = [
+            event
+            for seq, tran in enumerate(all_tran_list)
+            for event in ((tran.to_candle_open_sec, 0, seq), (tran.from_candle_open_sec, 1, seq))
         ]
-        time_set: set[int] = reduce(lambda a,b: a.union(b), time_set_list)
-        time_list = sorted(list(time_set))
-
-        def is_tran_pending(tran:_Transaction, pending_tran_list:list[_Transaction]) -> bool:
-            for ptran in pending_tran_list:
-                if (ptran.price == tran.price and
-                    ptran.sl == tran.sl and
-                    ptran.tp == tran.tp and
-                    ptran.symstr == tran.symstr):
-                    return True
-            return False
+        heapq.heapify(event_heap)
+        pending_seq_dict:dict[int, tuple] = {} # seq -> _get_tran_key, 平仓时不用再算一遍
+        pending_key_set:set[tuple] = set() # 去除同 symstr 不同 period 之间，重复下单
+        tot_risk_amt_usd = Decimal(0)
+        inst = get_instrument()
 
-
-        for t_sec in time_list:
-            for tran in all_tran_list:
-                # 先平仓释放 used margin
-                if tran.to_candle_open_sec == t_sec and tran in pending_tran_list:
-                    # 平仓
-                    fill_price = tran.sl if tran.is_sl else tran.tp
-                    diff_order_amt_quote = tran.unit * abs(fill_price - tran.price)
-                    diff_order_amt_usd = diff_order_amt_quote if tran.symstr.quote == 'usd' else diff_order_amt_quote / fill_price
-                    # profit or loss
-                    balance_usd += (diff_order_amt_usd if tran.is_tp else -diff_order_amt_usd)
-                    # commission fee
-                    balance_usd += fee_calc.get_commission_fee(tran.order_amt_usd)
-                    # swap fee
-                    balance_usd += fee_calc.get_swap_fee(tran.symstr, 
-                                                               tran.unit/pow(10,5),
-                                                               tran.from_candle_open_sec, 
-                                                               tran.to_candle_open_sec, 
-                                                               tran.is_buy)
-                    used_margin_usd = max(0, used_margin_usd - tran.used_margin_usd)
-                    time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
-                    tp_cnt += 1 if tran.is_tp else 0
-                    sl_cnt += 1 if tran.is_sl else 0
-                    pending_tran_list.remove(tran)
-                    print("    <-- closing position")
-
-                elif tran.from_candle_open_sec == t_sec:
-                    risk_amt_usd = max(balance_usd * risk_perc, min_risk_amt_usd)
-                    free_margin_usd = balance_usd - used_margin_usd
-                    tot_risk_amt_usd = reduce(lambda a,b: a+b, [t.risk_amt_usd for t in pending_tran_list]) if pending_tran_list else 0
-                    margin_to_risk_usd = free_margin_usd - tot_risk_amt_usd
-                    if margin_to_risk_usd >= risk_amt_usd:
-                        if is_tran_pending(tran, pending_tran_list):
-                            print('pending tran exist')
-                        else:
-                            # 下单
-                            risk_amt_quote = risk_amt_usd if tran.symstr.quote == 'usd' else risk_amt_usd * tran.price
-                            unit = risk_amt_quote / abs(tran.sl - tran.price)
-                            order_amt_quote = unit * tran.price
-                            order_amt_usd = order_amt_quote if tran.symstr.quote == 'usd' else order_amt_quote / tran.price
-                            order_used_margin_usd = order_amt_usd / leverage
-                            tran.unit = unit
-                            tran.risk_amt_usd = risk_amt_usd
-                            tran.order_amt_usd = order_amt_usd
-                            tran.used_margin_usd = order_used_margin_usd
-                            used_margin_usd += order_used_margin_usd
-                            time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
-                            balance_usd += fee_calc.get_commission_fee(order_amt_usd)
-                            pending_tran_list.append(tran)
-                            print("--> opening position")
+        while event_heap:
+            t_sec, is_open, seq = heapq.heappop(event_heap)
+            tran = all_tran_list[seq]
+            if not is_open:
+                if seq not in pending_seq_dict:
+                    continue
+                # 平仓
+                fill_price = tran.sl if tran.is_sl else tran.tp
+                diff_order_amt_quote = tran.unit * abs(fill_price - tran.price)
+                diff_order_amt_usd = diff_order_amt_quote if tran.symstr.quote == 'usd' else diff_order_amt_quote / fill_price
+                # profit or loss
+                balance_usd += (diff_order_amt_usd if tran.is_tp else -diff_order_amt_usd)
+                # commission fee
+                balance_usd += fee_calc.get_commission_fee(tran.order_amt_usd)
+                # swap fee
+                balance_usd += fee_calc.get_swap_fee(tran.symstr, 
+                                                           tran.unit/pow(10,5),
+                                                           tran.from_candle_open_sec, 
+                                                           tran.to_candle_open_sec, 
+                                                           tran.is_buy)
+                used_margin_usd = max(0, used_margin_usd - tran.used_margin_usd)
+                time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
+                tp_cnt += 1 if tran.is_tp else 0
+                sl_cnt += 1 if tran.is_sl else 0
+                pending_key_set.remove(pending_seq_dict.pop(seq))
+                tot_risk_amt_usd = tot_risk_amt_usd - tran.risk_amt_usd if pending_seq_dict else Decimal(0)
+                if inst is not None:
+                    inst.event('dashboard.close', t_sec=t_sec, symstr=tran.symstr, is_tp=tran.is_tp, balance_usd=balance_usd)
+            else:
+                risk_amt_usd = max(balance_usd * risk_perc, min_risk_amt_usd)
+                free_margin_usd = balance_usd - used_margin_usd
+                margin_to_risk_usd = free_margin_usd - tot_risk_amt_usd
+                if margin_to_risk_usd >= risk_amt_usd:
+                    tran_key = _get_tran_key(tran)
+                    if tran_key in pending_key_set:
+                        if inst is not None:
+                            inst.event('dashboard.duplicate', t_sec=t_sec, symstr=tran.symstr)
                     else:
-                        print("no enough free margin to place order")
+                        # 下单
+                        risk_amt_quote = risk_amt_usd if tran.symstr.quote == 'usd' else risk_amt_usd * tran.price
+                        unit = risk_amt_quote / abs(tran.sl - tran.price)
+                        order_amt_quote = unit * tran.price
+                        order_amt_usd = order_amt_quote if tran.symstr.quote == 'usd' else order_amt_quote / tran.price
+                        order_used_margin_usd = order_amt_usd / leverage
+                        tran.unit = unit
+                        tran.risk_amt_usd = risk_amt_usd
+                        tran.order_amt_usd = order_amt_usd
+                        tran.used_margin_usd = order_used_margin_usd
+                        used_margin_usd += order_used_margin_usd
+                        time_balance_usedmargin_list.append((t_sec, balance_usd, used_margin_usd))
+                        balance_usd += fee_calc.get_commission_fee(order_amt_usd)
+                        pending_seq_dict[seq] = tran_key
+                        pending_key_set.add(tran_key)
+                        tot_risk_amt_usd += risk_amt_usd
+                        if inst is not None:
+                            inst.event('dashboard.open', t_sec=t_sec, symstr=tran.symstr, is_buy=tran.is_buy, risk_amt_usd=risk_amt_usd)
+                else:
+                    if inst is not None:
+                        inst.event('dashboard.reject_margin', t_sec=t_sec, symstr=tran.symstr, free_margin_usd=free_margin_usd)
         return tp_cnt, sl_cnt, time_balance_usedmargin_list
     
     @staticmethod
-    def draw_candles(candle_list: list[Candle]):
+    @timed('dashboard.draw_candles')
+    def draw_candles(candle_list: list[Candle], max_points:int | None = None):
         peak_set, valley_set = get_peaks_valleys(candle_list)
-        candle_trace = Dashboard._get_candle_traces(candle_list)
-        trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set)
-        ema_trace = Dashboard._get_ema_traces(candle_list)
-        atr_trace = Dashboard._get_atr_traces(candle_list)
-        rsi_trace = Dashboard._get_rsi_traces(candle_list)
+        # 时间轴只转一次, 各个 trace 和 shape 共用
+        axis = TimeAxis.of(candle_list)
+        candle_trace = Dashboard._get_candle_traces(candle_list, max_points, axis)
+        trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set, max_points, axis)
+        ema_trace = Dashboard._get_ema_traces(candle_list, max_points, axis)
+        atr_trace = Dashboard._get_atr_traces(candle_list, max_points, axis)
+        rsi_trace = Dashboard._get_rsi_traces(candle_list, max_points, axis)
 
         fig = make_subplots(rows=3, cols=1, shared_xaxes=True)
 
@@ -343,20 +376,23 @@ class Dashboard:
         fig.show()
 
     @staticmethod
+    @timed('dashboard.draw_candles_with_signals')
     def draw_candles_with_signals(candle_list: list[Candle], 
                           analyst: Analyzable,
-                          spread:Decimal):
+                          spread:Decimal,
+                          max_points:int | None = None):
         peak_set, valley_set = get_peaks_valleys(candle_list)
         signal_list = analyst.analyze(candle_list, peak_set, valley_set)
         tran_list = Dashboard._get_trans(candle_list, signal_list, spread)
-        shape_list = Dashboard._get_shapes(tran_list)
-        candle_trace = Dashboard._get_candle_traces(candle_list)
-        trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set)
-        ema_trace = Dashboard._get_ema_traces(candle_list)
-        atr_trace = Dashboard._get_atr_traces(candle_list)
-        rsi_trace = Dashboard._get_rsi_traces(candle_list)
-        buy_trace = Dashboard._get_buy_signals_traces(candle_list, signal_list)
-        sell_trace = Dashboard._get_sell_signals_traces(candle_list, signal_list)
+        # 时间轴只转一次, 各个 trace 和 shape 共用
+        axis = TimeAxis.of(candle_list)
+        candle_trace = Dashboard._get_candle_traces(candle_list, max_points, axis)
+        trend_trace = Dashboard._get_trends_traces(candle_list, peak_set, valley_set, max_points, axis)
+        ema_trace = Dashboard._get_ema_traces(candle_list, max_points, axis)
+        atr_trace = Dashboard._get_atr_traces(candle_list, max_points, axis)
+        rsi_trace = Dashboard._get_rsi_traces(candle_list, max_points, axis)
+        buy_trace = Dashboard._get_buy_signals_traces(candle_list, signal_list, max_points, axis)
+        sell_trace = Dashboard._get_sell_signals_traces(candle_list, signal_list, max_points, axis)
         
         fig = make_subplots(rows=3, cols=1, shared_xaxes=True)
 
@@ -369,7 +405,11 @@ class Dashboard:
             paper_bgcolor='#151924'
         )
         fig.add_traces([buy_trace, sell_trace], rows=1, cols=1)
-        fig.update_layout(shapes=shape_list)
+        if max_points is not None:
+            box_trace_list = render.get_tran_box_traces(tran_list)
+            fig.add_traces(box_trace_list, rows=[1]*len(box_trace_list), cols=[1]*len(box_trace_list))
+        else:
+            fig.update_layout(shapes=Dashboard._get_shapes(tran_list, axis))
 
         # row 2
         fig.add_trace(atr_trace, row=2, col=1)
@@ -384,7 +424,7 @@ class Dashboard:
             yaxis3=dict(showgrid=False, domain=[0, 0.2]),
         )
         fig.show()
-        tp_cnt, sl_cnt = Dashboard.summarize(candle_list, signal_list)
+        tp_cnt, sl_cnt = Dashboard.summarize(candle_list, signal_list, spread)
         tot_cnt = tp_cnt+sl_cnt
         tp_perc = tp_cnt / tot_cnt
         sl_perc = sl_cnt / tot_cnt
@@ -399,16 +439,27 @@ class Dashboard:
         print(f'\n{summ_str}')
 
     @staticmethod
-    def _get_candle_traces(candle_list: list[Candle]):
+    def _get_candle_traces(candle_list: list[Candle], max_points:int | None = None, axis:TimeAxis | None = None):
+        green = '#089981'
+        red = '#F23645'
+        if max_points is not None:
+            open_secs, o, h, l, c = render.downsample_ohlc(*get_columns(candle_list, 'open_sec', 'o', 'h', 'l', 'c'), max_points)
+            return go.Candlestick(
+                x=render.to_datetimes(open_secs),
+                open=o,
+                high=h,
+                low=l,
+                close=c,
+                increasing=dict(line=dict(color=green, width=1), fillcolor=green),
+                decreasing=dict(line=dict(color=red, width=1), fillcolor=red)
+            )
         df = pd.DataFrame(dict(
-            st=[c.strtime for c in candle_list],
+            st=(axis or TimeAxis.of(candle_list)).strtimes,
             o=[c.o for c in candle_list],
             h=[c.h for c in candle_list],
             l=[c.l for c in candle_list],
             c=[c.c for c in candle_list]
         ))
-        green = '#089981'
-        red = '#F23645'
         candle_trace = go.Candlestick(
             x=df.st,
             open=df.o,
@@ -421,21 +472,28 @@ class Dashboard:
         return candle_trace
     
     @staticmethod
-    def _get_ema_traces(candle_list: list[Candle]):
+    def _get_ema_traces(candle_list: list[Candle], max_points:int | None = None, axis:TimeAxis | None = None):
         #draw ema
         blue = '#2962FF'
+        if max_points is not None:
+            open_secs, closes = get_columns(candle_list, 'open_sec', 'c')
+            return render.get_line_trace(open_secs, get_ema_floats(closes, win=60), max_points, line=dict(width=1, color=blue))
         ema_list = get_emas([c.c for c in candle_list], win=60)
         ema_trace = go.Scatter(
-            x=[c.strtime for c in candle_list],
+            x=(axis or TimeAxis.of(candle_list)).strtimes,
             y=ema_list,
             line=dict(width=1, color=blue)
         )
         return ema_trace
     
     @staticmethod
-    def _get_atr_traces(candle_list: list[Candle]):
+    def _get_atr_traces(candle_list: list[Candle], max_points:int | None = None, axis:TimeAxis | None = None):
+        if max_points is not None:
+            open_secs, highs, lows, closes = get_columns(candle_list, 'open_sec', 'h', 'l', 'c')
+            atrs = get_atr_floats(highs, lows, closes, win=14)
+            return render.get_line_trace(open_secs, atrs, max_points, line=dict(width=1, color='rgba(8, 153, 129, 1)'))
         df = pd.DataFrame(dict(
-            st=[c.strtime for c in candle_list],
+            st=(axis or TimeAxis.of(candle_list)).strtimes,
             o=[c.o for c in candle_list],
             h=[c.h for c in candle_list],
             l=[c.l for c in candle_list],
@@ -451,11 +509,14 @@ class Dashboard:
         return atr_trace
 
     @staticmethod
-    def _get_rsi_traces(candle_list: list[Candle]):
+    def _get_rsi_traces(candle_list: list[Candle], max_points:int | None = None, axis:TimeAxis | None = None):
         #draw rsi
+        if max_points is not None:
+            open_secs, closes = get_columns(candle_list, 'open_sec', 'c')
+            return render.get_line_trace(open_secs, get_rsi_floats(closes, win=7), max_points, line=dict(width=1, color='rgba(8, 153, 129, 1)'))
         rsi_list = get_rsis([candle.c for candle in candle_list], win=7)
         rsi_trace = go.Scatter(
-            x=[candle.strtime for candle in candle_list],
+            x=(axis or TimeAxis.of(candle_list)).strtimes,
             y=rsi_list,
             line=dict(width=1, color='rgba(8, 153, 129, 1)')
         )
@@ -465,12 +526,21 @@ class Dashboard:
     @staticmethod
     def _get_trends_traces(candle_list: list[Candle],
                     peak_set:set[Candle],
-                    valley_set:set[Candle]):
+                    valley_set:set[Candle],
+                    max_points:int | None = None,
+                    axis:TimeAxis | None = None):
         #draw trends
         peak_valley_set = {*peak_set, *valley_set}
+        if max_points is not None:
+            pivot_list = sorted(peak_valley_set, key=lambda c: c.open_sec)
+            return render.get_line_trace([c.open_sec for c in pivot_list],
+                                         [c.c for c in pivot_list],
+                                         max_points,
+                                         line=dict(width=1, color='rgba(41, 98, 255, 0.5)'))
+        pivot_idxs = [idx for idx, c in enumerate(candle_list) if c in peak_valley_set]
         trend_trace = go.Scatter(
-            x=[c.strtime for c in candle_list if c in peak_valley_set],
-            y=[c.c for c in candle_list if c in peak_valley_set],
+            x=(axis or TimeAxis.of(candle_list)).strtimes[pivot_idxs],
+            y=[candle_list[idx].c for idx in pivot_idxs],
             line=dict(width=1, color='rgba(41, 98, 255, 0.5)')
         )
         # draw signals's tp and sl transactions
@@ -478,13 +548,24 @@ class Dashboard:
     
     @staticmethod
     def _get_sell_signals_traces(candle_list: list[Candle],
-                    signal_list: list[Signal]):
+                    signal_list: list[Signal],
+                    max_points:int | None = None,
+                    axis:TimeAxis | None = None):
         # draw sell signals
         yellow = '#ffff3f'
         sell_sec_set = set([s.candle_sec for s in signal_list if not s.is_buy])
+        if max_points is not None:
+            # WebGL 画 marker 很快, 信号不降采样
+            sell_signal_list = [s for s in signal_list if s.candle_sec in sell_sec_set]
+            return go.Scattergl(
+                x=render.to_datetimes([s.candle_sec for s in sell_signal_list]),
+                y=[float(s.price) for s in sell_signal_list],
+                mode='markers',
+                marker=dict(size=10, color=yellow, symbol='triangle-down')
+            )
         sell_candle_list = [c for c in candle_list if c.open_sec in sell_sec_set]
         sell_trace = go.Scatter(
-            x=[c.strtime for c in sell_candle_list],
+            x=(axis or TimeAxis.of(candle_list)).get_strtimes([c.open_sec for c in sell_candle_list]),
             y=[c.c for c in sell_candle_list],
             mode='markers',
             marker=dict(size=10, color=yellow, symbol='triangle-down')
@@ -493,13 +574,24 @@ class Dashboard:
     
     @staticmethod
     def _get_buy_signals_traces(candle_list: list[Candle],
-                    signal_list: list[Signal]):
+                    signal_list: list[Signal],
+                    max_points:int | None = None,
+                    axis:TimeAxis | None = None):
         # draw buy signals
         yellow = '#ffff3f'
         buy_sec_set = set([s.candle_sec for s in signal_list if s.is_buy])
+        if max_points is not None:
+            # WebGL 画 marker 很快, 信号不降采样
+            buy_signal_list = [s for s in signal_list if s.candle_sec in buy_sec_set]
+            return go.Scattergl(
+                x=render.to_datetimes([s.candle_sec for s in buy_signal_list]),
+                y=[float(s.price) for s in buy_signal_list],
+                mode='markers',
+                marker=dict(size=10, color=yellow, symbol='triangle-up')
+            )
         buy_candle_list = [c for c in candle_list if c.open_sec in buy_sec_set]
         buy_trace = go.Scatter(
-            x=[c.strtime for c in buy_candle_list],
+            x=(axis or TimeAxis.of(candle_list)).get_strtimes([c.open_sec for c in buy_candle_list]),
             y=[c.c for c in buy_candle_list],
             mode='markers',
             marker=dict(size=10, color=yellow, symbol='triangle-up')
@@ -507,6 +599,7 @@ class Dashboard:
         return buy_trace
 
     @staticmethod
+    @timed('dashboard.summarize')
     def summarize(candle_list: list[Candle],
                   signal_list: list[Signal],
                   spread:Decimal,
@@ -528,16 +621,17 @@ class Dashboard:
                     return total_tp_cnt, total_sl_cnt
 
     @staticmethod
-    def _get_shapes(tran_list:list[_Transaction]) -> list[dict]:
+    @timed('dashboard.get_shapes')
+    def _get_shapes(tran_list:list[_Transaction], axis:TimeAxis | None = None) -> list[dict]:
         green = '#089981'
         red = '#F23645'
         shape_list = []
-        for tran in tran_list:
-            from_date = utc_date(tran.from_candle_open_sec)
-            to_date = utc_date(tran.to_candle_open_sec)
-            x0 = from_date.strftime(STRTIME_FMT)
+        # 所有交易的时间一次转好
+        get_strs = axis.get_strtimes if axis is not None else get_strtimes
+        x0_list = get_strs([tran.from_candle_open_sec for tran in tran_list]).tolist()
+        x1_list = get_strs([tran.to_candle_open_sec for tran in tran_list]).tolist()
+        for tran, x0, x1 in zip(tran_list, x0_list, x1_list):
             y0 = tran.price
-            x1 = to_date.strftime(STRTIME_FMT)
             tp_opacity = 0.5 if tran.is_tp else 0.1
             sl_opacity = 0.5 if tran.is_sl else 0.1
             # drawing take-profit transactions
@@ -571,48 +665,88 @@ class Dashboard:
         return shape_list
 
     @staticmethod
-    def _get_trans(candles: list[Candle],
+    @timed('dashboard.get_trans')
+    def _get_trans(candles: list[Candle] | CandleSeries,
                    signals: list[Signal],
                    spread:Decimal) -> list[_Transaction]:
         # 同一个 symbol period 的一根蜡烛，不会同时 buy 和 sell 信号出现， 一个 open_sec 确实只应该出现一个信号
         signal_dict = {signal.candle_sec: signal for signal in signals}
-        pending_signal_set = set()
+        open_secs, = get_columns(candles, 'open_sec')
+        # 同一个 open_sec 出现多次的话, 信号从第一次出现的蜡烛开始 pending
+        idx_dict = {}
+        for idx, open_sec in enumerate(np.asarray(open_secs, dtype=np.float64).tolist()):
+            idx_dict.setdefault(open_sec, idx)
+        idx_signal_list = sorted(
+            [(idx_dict[sec], signal) for sec, signal in signal_dict.items() if sec in idx_dict],
+            key=lambda x: x[0]
+        )
+        sig_list = [signal for _,signal in idx_signal_list]
+        pos_list, bar_list, is_tp_list = Dashboard._get_first_hits(candles,
+                                                                   sig_list,
+                                                                   [idx for idx,_ in idx_signal_list],
+                                                                   spread)
         tran_list: list[_Transaction] = []
+        for pos, bar, is_tp in zip(pos_list, bar_list, is_tp_list):
+            ps = sig_list[pos]
+            tran = _Transaction(from_candle_open_sec=ps.candle_sec,
+                                is_buy=ps.is_buy,
+                                sl=ps.sl,
+                                tp=ps.tp,
+                                price=ps.price,
+                                to_candle_open_sec=candles[bar].open_sec,
+                                symstr=ps.symstr)
+            tran.is_tp = is_tp
+            tran_list.append(tran)
+        return tran_list
+
+    @staticmethod
+    def _get_first_hits(candles: list[Candle] | CandleSeries,
+                        sig_list: list[Signal],
+                        sig_idxs: list[int],
+                        spread:Decimal,
+                        start:int=0,
+                        stop:int | None = None) -> tuple[list[int], list[int], list[bool]]:
+        '''
+        sig_list[i] 是 candles[sig_idxs[i]] 的信号, 返回 get_first_hits 一样的 (信号位置, 蜡烛下标, 是否 tp)
+        只检查 [start, stop) 里的蜡烛, 信号在 start 之前的从 start 开始检查, walk-forward 可以只看新的蜡烛
+        '''
         symstr = candles[0].symstr
         spread_price = spread/(100 if symstr.quote == 'jpy' else pow(10, 4))
         # candle's price actually is middle of ask/bid. so use half spread to calc
         half_spread_price = spread_price/2
-        for candle in candles:
-            rm_list = []
-            for ps in pending_signal_set:
-                tran = _Transaction(from_candle_open_sec=ps.candle_sec,
-                                 is_buy=ps.is_buy,
-                                 sl=ps.sl,
-                                 tp=ps.tp,
-                                 price=ps.price,
-                                 to_candle_open_sec=candle.open_sec,
-                                 symstr=ps.symstr)
-                # so consider spread, it's easier to stop-loss, harder to take-profit
-                if ps.is_buy:
-                    if candle.l-half_spread_price <= ps.sl:
-                        tran.is_tp = False
-                    elif candle.h-half_spread_price >= ps.tp:
-                        tran.is_tp = True
-                    else:
-                        tran = None
-                else:
-                    if candle.h+half_spread_price >= ps.sl:
-                        tran.is_tp = False
-                    elif candle.l+half_spread_price <= ps.tp:
-                        tran.is_tp = True
-                    else:
-                        tran = None
-                if tran is not None:
-                    tran_list.append(tran)
-                    rm_list.append(ps)
-            [pending_signal_set.remove(ps) for ps in rm_list]
-            signal = signal_dict.get(candle.open_sec)
-            if signal:
-                pending_signal_set.add(signal)
-        return tran_list
+        highs, lows = [np.asarray(col, dtype=np.float64) for col in get_columns(candles, 'h', 'l')]
+        stop = len(highs) if stop is None else stop
+        # so consider spread, it's easier to stop-loss, harder to take-profit
+        sl_decs = [s.sl + half_spread_price if s.is_buy else s.sl - half_spread_price for s in sig_list]
+        tp_decs = [s.tp + half_spread_price if s.is_buy else s.tp - half_spread_price for s in sig_list]
+        # get_first_hits 从信号的下一根开始, 所以切片从 start-1 开始, 更早的信号都当成在 start-1
+        base = max(start - 1, 0)
+
+        def is_hit(pos:int, bar:int, is_sl:bool) -> bool:
+            # 和逐根蜡烛比较时一样用 Decimal, 保证结果一致
+            ps = sig_list[pos]
+            candle = candles[bar + base]
+            if ps.is_buy:
+                return candle.l-half_spread_price <= ps.sl if is_sl else candle.h-half_spread_price >= ps.tp
+            return candle.h+half_spread_price >= ps.sl if is_sl else candle.l+half_spread_price <= ps.tp
+
+        if isinstance(candles, CandleSeries) and candles.has_points:
+            # 定点模式: 蜡烛价格是整数点数, 把 Decimal 的 lim 向触发方向取整成点数, 整数比较就是精确的, 不用 is_hit 再确认
+            # buy sl 和 sell tp 是 low/high <= lim 触发, 向下取整; 另外两种是 >= lim 触发, 向上取整
+            digits = symstr.point_digits
+            highs, lows = candles.h_pts, candles.l_pts
+            sl_lims = [_to_point_lim(lim, digits, is_floor=s.is_buy) for s, lim in zip(sig_list, sl_decs)]
+            tp_lims = [_to_point_lim(lim, digits, is_floor=not s.is_buy) for s, lim in zip(sig_list, tp_decs)]
+            is_hit = None
+        else:
+            sl_lims = [float(lim) for lim in sl_decs]
+            tp_lims = [float(lim) for lim in tp_decs]
 
+        pos_list, bar_list, is_tp_list = get_first_hits(highs[base:stop],
+                                                        lows[base:stop],
+                                                        [max(idx, base) - base for idx in sig_idxs],
+                                                        [s.is_buy for s in sig_list],
+                                                        sl_lims,
+                                                        tp_lims,
+                                                        is_hit)
+        return pos_list, [bar + base for bar in bar_list], is_tp_list
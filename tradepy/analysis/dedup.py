@@ -0,0 +1,85 @@
+import time
+import heapq
+import itertools
+import threading
+from ..model.signal import Signal, round_to_point
+
+DEFAULT_TTL_SEC = 24 * 3600
+
+def get_signal_key(signal:Signal) -> tuple:
+    # 同 symstr 不同 period 的重复信号, open_sec 不一样, 其他都一样
+    symstr = signal.symstr
+    return (symstr, *[round_to_point(price, symstr) for price in (signal.price, signal.tp, signal.sl)], signal.is_buy)
+
+class SignalDedupIndex:
+    '''
+    live 的时候所有 symbol period 的 Chief 共用一个, 去掉 Dashboard 里说的第二种重复:
+    h12 和它最后一根 h4 在同一时间收盘, 可能出 price tp sl is_buy 都一样的信号
+    claim 成功的信号才下单, 平仓后 release, 忘了 release 的话过了 ttl_sec 也会自动去掉
+    replay 和 live 混用的时候 now_sec 不一定递增, 过期时间放在堆里, 每次从堆顶删过期的
+    '''
+    def __init__(self, ttl_sec:float=DEFAULT_TTL_SEC) -> None:
+        assert ttl_sec > 0
+        self.ttl_sec = ttl_sec
+        self._expire_dict:dict[tuple, float] = {} # key -> 过期时间
+        # (过期时间, 序号, key), release 或者重新 claim 之后旧的那条留在堆里, 弹出来时和 _expire_dict 对不上就丢掉
+        self._expire_heap:list[tuple[float, int, tuple]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def claim(self, signal:Signal, now_sec:float | None = None) -> bool:
+        '''
+        没有相同的信号在用就占住并返回 True, 否则返回 False
+        now_sec 默认是当前时间, replay 的时候可以传 frame 的时间
+        '''
+        now_sec = time.time() if now_sec is None else now_sec
+        key = get_signal_key(signal)
+        with self._lock:
+            self._evict(now_sec)
+            if key in self._expire_dict:
+                return False
+            expire_sec = now_sec + self.ttl_sec
+            self._expire_dict[key] = expire_sec
+            heapq.heappush(self._expire_heap, (expire_sec, next(self._seq), key))
+            return True
+
+    def release(self, signal:Signal) -> bool:
+        '''
+        平仓后调用, 之后相同的信号可以再下单; 返回之前是不是占着
+        '''
+        with self._lock:
+            return self._expire_dict.pop(get_signal_key(signal), None) is not None
+
+    def is_claimed(self, signal:Signal, now_sec:float | None = None) -> bool:
+        now_sec = time.time() if now_sec is None else now_sec
+        with self._lock:
+            self._evict(now_sec)
+            return get_signal_key(signal) in self._expire_dict
+
+    def clear(self):
+        with self._lock:
+            self._expire_dict.clear()
+            self._expire_heap.clear()
+
+    def __len__(self) -> int:
+        return len(self._expire_dict)
+
+    def _evict(self, now_sec:float):
+        # 调用方已经拿着锁
+        while self._expire_heap and self._expire_heap[0][0] <= now_sec:
+            expire_sec, _, key = heapq.heappop(self._expire_heap)
+            if self._expire_dict.get(key) == expire_sec:
+                del self._expire_dict[key]
+
+
+_dedup_index = SignalDedupIndex()
+
+def get_dedup_index() -> SignalDedupIndex:
+    '''
+    进程里共用的一个, live 的每个 Chief.analyze 都传这个
+    '''
+    return _dedup_index
+
+def set_dedup_index(dedup_index:SignalDedupIndex):
+    global _dedup_index
+    _dedup_index = dedup_index
@@ -0,0 +1,66 @@
+import threading
+from decimal import Decimal
+from typing import Callable
+import numpy as np
+from ..model.candle import Candle, CandleSeries
+from . import get_columns, get_ema_floats, get_atr_floats, get_rsi_floats
+from .context import current_features, get_features, run_with_features
+
+class FeatureContext:
+    '''
+    Chief.analyze 每次调用建一个, 所有 analyst 共用
+    指标第一次用到才计算, 之后按 (名字, 参数) 缓存, 多线程同时取同一个指标也只算一次
+    Decimal 版本和 get_emas/get_atrs/get_rsis 的结果完全一样, float 版本不转 Decimal
+    '''
+    def __init__(self, candles: list[Candle] | CandleSeries, peaks:set[Candle], valleys:set[Candle]) -> None:
+        self.candles = candles
+        self.peaks = peaks
+        self.valleys = valleys
+        self._cache_dict = {}
+        self._lock = threading.Lock()
+        self._key_lock_dict:dict[tuple, threading.Lock] = {}
+
+    def memo(self, key:tuple, func:Callable):
+        '''
+        通用的缓存, analyst 自己的中间结果也可以放进来, key 相同的 func 只会执行一次
+        '''
+        try:
+            return self._cache_dict[key]
+        except KeyError:
+            pass
+        with self._lock:
+            key_lock = self._key_lock_dict.setdefault(key, threading.Lock())
+        # 每个 key 一把锁, 不同指标可以同时计算
+        with key_lock:
+            if key not in self._cache_dict:
+                self._cache_dict[key] = func()
+            return self._cache_dict[key]
+
+    def ema_floats(self, win:int) -> np.ndarray:
+        return self.memo(('ema_floats', win), lambda: get_ema_floats(*get_columns(self.candles, 'c'), win))
+
+    def atr_floats(self, win:int) -> np.ndarray:
+        return self.memo(('atr_floats', win), lambda: get_atr_floats(*get_columns(self.candles, 'h', 'l', 'c'), win))
+
+    def rsi_floats(self, win:int) -> np.ndarray:
+        return self.memo(('rsi_floats', win), lambda: get_rsi_floats(*get_columns(self.candles, 'c'), win))
+
+    def emas(self, win:int) -> list[Decimal]:
+        return self.memo(('emas', win), lambda: [Decimal(ema) for ema in self.ema_floats(win).tolist()])
+
+    def atrs(self, win:int) -> list[Decimal]:
+        return self.memo(('atrs', win), lambda: [Decimal(atr) for atr in self.atr_floats(win).tolist()])
+
+    def rsis(self, win:int) -> list[Decimal]:
+        return self.memo(('rsis', win), lambda: [Decimal(rsi) for rsi in self.rsi_floats(win).tolist()])
+
+    def __getstate__(self) -> dict:
+        # 进程池需要 pickle, 锁不能 pickle, 已经算好的指标一起带过去
+        state = self.__dict__.copy()
+        del state['_lock'], state['_key_lock_dict']
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._key_lock_dict = {}
@@ -0,0 +1,254 @@
+import math
+from decimal import Decimal
+import numpy as np
+from . import get_columns
+
+class _Ewm:
+    '''
+    和 pandas ewm().mean() 一样的递推, 每次 update 一个值, 结果逐个 bit 都一致
+    '''
+    def __init__(self, com:float, adjust:bool, min_periods:int=0) -> None:
+        alpha = 1. / (1. + com)
+        self._old_wt_factor = 1. - alpha
+        self._new_wt = 1. if adjust else alpha
+        self._adjust = adjust
+        self._min_periods = max(min_periods, 1)
+        self._weighted = math.nan
+        self._old_wt = 1.
+        self._nobs = 0
+        self._cnt = 0
+
+    def update(self, cur:float) -> float:
+        is_observation = cur == cur
+        if self._cnt == 0:
+            self._weighted = cur
+        elif self._weighted == self._weighted:
+            self._old_wt *= self._old_wt_factor
+            if is_observation:
+                # avoid numerical errors on constant series
+                if self._weighted != cur:
+                    self._weighted = self._old_wt * self._weighted + self._new_wt * cur
+                    self._weighted /= (self._old_wt + self._new_wt)
+                if self._adjust:
+                    self._old_wt += self._new_wt
+                else:
+                    self._old_wt = 1.
+        elif is_observation:
+            self._weighted = cur
+        self._nobs += int(is_observation)
+        self._cnt += 1
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self._weighted if self._nobs >= self._min_periods else math.nan
+
+    def snapshot(self) -> dict:
+        return dict(weighted=self._weighted, old_wt=self._old_wt, nobs=self._nobs, cnt=self._cnt)
+
+    def restore(self, state:dict):
+        self._weighted = state['weighted']
+        self._old_wt = state['old_wt']
+        self._nobs = state['nobs']
+        self._cnt = state['cnt']
+
+
+class EmaState:
+    '''
+    get_emas 的增量版本, 每根新蜡烛 O(1)
+    '''
+    def __init__(self, win:int) -> None:
+        self._ewm = _Ewm(com=(win - 1) / 2.0, adjust=False)
+
+    def update(self, num) -> Decimal:
+        return Decimal(self._ewm.update(float(num)))
+
+    def update_many(self, nums) -> np.ndarray:
+        '''
+        一次 update 多根蜡烛, 返回 float 数组, 省掉每根转 Decimal
+        '''
+        return np.array([self._ewm.update(float(num)) for num in nums], dtype=np.float64)
+
+    @property
+    def value(self) -> Decimal:
+        return Decimal(self._ewm.value)
+
+    def snapshot(self) -> dict:
+        return self._ewm.snapshot()
+
+    def restore(self, state:dict):
+        self._ewm.restore(state)
+
+
+class AtrState:
+    '''
+    get_atrs 的增量版本, 每根新蜡烛 O(1)
+    tr 用传进来的类型计算, Decimal 就是 Decimal, 和 get_atrs 里 DataFrame 的计算一致
+    '''
+    def __init__(self, win:int) -> None:
+        self._ewm = _Ewm(com=(win - 1) / 2.0, adjust=False)
+        self._prev_c = None
+
+    def update(self, h, l, c) -> Decimal:
+        tr = abs(h - l)
+        if self._prev_c is not None:
+            tr = max(tr, abs(h - self._prev_c), abs(l - self._prev_c))
+        self._prev_c = c
+        return Decimal(self._ewm.update(float(tr)))
+
+    def update_many(self, highs, lows, closes) -> np.ndarray:
+        '''
+        一次 update 多根蜡烛, 返回 float 数组, 省掉每根转 Decimal
+        '''
+        atr_list = []
+        for h, l, c in zip(highs, lows, closes):
+            tr = abs(h - l)
+            if self._prev_c is not None:
+                tr = max(tr, abs(h - self._prev_c), abs(l - self._prev_c))
+            self._prev_c = c
+            atr_list.append(self._ewm.update(float(tr)))
+        return np.array(atr_list, dtype=np.float64)
+
+    @property
+    def value(self) -> Decimal:
+        return Decimal(self._ewm.value)
+
+    def snapshot(self) -> dict:
+        return dict(ewm=self._ewm.snapshot(), prev_c=self._prev_c)
+
+    def restore(self, state:dict):
+        self._ewm.restore(state['ewm'])
+        self._prev_c = state['prev_c']
+
+
+class RsiState:
+    '''
+    get_rsis 的增量版本, 每根新蜡烛 O(1)
+    前 win 根蜡烛和 get_rsis 一样返回 NaN
+    '''
+    def __init__(self, win:int) -> None:
+        self._up_ewm = _Ewm(com=win - 1, adjust=True, min_periods=win)
+        self._down_ewm = _Ewm(com=win - 1, adjust=True, min_periods=win)
+        self._prev_num = None
+
+    def update(self, num) -> Decimal:
+        if self._prev_num is None:
+            up = down = math.nan
+        else:
+            delta = num - self._prev_num
+            # 和 Series.clip 一样, 负数 clip 成 0 再乘 -1
+            up = float(max(delta, 0))
+            down = float(-1 * min(delta, 0))
+        self._prev_num = num
+        self._up_ewm.update(up)
+        self._down_ewm.update(down)
+        return self.value
+
+    def update_many(self, nums) -> np.ndarray:
+        '''
+        一次 update 多根蜡烛, 返回 float 数组, 省掉每根转 Decimal
+        '''
+        ups = np.empty(len(nums), dtype=np.float64)
+        downs = np.empty(len(nums), dtype=np.float64)
+        for i, num in enumerate(nums):
+            if self._prev_num is None:
+                up = down = math.nan
+            else:
+                delta = num - self._prev_num
+                up = float(max(delta, 0))
+                down = float(-1 * min(delta, 0))
+            self._prev_num = num
+            ups[i] = self._up_ewm.update(up)
+            downs[i] = self._down_ewm.update(down)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100 - (100 / (1 + ups / downs))
+
+    @property
+    def value(self) -> Decimal:
+        ma_up = np.float64(self._up_ewm.value)
+        ma_down = np.float64(self._down_ewm.value)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + ma_up / ma_down))
+        return Decimal(float(rsi))
+
+    def snapshot(self) -> dict:
+        return dict(up_ewm=self._up_ewm.snapshot(), down_ewm=self._down_ewm.snapshot(), prev_num=self._prev_num)
+
+    def restore(self, state:dict):
+        self._up_ewm.restore(state['up_ewm'])
+        self._down_ewm.restore(state['down_ewm'])
+        self._prev_num = state['prev_num']
+
+
+class PivotTracker:
+    '''
+    get_peaks_valleys 的增量版本, 每次 update 一根已经收盘的蜡烛
+    第 n 根蜡烛进来时, 第 n-1 根蜡烛的三根窗口才完整, 这时确认它是不是 peak/valley,
+    同时用前两个 peak/valley 算回撤, 回撤不够的直接去掉, 之后不会再改变
+    所以任何时候 peaks/valleys 都和对已经收到的蜡烛跑一次 get_peaks_valleys 的结果一样
+    '''
+    def __init__(self) -> None:
+        self.peaks:set = set()
+        self.valleys:set = set()
+        self.peak_idxs:list[int] = []
+        self.valley_idxs:list[int] = []
+        self._candle_cnt = 0
+        self._prev_candle = None
+        self._candle = None
+        # 回撤用的是没有过滤过的 peak/valley 序列, 只需要最后两个的 close
+        self._pivot_cnt = 0
+        self._prev_pivot_close = None
+        self._pivot_close = None
+
+    def update(self, candle):
+        prev_candle, me = self._prev_candle, self._candle
+        if me is not None and prev_candle is not None:
+            if me.c > max(prev_candle.c, candle.c):
+                self._add_pivot(me, self._candle_cnt - 1, is_peak=True)
+            elif me.c < min(prev_candle.c, candle.c):
+                self._add_pivot(me, self._candle_cnt - 1, is_peak=False)
+        self._prev_candle = me
+        self._candle = candle
+        self._candle_cnt += 1
+
+    def update_many(self, candles, start:int, stop:int):
+        '''
+        一次 update candles[start:stop], start 必须是已经收到的蜡烛数
+        和 get_pivot_idxs 一样先用 close 数组找出候选, 只有候选才逐个算回撤
+        '''
+        assert start == self._candle_cnt, "candles must be updated in order"
+        if start >= stop:
+            return
+        # 要确认的是 [start-1, stop-1) 这些蜡烛, 还需要它们前后各一根
+        lo = max(start - 2, 0)
+        closes, = get_columns(candles, 'c')
+        closes = np.asarray(closes[lo:stop])
+        if len(closes) >= 3:
+            me = closes[1:-1]
+            prevs = closes[:-2]
+            nexts = closes[2:]
+            is_peaks = me > np.maximum(prevs, nexts)
+            is_valleys = (me < np.minimum(prevs, nexts)) & ~is_peaks
+            for i in np.flatnonzero(is_peaks | is_valleys).tolist():
+                self._add_pivot(candles[lo + 1 + i], lo + 1 + i, is_peak=bool(is_peaks[i]))
+        self._prev_candle = candles[stop - 2] if stop - start >= 2 else self._candle
+        self._candle = candles[stop - 1]
+        self._candle_cnt = stop
+
+    def _add_pivot(self, candle, idx:int, is_peak:bool):
+        is_kept = True
+        if self._pivot_cnt >= 3:
+            retracement = candle.c - self._pivot_close
+            prev_retracement = self._pivot_close - self._prev_pivot_close
+            retracement_perc = retracement / prev_retracement if prev_retracement != 0 else None
+            is_kept = (not retracement_perc) or retracement_perc < -0.382
+        if is_kept:
+            if is_peak:
+                self.peaks.add(candle)
+                self.peak_idxs.append(idx)
+            else:
+                self.valleys.add(candle)
+                self.valley_idxs.append(idx)
+        self._prev_pivot_close = self._pivot_close
+        self._pivot_close = candle.c
+        self._pivot_cnt += 1
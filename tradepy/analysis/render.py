@@ -0,0 +1,105 @@
+'''
+大数据量画图用的降采样
+蜡烛按下标均匀分桶, 每桶合成一根保留 o h l c 的蜡烛; 折线用 LTTB 挑点; 交易的方框合并成几条填充的 trace
+x 轴用 datetime64, 不用格式化的字符串
+'''
+from decimal import Decimal
+import numpy as np
+from plotly import graph_objects as go
+from ..model.candle import to_datetimes
+
+def get_bucket_starts(cnt:int, max_points:int) -> np.ndarray:
+    '''
+    把 cnt 个点按下标均匀分成 max_points 桶, 返回每桶的起始下标, cnt <= max_points 时每个点一桶
+    '''
+    if cnt <= max_points:
+        return np.arange(cnt)
+    return np.linspace(0, cnt, max_points + 1).astype(np.int64)[:-1]
+
+def downsample_ohlc(open_secs, o, h, l, c, max_points:int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    每桶的 open 是第一根的 open, close 是最后一根的 close, high low 取最大最小, 时间是第一根的时间
+    '''
+    open_secs, o, h, l, c = [np.asarray(col, dtype=np.float64) for col in (open_secs, o, h, l, c)]
+    if len(open_secs) <= max_points:
+        return open_secs, o, h, l, c
+    starts = get_bucket_starts(len(open_secs), max_points)
+    ends = np.append(starts[1:], len(open_secs))
+    return (open_secs[starts],
+            o[starts],
+            np.maximum.reduceat(h, starts),
+            np.minimum.reduceat(l, starts),
+            c[ends - 1])
+
+def get_lttb_idxs(xs, ys, max_points:int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets, 返回保留下来的点的下标, 第一个和最后一个点一定保留
+    ys 是 nan 的点先去掉
+    '''
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    valid_idxs = np.flatnonzero(~np.isnan(ys))
+    cnt = len(valid_idxs)
+    if cnt <= max_points or max_points < 3:
+        return valid_idxs
+    xs = xs[valid_idxs]
+    ys = ys[valid_idxs]
+    # 中间 max_points-2 个桶, 每桶挑一个点
+    edges = np.linspace(1, cnt - 1, max_points - 1).astype(np.int64)
+    bucket_cnt = max_points - 2
+    # 下一个桶的平均点, 最后一个桶的下一个是最后一个点
+    sums_x = np.add.reduceat(xs[:cnt - 1], edges[:-1])
+    sums_y = np.add.reduceat(ys[:cnt - 1], edges[:-1])
+    sizes = np.diff(edges)
+    avg_xs = np.append((sums_x / sizes)[1:], xs[-1])
+    avg_ys = np.append((sums_y / sizes)[1:], ys[-1])
+    picked_idxs = np.empty(max_points, dtype=np.int64)
+    picked_idxs[0] = 0
+    picked_idxs[-1] = cnt - 1
+    a = 0
+    for i in range(bucket_cnt):
+        start, end = edges[i], edges[i + 1]
+        bucket_xs = xs[start:end]
+        bucket_ys = ys[start:end]
+        areas = np.abs((xs[a] - avg_xs[i]) * (bucket_ys - ys[a]) - (xs[a] - bucket_xs) * (avg_ys[i] - ys[a]))
+        a = start + int(areas.argmax())
+        picked_idxs[i + 1] = a
+    return valid_idxs[picked_idxs]
+
+def get_line_trace(open_secs, nums, max_points:int, **kwargs) -> go.Scattergl:
+    open_secs = np.asarray(open_secs, dtype=np.float64)
+    nums = np.asarray([float(n) for n in nums] if isinstance(nums, list) else nums, dtype=np.float64)
+    idxs = get_lttb_idxs(open_secs, nums, max_points)
+    return go.Scattergl(x=to_datetimes(open_secs[idxs]), y=nums[idxs], **kwargs)
+
+def get_tran_box_traces(tran_list:list, **kwargs) -> list[go.Scatter]:
+    '''
+    每笔交易的 tp sl 两个方框, 按 (tp/sl, 是否触发) 合并成 4 条填充的 trace, 不用 layout shapes
+    方框之间用 None 断开
+    '''
+    green = '#089981'
+    red = '#F23645'
+    trace_list = []
+    for is_tp_box, color in ((True, green), (False, red)):
+        for is_hit, opacity in ((True, 0.5), (False, 0.1)):
+            box_tran_list = [tran for tran in tran_list if (tran.is_tp if is_tp_box else tran.is_sl) == is_hit]
+            if not box_tran_list:
+                continue
+            x0s = np.datetime_as_string(to_datetimes([tran.from_candle_open_sec for tran in box_tran_list]))
+            x1s = np.datetime_as_string(to_datetimes([tran.to_candle_open_sec for tran in box_tran_list]))
+            y0s = np.array([float(tran.price) for tran in box_tran_list])
+            y1s = np.array([float(tran.tp if is_tp_box else tran.sl) for tran in box_tran_list])
+            xs = np.stack([x0s, x1s, x1s, x0s, x0s, np.full(len(x0s), None)], axis=1).astype(object).ravel()
+            ys = np.stack([y0s, y0s, y1s, y1s, y0s, np.full(len(y0s), np.nan)], axis=1).astype(object).ravel()
+            ys[5::6] = None
+            trace_list.append(go.Scatter(x=xs,
+                                         y=ys,
+                                         mode='lines',
+                                         fill='toself',
+                                         fillcolor=color,
+                                         line=dict(color=color, width=1),
+                                         opacity=opacity,
+                                         hoverinfo='skip',
+                                         showlegend=False,
+                                         **kwargs))
+    return trace_list
@@ -0,0 +1,147 @@
+import html
+from pathlib import Path
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from plotly import graph_objects as go
+from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs
+from ..model.candle import Candle, CandleSeries, TimeAxis, get_strtimes
+from ..model.signal import Signal
+from ..common import trunc
+from ..common.instrument import timed
+from . import FeeCalculable, render
+from .dashboard import Dashboard, _Transaction
+
+PLOTLYJS_FILENAME = 'plotly.min.js'
+_BG_COLOR = '#151924'
+
+@timed('report.export')
+def export_report(data_list:list,
+                  spread:Decimal,
+                  risk_perc:Decimal,
+                  init_balance_usd:Decimal,
+                  leverage:Decimal,
+                  fee_calc:FeeCalculable,
+                  out_dir:Path,
+                  max_points:int | None = None,
+                  max_workers:int | None = None) -> Path:
+    '''
+    draw_paral_trade_symbolperiod_asset 的无浏览器版本, 返回 index.html 的路径
+    data_list 和 draw_paral_trade_symbolperiod_asset 一样是 (candles, signals, peaks, valleys)
+    每个 symbol period 的图在单独的进程里生成, 各写一个 html, 都引用 out_dir 里同一份 plotly.min.js
+    资产走势需要所有交易一起模拟, 在主进程用各进程返回的交易来算
+    '''
+    #只保留有信号的组合
+    data_list = [data for data in data_list if data[1]]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / PLOTLYJS_FILENAME).write_text(get_plotlyjs(), encoding='utf-8')
+
+    panel_list:list[tuple[str, str]] = [] # (文件名, 标题)
+    all_tran_list:list[_Transaction] = []
+    if data_list:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            future_list = [
+                executor.submit(_export_panel, idx, data, spread, max_points, out_dir)
+                for idx, data in enumerate(data_list)
+            ]
+            # 按 data_list 的顺序收集, 和 draw_paral_trade_symbolperiod_asset 的交易顺序一致
+            for future in future_list:
+                filename, title, tran_list = future.result()
+                panel_list.append((filename, title))
+                all_tran_list.extend(tran_list)
+
+    summ_line_list:list[str] = []
+    if all_tran_list:
+        tp_cnt, sl_cnt, time_balance_usedmargin_list = Dashboard._summarize_paral_trade_asset_with_alltrans(all_tran_list, risk_perc, init_balance_usd, leverage, fee_calc)
+        _export_balance(time_balance_usedmargin_list, max_points, out_dir)
+        panel_list.append(('balance.html', 'balance'))
+        from_sec, balance_start, _ = time_balance_usedmargin_list[0]
+        to_sec, balance_end, _ = time_balance_usedmargin_list[-1]
+        profit_perc = balance_end / balance_start
+        summ_line_list = [
+            '  '.join(get_strtimes([from_sec, to_sec])),
+            f'tot {tp_cnt + sl_cnt} tp {tp_cnt} sl {sl_cnt}',
+            f'balance from {trunc(balance_start)} to {trunc(balance_end)}, x{trunc(profit_perc)}',
+            f'net profit {trunc(balance_end - balance_start)}, x{trunc(profit_perc-1)}',
+        ]
+    index_path = out_dir / 'index.html'
+    index_path.write_text(_get_index_html(panel_list, summ_line_list), encoding='utf-8')
+    return index_path
+
+def _export_panel(idx:int, data:tuple, spread:Decimal, max_points:int | None, out_dir:Path) -> tuple[str, str, list[_Transaction]]:
+    # 子进程里执行, 返回交易给主进程算资产
+    candle_list, signal_list, peak_set, valley_set = data
+    symstr = candle_list[0].symstr
+    period = candle_list[0].period
+    title = f'{symstr} {period}'
+    tran_list = Dashboard._get_trans(candle_list, signal_list, spread)
+    fig = _get_panel_fig(candle_list, signal_list, peak_set, valley_set, tran_list, max_points)
+    fig.update_layout(title=title)
+    filename = f'{idx:03d}_{symstr}_{period}.html'
+    fig.write_html(out_dir / filename, include_plotlyjs=PLOTLYJS_FILENAME, full_html=True)
+    return filename, title, tran_list
+
+def _get_panel_fig(candle_list: list[Candle] | CandleSeries,
+                   signal_list: list[Signal],
+                   peak_set: set[Candle],
+                   valley_set: set[Candle],
+                   tran_list: list[_Transaction],
+                   max_points:int | None) -> go.Figure:
+    axis = TimeAxis.of(candle_list)
+    fig = go.Figure()
+    fig.add_traces([
+        Dashboard._get_candle_traces(candle_list, max_points, axis),
+        Dashboard._get_trends_traces(candle_list, peak_set, valley_set, max_points, axis),
+        Dashboard._get_ema_traces(candle_list, max_points, axis),
+        Dashboard._get_buy_signals_traces(candle_list, signal_list, max_points, axis),
+        Dashboard._get_sell_signals_traces(candle_list, signal_list, max_points, axis),
+    ])
+    if max_points is not None:
+        fig.add_traces(render.get_tran_box_traces(tran_list))
+    else:
+        # 一次设置所有 shapes, 不要逐个 add_shape
+        fig.update_layout(shapes=Dashboard._get_shapes(tran_list, axis))
+    fig.update_layout(
+        xaxis=dict(showgrid=False, rangeslider=dict(visible=False)),
+        yaxis=dict(showgrid=False, zeroline=False),
+        plot_bgcolor=_BG_COLOR,
+        paper_bgcolor=_BG_COLOR,
+        showlegend=False
+    )
+    return fig
+
+def _export_balance(time_balance_usedmargin_list:list[tuple], max_points:int | None, out_dir:Path):
+    strtime_list = get_strtimes([t_sec for t_sec,_,_ in time_balance_usedmargin_list])
+    balance_trace, used_margin_trace = Dashboard._get_balance_traces(time_balance_usedmargin_list, strtime_list, max_points)
+    fig = make_subplots(rows=2, cols=1, subplot_titles=['balance', 'used margin'], vertical_spacing=0, shared_xaxes=True)
+    fig.add_trace(balance_trace, row=1, col=1)
+    fig.add_trace(used_margin_trace, row=2, col=1)
+    fig.update_layout(
+        plot_bgcolor=_BG_COLOR,
+        paper_bgcolor=_BG_COLOR,
+        showlegend=False,
+        xaxis=dict(showgrid=False, showticklabels=False),
+        yaxis=dict(showgrid=False, domain=[0.2, 1], zeroline=False),
+        xaxis2=dict(showgrid=False),
+        yaxis2=dict(showgrid=False, domain=[0, 0.2], zeroline=False)
+    )
+    fig.write_html(out_dir / 'balance.html', include_plotlyjs=PLOTLYJS_FILENAME, full_html=True)
+
+def _get_index_html(panel_list:list[tuple[str, str]], summ_line_list:list[str]) -> str:
+    summ_html = '<br>'.join(html.escape(line) for line in summ_line_list)
+    link_html = '\n'.join(
+        f'<li><a href="{html.escape(filename)}">{html.escape(title)}</a></li>'
+        for filename, title in panel_list
+    )
+    return f'''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>paral trade report</title></head>
+<body style="background:{_BG_COLOR};color:#d1d4dc;font-family:monospace">
+<h2>paral trade</h2>
+<p>{summ_html}</p>
+<ul>
+{link_html}
+</ul>
+</body>
+</html>
+'''
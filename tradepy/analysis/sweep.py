@@ -0,0 +1,176 @@
+import json
+import itertools
+from pathlib import Path
+from decimal import Decimal
+from typing import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ..model import SymbolStr, CandlePeriod
+from ..model.candle import Candle, CandleSeries
+from . import Analyzable, FeeCalculable, get_peaks_valleys
+from .chief import Chief, _get_name
+from .dashboard import Dashboard
+
+class SweepTask:
+    def __init__(self,
+                 symstr:SymbolStr,
+                 period:CandlePeriod,
+                 analyst_list:list[Analyzable],
+                 spread:Decimal,
+                 risk_perc:Decimal,
+                 leverage:Decimal) -> None:
+        self.symstr = symstr
+        self.period = period
+        self.analyst_list = analyst_list
+        self.spread = spread
+        self.risk_perc = risk_perc
+        self.leverage = leverage
+
+    @property
+    def key(self) -> str:
+        # 续跑时用来判断哪些组合已经跑过, analyst 是实例的话用类名
+        analysts_str = ','.join(_get_name(analyst) for analyst in self.analyst_list)
+        return f"{self.symstr}|{self.period}|{analysts_str}|{self.spread}|{self.risk_perc}|{self.leverage}"
+
+
+class SweepRow:
+    def __init__(self,
+                 key:str,
+                 tp_cnt:int,
+                 sl_cnt:int,
+                 final_balance_usd:Decimal,
+                 max_drawdown_perc:Decimal) -> None:
+        self.key = key
+        self.tp_cnt = tp_cnt
+        self.sl_cnt = sl_cnt
+        self.final_balance_usd = final_balance_usd
+        self.max_drawdown_perc = max_drawdown_perc
+
+    def to_dict(self) -> dict:
+        return dict(key=self.key,
+                    tp_cnt=self.tp_cnt,
+                    sl_cnt=self.sl_cnt,
+                    final_balance_usd=str(self.final_balance_usd),
+                    max_drawdown_perc=str(self.max_drawdown_perc))
+
+    @staticmethod
+    def from_dict(row_dict:dict) -> 'SweepRow':
+        return SweepRow(key=row_dict['key'],
+                        tp_cnt=row_dict['tp_cnt'],
+                        sl_cnt=row_dict['sl_cnt'],
+                        final_balance_usd=Decimal(row_dict['final_balance_usd']),
+                        max_drawdown_perc=Decimal(row_dict['max_drawdown_perc']))
+
+    def __str__(self) -> str:
+        return f"R({self.key} tp{self.tp_cnt} sl{self.sl_cnt} balance{self.final_balance_usd} dd{self.max_drawdown_perc})"
+
+
+def get_task_list(symstr_list:list[SymbolStr],
+                  period_list:list[CandlePeriod],
+                  analyst_lists:list[list[Analyzable]],
+                  spread_list:list[Decimal],
+                  risk_perc_list:list[Decimal],
+                  leverage_list:list[Decimal]) -> list[SweepTask]:
+    return [
+        SweepTask(symstr, period, analyst_list, spread, risk_perc, leverage)
+        for symstr, period, analyst_list, spread, risk_perc, leverage in itertools.product(symstr_list,
+                                                                                           period_list,
+                                                                                           analyst_lists,
+                                                                                           spread_list,
+                                                                                           risk_perc_list,
+                                                                                           leverage_list)
+    ]
+
+def load_rows(result_path:Path) -> list[SweepRow]:
+    if not result_path.exists():
+        return []
+    row_list = []
+    with open(result_path, "r") as file:
+        for line in file:
+            try:
+                row_list.append(SweepRow.from_dict(json.loads(line)))
+            except (json.JSONDecodeError, KeyError):
+                # 上次中断时写了一半的行
+                continue
+    return row_list
+
+def run_sweep(task_list:list[SweepTask],
+              load_candles:Callable[[SymbolStr, CandlePeriod], list[Candle] | CandleSeries],
+              init_balance_usd:Decimal,
+              fee_calc:FeeCalculable,
+              result_path:Path | None = None,
+              max_workers:int | None = None) -> Iterator[SweepRow]:
+    '''
+    把 task_list 分给多个进程跑, 跑完一个就 yield 一行结果
+    load_candles 和 fee_calc 需要能被 pickle, 也就是定义在模块顶层
+    每个进程第一次遇到某个 (symstr, period) 才调用 load_candles, 之后复用, 任务本身只传参数
+    result_path 不为 None 时每行结果追加写入, 再次运行会跳过已经有结果的任务
+    '''
+    done_key_set = {row.key for row in load_rows(result_path)} if result_path else set()
+    todo_task_list = [task for task in task_list if task.key not in done_key_set]
+    if not todo_task_list:
+        return
+    # 同一个 symbol period 的任务排在一起, 进程的缓存更容易命中
+    todo_task_list.sort(key=lambda task: (task.symstr, task.period))
+    executor = ProcessPoolExecutor(max_workers=max_workers,
+                                   initializer=_init_worker,
+                                   initargs=(load_candles,))
+    try:
+        future_list = [
+            executor.submit(_run_task, task, init_balance_usd, fee_calc)
+            for task in todo_task_list
+        ]
+        for future in as_completed(future_list):
+            row = future.result()
+            if result_path:
+                with open(result_path, "a") as file:
+                    file.write(json.dumps(row.to_dict()) + '\n')
+            yield row
+    finally:
+        # 调用方中途不再迭代的话, 还没开始的任务直接取消, 下次续跑
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+_load_candles = None
+_data_dict:dict[tuple, tuple] = {}
+
+def _init_worker(load_candles:Callable[[SymbolStr, CandlePeriod], list[Candle] | CandleSeries]):
+    global _load_candles
+    _load_candles = load_candles
+    _data_dict.clear()
+
+def _get_data(symstr:SymbolStr, period:CandlePeriod) -> tuple:
+    data = _data_dict.get((symstr, period))
+    if data is None:
+        candles = _load_candles(symstr, period)
+        peak_set, valley_set = get_peaks_valleys(candles)
+        data = (candles, peak_set, valley_set)
+        _data_dict[(symstr, period)] = data
+    return data
+
+def _run_task(task:SweepTask, init_balance_usd:Decimal, fee_calc:FeeCalculable) -> SweepRow:
+    candles, peak_set, valley_set = _get_data(task.symstr, task.period)
+    signal_list = Chief.analyze(candles, peak_set, valley_set, task.analyst_list)
+    summ = Dashboard._summarize_paral_trade_asset([(candles, signal_list, peak_set, valley_set)],
+                                                  task.spread,
+                                                  task.risk_perc,
+                                                  init_balance_usd,
+                                                  task.leverage,
+                                                  fee_calc)
+    if not summ or not summ[2]:
+        return SweepRow(task.key, 0, 0, init_balance_usd, Decimal(0))
+    tp_cnt, sl_cnt, time_balance_usedmargin_list = summ
+    return SweepRow(key=task.key,
+                    tp_cnt=tp_cnt,
+                    sl_cnt=sl_cnt,
+                    final_balance_usd=time_balance_usedmargin_list[-1][1],
+                    max_drawdown_perc=_get_max_drawdown_perc([b for _,b,_ in time_balance_usedmargin_list]))
+
+def _get_max_drawdown_perc(balance_list:list[Decimal]) -> Decimal:
+    max_balance = None
+    max_drawdown_perc = Decimal(0)
+    for balance in balance_list:
+        if max_balance is None or balance > max_balance:
+            max_balance = balance
+        elif max_balance > 0:
+            max_drawdown_perc = max(max_drawdown_perc, (max_balance - balance) / max_balance)
+    return max_drawdown_perc
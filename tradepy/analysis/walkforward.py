@@ -0,0 +1,194 @@
+from bisect import bisect_left
+from decimal import Decimal
+from concurrent.futures import Executor
+import numpy as np
+import pandas as pd
+from ..model.candle import Candle, CandleSeries
+from ..model.signal import Signal
+from ..common.instrument import timed, span
+from . import Analyzable, VectorAnalyzable, get_columns
+from .incremental import EmaState, AtrState, RsiState, PivotTracker
+from .feature import FeatureContext
+from .chief import Chief
+from .dashboard import Dashboard
+
+METRIC_LIST = ['signal_cnt', 'tp_cnt', 'sl_cnt', 'r_sum']
+
+class WalkForward:
+    '''
+    按 test_size 一段一段往前推, 每一段只处理新进来的蜡烛:
+    指标用 EmaState/AtrState/RsiState 接着算, peak/valley 用 PivotTracker 接着找,
+    没平仓的信号留在 pending 里, 下一段从新蜡烛开始接着找 sl/tp
+    analyst 每段只看 [段开始-warmup, 段结束) 这些蜡烛, 指标和 peak/valley 是整段历史算出来的,
+    warmup 至少要 1, 上一段最后一根蜡烛的信号才能在这一段出来
+    每段的统计只算一次, fold 的 train/test 统计是几段加起来, 所以多少个 fold 都差不多是跑一遍的开销
+    '''
+    def __init__(self,
+                 candles: list[Candle] | CandleSeries,
+                 analyst_list:list[Analyzable | VectorAnalyzable],
+                 spread:Decimal,
+                 test_size:int,
+                 warmup:int=200,
+                 ema_wins:tuple[int, ...]=(60,),
+                 atr_wins:tuple[int, ...]=(14,),
+                 rsi_wins:tuple[int, ...]=(7,),
+                 executor:Executor | None = None) -> None:
+        assert test_size > 0 and warmup >= 1
+        self.candles = candles
+        self.analyst_list = analyst_list
+        self.spread = spread
+        self.test_size = test_size
+        self.warmup = warmup
+        self.executor = executor
+        self.stop = 0
+        bar_cnt = len(candles)
+        self._cols = get_columns(candles, 'h', 'l', 'c')
+        open_secs, = get_columns(candles, 'open_sec')
+        self._open_secs = np.asarray(open_secs, dtype=np.float64)
+        self._state_dict = {
+            **{('ema_floats', win): EmaState(win) for win in ema_wins},
+            **{('atr_floats', win): AtrState(win) for win in atr_wins},
+            **{('rsi_floats', win): RsiState(win) for win in rsi_wins},
+        }
+        self._float_dict = {key: np.full(bar_cnt, np.nan, dtype=np.float64) for key in self._state_dict}
+        self._pivot = PivotTracker()
+        # 同一个 open_sec 出现多次的话, 信号从第一次出现的蜡烛开始 pending, 和 _get_trans 一样
+        self._idx_dict = {}
+        self._pending_list:list[tuple[int, Signal]] = []
+        self._queued_sec_set:set[float] = set()
+        self.chunk_list:list[dict] = []
+
+    def step(self) -> dict:
+        '''
+        处理下一段 [stop, stop+test_size) 的蜡烛, 返回这一段的统计
+        这一段平仓的交易算在这一段, 不管信号是哪一段出的
+        '''
+        start = self.stop
+        stop = min(start + self.test_size, len(self.candles))
+        assert start < stop, "no more candles"
+        with span('walkforward.step'):
+            self._update_states(start, stop)
+            slice_start = max(start - self.warmup, 0)
+            candles = self.candles[slice_start:stop]
+            ctx = self._get_features(candles, slice_start, stop)
+            signal_list = Chief.analyze(candles, ctx.peaks, ctx.valleys, self.analyst_list, self.executor, features=ctx)
+            new_cnt = 0
+            scan_start = start
+            for signal in signal_list:
+                idx = self._idx_dict.get(signal.candle_sec)
+                # warmup 部分的信号之前的段大多已经处理过了, 但上一段最后一根的 pivot 要等这一段第一根才确认,
+                # 这种信号这一段才出来, 所以用 candle_sec 判断有没有处理过, 不能只看下标
+                if idx is None or signal.candle_sec in self._queued_sec_set:
+                    continue
+                self._queued_sec_set.add(signal.candle_sec)
+                self._pending_list.append((idx, signal))
+                new_cnt += 1
+                scan_start = min(scan_start, idx + 1)
+            chunk = dict(start_sec=self._open_secs[start], stop_sec=self._open_secs[stop - 1], signal_cnt=new_cnt)
+            chunk.update(self._close_pending(scan_start, stop))
+        self.stop = stop
+        self.chunk_list.append(chunk)
+        return chunk
+
+    def _update_states(self, start:int, stop:int):
+        highs, lows, closes = [col[start:stop] for col in self._cols]
+        for key, state in self._state_dict.items():
+            name, _ = key
+            if name == 'atr_floats':
+                self._float_dict[key][start:stop] = state.update_many(highs, lows, closes)
+            else:
+                self._float_dict[key][start:stop] = state.update_many(closes)
+        for idx, open_sec in enumerate(self._open_secs[start:stop].tolist(), start):
+            self._idx_dict.setdefault(open_sec, idx)
+        self._pivot.update_many(self.candles, start, stop)
+
+    def _get_features(self, candles: list[Candle] | CandleSeries, slice_start:int, stop:int) -> FeatureContext:
+        # 只要切片范围里的 peak/valley, 切片里的 view 和原 series 的相等, 直接用原来的
+        peaks, valleys = [
+            {self.candles[idx] for idx in idxs[bisect_left(idxs, slice_start):]}
+            for idxs in (self._pivot.peak_idxs, self._pivot.valley_idxs)
+        ]
+        ctx = FeatureContext(candles, peaks, valleys)
+        for key, floats in self._float_dict.items():
+            ctx.memo(key, lambda floats=floats: floats[slice_start:stop])
+        return ctx
+
+    def _close_pending(self, start:int, stop:int) -> dict:
+        # 晚出来的信号要从它自己的下一根开始找, start 会比这一段的开始早,
+        # 之前的段已经找过的信号在这些蜡烛上不会命中, 重新找一遍结果不变
+        result = dict(tp_cnt=0, sl_cnt=0, r_sum=0.)
+        if not self._pending_list:
+            return result
+        pos_list, _, is_tp_list = Dashboard._get_first_hits(self.candles,
+                                                            [signal for _,signal in self._pending_list],
+                                                            [idx for idx,_ in self._pending_list],
+                                                            self.spread,
+                                                            start,
+                                                            stop)
+        for pos, is_tp in zip(pos_list, is_tp_list):
+            signal = self._pending_list[pos][1]
+            if is_tp:
+                result['tp_cnt'] += 1
+                # 以 sl 的距离为 1R
+                result['r_sum'] += float(abs(signal.tp - signal.price) / abs(signal.price - signal.sl))
+            else:
+                result['sl_cnt'] += 1
+                result['r_sum'] -= 1.
+        closed_set = set(pos_list)
+        self._pending_list = [item for pos, item in enumerate(self._pending_list) if pos not in closed_set]
+        return result
+
+    @property
+    def pending_cnt(self) -> int:
+        return len(self._pending_list)
+
+
+@timed('walkforward.run')
+def run_walk_forward(candles: list[Candle] | CandleSeries,
+                     analyst_list:list[Analyzable | VectorAnalyzable],
+                     spread:Decimal,
+                     train_size:int,
+                     test_size:int,
+                     warmup:int=200,
+                     ema_wins:tuple[int, ...]=(60,),
+                     atr_wins:tuple[int, ...]=(14,),
+                     rsi_wins:tuple[int, ...]=(7,),
+                     executor:Executor | None = None) -> pd.DataFrame:
+    '''
+    每个 fold 用 train_size 根蜡烛做 train, 后面 test_size 根做 test, 然后整体往前移 test_size 根
+    train_size 必须是 test_size 的整数倍, 最后不够 test_size 的蜡烛不算
+    返回每个 fold 一行, train_ 和 test_ 开头的列是 METRIC_LIST 里的统计
+    '''
+    assert train_size > 0 and train_size % test_size == 0, "train_size must be a multiple of test_size"
+    walk = WalkForward(candles, analyst_list, spread, test_size, warmup, ema_wins, atr_wins, rsi_wins, executor)
+    chunk_cnt = len(candles) // test_size
+    for _ in range(chunk_cnt):
+        walk.step()
+
+    train_chunk_cnt = train_size // test_size
+    chunk_df = pd.DataFrame(walk.chunk_list, columns=['start_sec', 'stop_sec', *METRIC_LIST])
+    # 累加和相减就是任意连续几段的统计, 每个 fold O(1)
+    cum_df = pd.concat([pd.DataFrame([[0] * len(METRIC_LIST)], columns=METRIC_LIST),
+                        chunk_df[METRIC_LIST].cumsum()],
+                       ignore_index=True)
+    row_list = []
+    for fold in range(chunk_cnt - train_chunk_cnt):
+        test_idx = fold + train_chunk_cnt
+        train_row = cum_df.iloc[test_idx] - cum_df.iloc[fold]
+        test_row = chunk_df.iloc[test_idx]
+        row_list.append(dict(fold=fold,
+                             train_start=chunk_df.start_sec[fold],
+                             train_stop=chunk_df.stop_sec[test_idx - 1],
+                             test_start=test_row.start_sec,
+                             test_stop=test_row.stop_sec,
+                             **{f'train_{name}': train_row[name] for name in METRIC_LIST},
+                             **{f'test_{name}': test_row[name] for name in METRIC_LIST}))
+    df = pd.DataFrame(row_list, columns=['fold', 'train_start', 'train_stop', 'test_start', 'test_stop',
+                                         *[f'train_{name}' for name in METRIC_LIST],
+                                         *[f'test_{name}' for name in METRIC_LIST]])
+    for col in ['train_start', 'train_stop', 'test_start', 'test_stop']:
+        df[col] = pd.to_datetime(df[col], unit='s', utc=True)
+    for prefix in ['train_', 'test_']:
+        for name in ['signal_cnt', 'tp_cnt', 'sl_cnt']:
+            df[prefix + name] = df[prefix + name].astype(np.int64)
+    return df
@@ -0,0 +1,100 @@
+from pathlib import Path
+import numpy as np
+from ..model import SymbolStr, CandlePeriod
+from ..model.candle import Candle, CandleSeries
+
+_COL_NAMES = ('open_sec', 'o', 'h', 'l', 'c')
+_DTYPE = np.dtype('<f8')
+
+class CandleArchive:
+    '''
+    蜡烛的二进制存档, 每个 (symstr, period) 一个目录, 每一列一个文件, 都是定长的 float64
+    open_sec 必须严格递增, load 用二分查找定位时间范围, 返回的 CandleSeries 直接切片 memmap, 不复制
+    append 时如果中途崩溃导致各列长度不一致, 下次 append 会截到最短的长度
+    '''
+    def __init__(self, root:Path) -> None:
+        self._root = root
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._map_dict:dict[tuple, dict[str, np.ndarray]] = {}
+
+    def append(self, candles:list[Candle] | CandleSeries):
+        if not candles:
+            return
+        series = candles if isinstance(candles, CandleSeries) else CandleSeries.from_candles(candles)
+        assert np.all(np.diff(series.open_sec) > 0), "open_sec should be strictly increasing"
+        dirpath = self._get_dirpath(series.symstr, series.period)
+        dirpath.mkdir(parents=True, exist_ok=True)
+        bar_cnt = self._repair(dirpath)
+        if bar_cnt:
+            last_sec = np.fromfile(dirpath / 'open_sec', dtype=_DTYPE, count=1, offset=(bar_cnt - 1) * _DTYPE.itemsize)[0]
+            # 已经存过的蜡烛跳过
+            series = series[int(np.searchsorted(series.open_sec, last_sec, side='right')):]
+            if not series:
+                return
+        for name in _COL_NAMES:
+            with open(dirpath / name, "ab") as file:
+                file.write(getattr(series, name).astype(_DTYPE).tobytes())
+        self._map_dict.pop((series.symstr, series.period), None)
+
+    def load(self,
+             symstr:SymbolStr,
+             period:CandlePeriod,
+             from_sec:float | None = None,
+             to_sec:float | None = None) -> CandleSeries:
+        '''
+        返回 from_sec <= open_sec < to_sec 的蜡烛, None 表示不限制
+        '''
+        map_dict = self._get_maps(symstr, period)
+        open_secs = map_dict['open_sec']
+        start = 0 if from_sec is None else int(np.searchsorted(open_secs, from_sec, side='left'))
+        end = len(open_secs) if to_sec is None else int(np.searchsorted(open_secs, to_sec, side='left'))
+        end = max(start, end)
+        return CandleSeries(o=map_dict['o'][start:end],
+                            h=map_dict['h'][start:end],
+                            l=map_dict['l'][start:end],
+                            c=map_dict['c'][start:end],
+                            open_sec=open_secs[start:end],
+                            symstr=symstr,
+                            period=period)
+
+    def get_sec_range(self, symstr:SymbolStr, period:CandlePeriod) -> tuple[float, float] | None:
+        open_secs = self._get_maps(symstr, period)['open_sec']
+        if not len(open_secs):
+            return None
+        return float(open_secs[0]), float(open_secs[-1])
+
+    def _get_dirpath(self, symstr:SymbolStr, period:CandlePeriod) -> Path:
+        return self._root / str(symstr) / str(period)
+
+    def _get_maps(self, symstr:SymbolStr, period:CandlePeriod) -> dict[str, np.ndarray]:
+        map_dict = self._map_dict.get((symstr, period))
+        if map_dict is None:
+            dirpath = self._get_dirpath(symstr, period)
+            bar_cnt = _get_bar_cnt(dirpath)
+            if bar_cnt:
+                map_dict = {
+                    name: np.memmap(dirpath / name, dtype=_DTYPE, mode='r', shape=(bar_cnt,))
+                    for name in _COL_NAMES
+                }
+            else:
+                map_dict = {name: np.empty(0, dtype=_DTYPE) for name in _COL_NAMES}
+            self._map_dict[(symstr, period)] = map_dict
+        return map_dict
+
+    def _repair(self, dirpath:Path) -> int:
+        bar_cnt = _get_bar_cnt(dirpath)
+        for name in _COL_NAMES:
+            filepath = dirpath / name
+            if filepath.exists() and filepath.stat().st_size != bar_cnt * _DTYPE.itemsize:
+                with open(filepath, "r+b") as file:
+                    file.truncate(bar_cnt * _DTYPE.itemsize)
+        return bar_cnt
+
+
+def _get_bar_cnt(dirpath:Path) -> int:
+    # 各列里最短的长度才是完整写入的蜡烛数
+    size_list = [
+        (dirpath / name).stat().st_size if (dirpath / name).exists() else 0
+        for name in _COL_NAMES
+    ]
+    return min(size_list) // _DTYPE.itemsize
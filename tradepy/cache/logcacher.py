@@ -0,0 +1,180 @@
+import os
+import json
+import zlib
+import threading
+from pathlib import Path
+from . import Cacheable
+
+class LogCacher(Cacheable):
+    '''
+    追加写的 cache, 每次 update 只在文件末尾追加每个 key 的一条记录, 不重写整个文件
+    内存里只保存每个 key 最新记录的 (offset, length), get_val 只读这一条记录
+    一条记录是一行: 8位 crc32 十六进制 + 空格 + json([key, val]) + 换行
+    旧记录占用的空间超过 compact_ratio 之后, 后台线程把有效记录复制到新文件再替换, 同一时间只有一个压缩在跑
+    打开时如果最后一条记录没写完(进程崩溃), 会把它截掉
+    中间校验失败的记录跳过, 当成旧记录等压缩时去掉, 它后面的记录照常读; 坏记录本来对应的值就丢了
+    '''
+    def __init__(self, filepath: Path, compact_ratio:float=0.5, compact_min_bytes:int=1 << 20) -> None:
+        self._filepath = filepath
+        self._compact_ratio = compact_ratio
+        self._compact_min_bytes = compact_min_bytes
+        self._lock = threading.Lock()
+        self._index:dict[str, tuple[int, int]] = {}
+        self._live_bytes = 0
+        self._end = 0
+        self._compact_thread:threading.Thread | None = None
+        # 在锁里设置, 保证同一时间只有一个 _compact
+        self._compacting = False
+        self._load()
+        self._open()
+
+    def update(self, new_kvs:dict):
+        if not new_kvs:
+            return
+        rec_list = [(key, _encode(key, val)) for key, val in new_kvs.items()]
+        with self._lock:
+            self._append_file.write(b''.join(rec for _,rec in rec_list))
+            self._append_file.flush()
+            for key, rec in rec_list:
+                old = self._index.get(key)
+                if old:
+                    self._live_bytes -= old[1]
+                self._index[key] = (self._end, len(rec))
+                self._live_bytes += len(rec)
+                self._end += len(rec)
+            if self._need_compact():
+                self._compacting = True
+                # 先 start 再赋值, wait_compact 不拿锁, 不能让它 join 还没 start 的线程
+                thread = threading.Thread(target=self._compact, daemon=True)
+                thread.start()
+                self._compact_thread = thread
+
+    def get_val(self, key:str):
+        with self._lock:
+            pos = self._index.get(key)
+            if pos is None:
+                return None
+            offset, length = pos
+            rec = os.pread(self._read_file.fileno(), length, offset)
+        _, val = _decode(rec)
+        return val
+
+    def compact(self):
+        '''
+        前台同步压缩, 一般不需要手动调用
+        '''
+        while True:
+            self.wait_compact()
+            with self._lock:
+                if not self._compacting:
+                    self._compacting = True
+                    break
+        self._compact()
+
+    def wait_compact(self):
+        thread = self._compact_thread
+        if thread is not None:
+            thread.join()
+
+    def close(self):
+        self.wait_compact()
+        with self._lock:
+            self._append_file.close()
+            self._read_file.close()
+
+    @property
+    def garbage_bytes(self) -> int:
+        return self._end - self._live_bytes
+
+    def _need_compact(self) -> bool:
+        if self._compacting:
+            return False
+        return self._end >= self._compact_min_bytes and self.garbage_bytes > self._end * self._compact_ratio
+
+    def _open(self):
+        self._append_file = open(self._filepath, "ab")
+        self._read_file = open(self._filepath, "rb")
+
+    def _load(self):
+        if not self._filepath.exists():
+            self._filepath.touch()
+            return
+        with open(self._filepath, "rb") as file:
+            data = file.read()
+        for key, offset, length in _iter_recs(data):
+            old = self._index.get(key)
+            if old:
+                self._live_bytes -= old[1]
+            self._index[key] = (offset, length)
+            self._live_bytes += length
+        self._end = data.rfind(b'\n') + 1
+        if self._end < len(data):
+            # 最后一条记录没写完, 截掉
+            with open(self._filepath, "r+b") as file:
+                file.truncate(self._end)
+
+    def _compact(self):
+        try:
+            self._copy_live()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _copy_live(self):
+        with self._lock:
+            index = dict(self._index)
+            snap_end = self._end
+        tmp_filepath = self._filepath.with_name(self._filepath.name + '.compact')
+        new_index:dict[str, tuple[int, int]] = {}
+        with open(tmp_filepath, "wb") as out_file, open(self._filepath, "rb") as src_file:
+            offset = 0
+            for key, (old_offset, length) in sorted(index.items(), key=lambda x: x[1][0]):
+                src_file.seek(old_offset)
+                out_file.write(src_file.read(length))
+                new_index[key] = (offset, length)
+                offset += length
+            with self._lock:
+                # 复制期间新追加的记录
+                src_file.seek(snap_end)
+                tail = src_file.read(self._end - snap_end)
+                for key, rec_offset, length in _iter_recs(tail):
+                    new_index[key] = (offset + rec_offset, length)
+                offset += len(tail)
+                out_file.write(tail)
+                out_file.flush()
+                os.fsync(out_file.fileno())
+                os.replace(tmp_filepath, self._filepath)
+                self._append_file.close()
+                self._read_file.close()
+                self._open()
+                self._index = new_index
+                self._end = offset
+                self._live_bytes = sum(length for _,length in new_index.values())
+
+
+def _encode(key:str, val) -> bytes:
+    payload = json.dumps([key, val]).encode()
+    return f"{zlib.crc32(payload):08x} ".encode() + payload + b'\n'
+
+def _decode(rec:bytes) -> tuple:
+    payload = rec[9:-1]
+    if len(rec) < 10 or rec[-1:] != b'\n' or int(rec[:8], 16) != zlib.crc32(payload):
+        raise ValueError("broken cache record")
+    key, val = json.loads(payload)
+    return key, val
+
+def _iter_recs(data:bytes):
+    # 逐条返回 (key, 记录在 data 里的 offset, 记录长度), 校验失败的记录跳过, 最后没有换行的不完整记录不返回
+    offset = 0
+    while offset < len(data):
+        end = data.find(b'\n', offset)
+        if end < 0:
+            return
+        rec = data[offset:end + 1]
+        try:
+            key, _ = _decode(rec)
+        except ValueError:
+            key = None
+        if key is not None:
+            yield key, offset, len(rec)
+        offset = end + 1
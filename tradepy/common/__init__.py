@@ -16,6 +16,10 @@ def trunc(n, prec:int=2) -> Decimal:
     # 先转成 str 就不会带有后面的小数了
     return Decimal(str(result))
 
+def to_dec(f:float) -> Decimal:
+    # 和 trunc 一样先转 str, 这样 1.1 得到的是 Decimal('1.1') 而不是一长串二进制尾数
+    return Decimal(repr(float(f)))
+
 def random_str(len:int=10) -> str:
     chars = string.ascii_letters + string.digits
     return ''.join(random.choices(chars, k=len))
\ No newline at end of file
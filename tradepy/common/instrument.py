@@ -0,0 +1,107 @@
+import time
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+# sink(name, fields), 每个事件调用一次, 比如写 jsonl 或者打印
+Sink = Callable[[str, dict], None]
+
+class Instrument:
+    '''
+    计数器 + 耗时统计 + 可选的逐条事件
+    没有 set_instrument 的时候模块函数什么都不做, 热点循环里几乎没有开销
+    '''
+    def __init__(self, sink:Sink | None = None) -> None:
+        self.sink = sink
+        self._counter = Counter()
+        self._span_dict:dict[str, list] = {} # name -> [次数, 总秒数, 最长秒数]
+        self._lock = threading.Lock()
+
+    def incr(self, name:str, n:int=1):
+        with self._lock:
+            self._counter[name] += n
+
+    def event(self, name:str, **fields):
+        self.incr(name)
+        if self.sink is not None:
+            self.sink(name, fields)
+
+    @contextmanager
+    def span(self, name:str):
+        start_sec = time.perf_counter()
+        try:
+            yield
+        finally:
+            cost_sec = time.perf_counter() - start_sec
+            with self._lock:
+                stat = self._span_dict.setdefault(name, [0, 0.0, 0.0])
+                stat[0] += 1
+                stat[1] += cost_sec
+                stat[2] = max(stat[2], cost_sec)
+
+    def get_cnt(self, name:str) -> int:
+        return self._counter[name]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(
+                counters=dict(self._counter),
+                spans={
+                    name: dict(cnt=cnt, tot_sec=tot_sec, max_sec=max_sec)
+                    for name, (cnt, tot_sec, max_sec) in self._span_dict.items()
+                }
+            )
+
+    def reset(self):
+        with self._lock:
+            self._counter.clear()
+            self._span_dict.clear()
+
+    def __str__(self) -> str:
+        summ = self.summary()
+        line_list = [f"{name}: {cnt}" for name, cnt in sorted(summ['counters'].items())]
+        line_list += [
+            f"{name}: {stat['cnt']}x tot({stat['tot_sec']:.4f}s) max({stat['max_sec']:.4f}s)"
+            for name, stat in sorted(summ['spans'].items())
+        ]
+        return '\n'.join(line_list)
+
+
+_instrument:Instrument | None = None
+_NULL_SPAN = nullcontext()
+
+def set_instrument(instrument:Instrument | None):
+    global _instrument
+    _instrument = instrument
+
+def get_instrument() -> Instrument | None:
+    # 热点循环里先取一次, 再用 `if inst is not None` 判断, 比每次调模块函数更省
+    return _instrument
+
+def incr(name:str, n:int=1):
+    if _instrument is not None:
+        _instrument.incr(name, n)
+
+def event(name:str, **fields):
+    if _instrument is not None:
+        _instrument.event(name, **fields)
+
+def span(name:str):
+    return _instrument.span(name) if _instrument is not None else _NULL_SPAN
+
+def timed(name:str):
+    '''
+    函数级别的 span, 调用时才判断有没有 instrument
+    和 staticmethod 一起用时放在 staticmethod 下面
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _instrument is None:
+                return func(*args, **kwargs)
+            with _instrument.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
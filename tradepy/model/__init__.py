@@ -25,7 +25,29 @@ class SymbolStr(StrEnum):
     @property 
     def quote(self) -> str:
         return str(self)[3:]
-    
+
+    @property
+    def point_digits(self) -> int:
+        # 报价的小数位数, 定点模式下价格存成 价格 * 10^point_digits 的 int64
+        return _POINT_DIGITS_DICT[self]
+
+_POINT_DIGITS_DICT = {
+    SymbolStr.EURUSD: 5,
+    SymbolStr.USDJPY: 3,
+    SymbolStr.GBPUSD: 5,
+    SymbolStr.AUDUSD: 5,
+    SymbolStr.USDCHF: 5,
+    SymbolStr.USDCAD: 5,
+    SymbolStr.NZDUSD: 5,
+    SymbolStr.BTCUSD: 2,
+    SymbolStr.ETHUSD: 2,
+    SymbolStr.XAUUSD: 2,
+    SymbolStr.XAGUSD: 3,
+    SymbolStr.XBRUSD: 2,
+    SymbolStr.XNGUSD: 3,
+    SymbolStr.XTIUSD: 2,
+    SymbolStr.XPTUSD: 2,
+}
 
 @unique
 class CandlePeriod(StrEnum):
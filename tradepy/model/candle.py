@@ -1,5 +1,7 @@
-from ..common import utc_date
+from ..common import utc_date, to_dec
 from decimal import Decimal
+from functools import lru_cache
+import numpy as np
 from . import SymbolStr,CandlePeriod
 
 STRTIME_FMT = "%Y-%m-%d_%H'%M\"%S"
@@ -35,7 +37,7 @@ class Candle:
 
     @property
     def strtime(self) -> str:
-        return utc_date(self.open_sec).strftime(STRTIME_FMT)
+        return _get_strtime(self.open_sec)
 
     @property
     def is_up(self):
@@ -47,3 +49,289 @@ class Candle:
     
     def __str__(self) -> str:
         return f"C(op{utc_date(self.open_sec)} sym{str(self.symstr).upper()} period{self.period} ohlc{self.o}, {self.h}, {self.l}, {self.c})"
+
+
+class CandleView(Candle):
+    '''
+    CandleSeries 的某一根蜡烛, 只保存 series 和 idx, 取值时才从列里转成 Decimal
+    指向同一块内存的同一根蜡烛的 view 相等, 切片和原来的 series 共享内存, 所以切片里的 view 也等于原 series 里的,
+    和 list[Candle] 切片后还是同一个对象一样, 可以放进 peaks/valleys 这种 set 里
+    '''
+    __slots__ = ('_series', '_idx')
+
+    def __init__(self, series:'CandleSeries', idx:int) -> None:
+        self._series = series
+        self._idx = idx
+
+    @property
+    def o(self) -> Decimal:
+        return self._get_dec('o')
+
+    @property
+    def h(self) -> Decimal:
+        return self._get_dec('h')
+
+    @property
+    def l(self) -> Decimal:
+        return self._get_dec('l')
+
+    @property
+    def c(self) -> Decimal:
+        return self._get_dec('c')
+
+    def _get_dec(self, name:str) -> Decimal:
+        # 定点模式直接从整数点数得到精确的 Decimal
+        pts = getattr(self._series, f'{name}_pts')
+        if pts is None:
+            return to_dec(getattr(self._series, name)[self._idx])
+        return Decimal(int(pts[self._idx])).scaleb(-self._series.symstr.point_digits)
+
+    @property
+    def open_sec(self) -> float:
+        return float(self._series.open_sec[self._idx])
+
+    @property
+    def symstr(self) -> SymbolStr:
+        return self._series.symstr
+
+    @property
+    def period(self) -> CandlePeriod:
+        return self._series.period
+
+    @property
+    def series(self) -> 'CandleSeries':
+        return self._series
+
+    @property
+    def idx(self) -> int:
+        return self._idx
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CandleView):
+            return NotImplemented
+        if self._series is other._series:
+            return self._idx == other._idx
+        return self._series.get_bar_key(self._idx) == other._series.get_bar_key(other._idx)
+
+    def __hash__(self) -> int:
+        return hash(self._series.get_bar_key(self._idx))
+
+
+class CandleSeries:
+    '''
+    按列存储的蜡烛序列, o h l c open_sec 各是一个连续的 float64 数组, symstr 和 period 只存一份
+    可以像 list[Candle] 一样用 len, 下标, 迭代, 下标拿到的是 CandleView
+    切片返回共享内存的 CandleSeries, 不会复制数组
+    定点模式 (from_points / with_points) 另外保存 o_pts h_pts l_pts c_pts 四列 int64,
+    单位是 symstr 的 point, 价格比较用整数, 保证精确; o h l c 还是 float64, 给指标计算用
+    '''
+    def __init__(self, o, h, l, c, open_sec, symstr:SymbolStr, period:CandlePeriod,
+                 o_pts=None, h_pts=None, l_pts=None, c_pts=None) -> None:
+        self.o = np.asarray(o, dtype=np.float64)
+        self.h = np.asarray(h, dtype=np.float64)
+        self.l = np.asarray(l, dtype=np.float64)
+        self.c = np.asarray(c, dtype=np.float64)
+        self.open_sec = np.asarray(open_sec, dtype=np.float64)
+        self.symstr = symstr
+        self.period = period
+        assert len(self.o) == len(self.h) == len(self.l) == len(self.c) == len(self.open_sec), "all columns need same length"
+        pts_list = [o_pts, h_pts, l_pts, c_pts]
+        assert all(pts is None for pts in pts_list) or all(pts is not None for pts in pts_list), "need all 4 point columns or none"
+        self.o_pts, self.h_pts, self.l_pts, self.c_pts = [
+            None if pts is None else np.asarray(pts, dtype=np.int64)
+            for pts in pts_list
+        ]
+        assert self.o_pts is None or len(self.o_pts) == len(self.o), "point columns need same length"
+
+    @property
+    def has_points(self) -> bool:
+        return self.o_pts is not None
+
+    def get_bar_key(self, idx:int) -> tuple[int, int]:
+        '''
+        第 idx 根蜡烛 open_sec 和 c 的内存地址, 共享内存的 series (切片, with_points) 里同一根蜡烛的 key 一样
+        '''
+        open_sec_addr, open_sec_stride, c_addr, c_stride = self._get_addrs()
+        return (open_sec_addr + idx * open_sec_stride, c_addr + idx * c_stride)
+
+    def get_idx(self, candle:Candle) -> int | None:
+        '''
+        candle 是这个 series 的第几根, 不是这个 series 里的蜡烛返回 None
+        '''
+        if not isinstance(candle, CandleView):
+            return None
+        if candle.series is self:
+            return candle.idx
+        if not len(self):
+            return None
+        open_sec_key, c_key = candle.series.get_bar_key(candle.idx)
+        open_sec_addr, open_sec_stride, _, _ = self._get_addrs()
+        idx, rem = divmod(open_sec_key - open_sec_addr, open_sec_stride)
+        if rem or not 0 <= idx < len(self) or self.get_bar_key(idx) != (open_sec_key, c_key):
+            return None
+        return idx
+
+    def _get_addrs(self) -> tuple[int, int, int, int]:
+        # 列不会替换, 第一次用到时算好缓存
+        addrs = getattr(self, '_addrs', None)
+        if addrs is None:
+            addrs = (self.open_sec.__array_interface__['data'][0], self.open_sec.strides[0],
+                     self.c.__array_interface__['data'][0], self.c.strides[0])
+            self._addrs = addrs
+        return addrs
+
+    @staticmethod
+    def from_points(o_pts, h_pts, l_pts, c_pts, open_sec, symstr:SymbolStr, period:CandlePeriod) -> 'CandleSeries':
+        pts_list = [np.asarray(pts, dtype=np.int64) for pts in (o_pts, h_pts, l_pts, c_pts)]
+        o, h, l, c = [from_points(pts, symstr) for pts in pts_list]
+        return CandleSeries(o, h, l, c, open_sec, symstr, period, *pts_list)
+
+    def with_points(self) -> 'CandleSeries':
+        '''
+        返回定点模式的 series, float 列共享内存
+        价格必须正好在 symstr 的 point 上, 否则 assert 失败
+        '''
+        if self.has_points:
+            return self
+        pts_list = [to_points(col, self.symstr) for col in (self.o, self.h, self.l, self.c)]
+        return CandleSeries(self.o, self.h, self.l, self.c, self.open_sec, self.symstr, self.period, *pts_list)
+
+    @property
+    def time_axis(self) -> 'TimeAxis':
+        # 第一次用到才建, 之后所有 trace 共用
+        if getattr(self, '_time_axis', None) is None:
+            self._time_axis = TimeAxis(self.open_sec)
+        return self._time_axis
+
+    @staticmethod
+    def from_candles(candle_list:list[Candle]) -> 'CandleSeries':
+        assert candle_list, "need at least one candle to know symstr and period"
+        return CandleSeries(o=[float(c.o) for c in candle_list],
+                            h=[float(c.h) for c in candle_list],
+                            l=[float(c.l) for c in candle_list],
+                            c=[float(c.c) for c in candle_list],
+                            open_sec=[c.open_sec for c in candle_list],
+                            symstr=candle_list[0].symstr,
+                            period=candle_list[0].period)
+
+    def to_candles(self) -> list[Candle]:
+        return [
+            Candle(o=to_dec(o), h=to_dec(h), l=to_dec(l), c=to_dec(c), open_sec=open_sec, symstr=self.symstr, period=self.period)
+            for o, h, l, c, open_sec in zip(self.o.tolist(), self.h.tolist(), self.l.tolist(), self.c.tolist(), self.open_sec.tolist())
+        ]
+
+    def __len__(self) -> int:
+        return len(self.open_sec)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return CandleSeries(o=self.o[key],
+                                h=self.h[key],
+                                l=self.l[key],
+                                c=self.c[key],
+                                open_sec=self.open_sec[key],
+                                symstr=self.symstr,
+                                period=self.period,
+                                o_pts=None if self.o_pts is None else self.o_pts[key],
+                                h_pts=None if self.h_pts is None else self.h_pts[key],
+                                l_pts=None if self.l_pts is None else self.l_pts[key],
+                                c_pts=None if self.c_pts is None else self.c_pts[key])
+        idx = key.__index__()
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("candle index out of range")
+        return CandleView(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield CandleView(self, idx)
+
+    def __str__(self) -> str:
+        return f"CS(sym{str(self.symstr).upper()} period{self.period} len{len(self)})"
+
+
+def to_points(nums, symstr:SymbolStr) -> np.ndarray:
+    '''
+    float 价格转成 int64 点数, 价格必须正好在 point 上
+    '''
+    nums = np.asarray(nums, dtype=np.float64)
+    pts = np.rint(nums * 10 ** symstr.point_digits).astype(np.int64)
+    assert np.array_equal(from_points(pts, symstr), nums), f"prices are not on the point grid of {symstr}"
+    return pts
+
+def from_points(pts, symstr:SymbolStr) -> np.ndarray:
+    # 整数除以 10^n 是正确舍入的, 和 float(Decimal(价格)) 结果一样
+    return np.asarray(pts, dtype=np.int64) / 10 ** symstr.point_digits
+
+
+class TimeAxis:
+    '''
+    一个 series 的时间轴, 所有 open_sec 一次性向量化转成 STRTIME_FMT 的字符串, 画图时各个 trace 和 shape 共用
+    '''
+    def __init__(self, open_secs) -> None:
+        self.open_secs = np.asarray(open_secs, dtype=np.float64)
+        self._is_sorted = bool(np.all(self.open_secs[1:] >= self.open_secs[:-1]))
+        self._strtimes = None
+
+    @staticmethod
+    def of(candles) -> 'TimeAxis':
+        if isinstance(candles, CandleSeries):
+            return candles.time_axis
+        return TimeAxis([c.open_sec for c in candles])
+
+    @property
+    def strtimes(self) -> np.ndarray:
+        if self._strtimes is None:
+            self._strtimes = get_strtimes(self.open_secs)
+        return self._strtimes
+
+    @property
+    def datetimes(self) -> np.ndarray:
+        return to_datetimes(self.open_secs)
+
+    def get_strtimes(self, secs) -> np.ndarray:
+        '''
+        在轴上的时间直接取已经转好的字符串, 不在轴上的再单独转
+        '''
+        secs = np.asarray(secs, dtype=np.float64)
+        if not self._is_sorted or not len(self.open_secs):
+            return get_strtimes(secs)
+        idxs = np.minimum(np.searchsorted(self.open_secs, secs), len(self.open_secs) - 1)
+        is_ons = self.open_secs[idxs] == secs
+        if is_ons.all():
+            return self.strtimes[idxs]
+        strtimes = np.empty(len(secs), dtype=self.strtimes.dtype if len(self.strtimes) else 'U19')
+        strtimes[is_ons] = self.strtimes[idxs[is_ons]]
+        strtimes[~is_ons] = get_strtimes(secs[~is_ons])
+        return strtimes
+
+
+def get_strtimes(open_secs) -> np.ndarray:
+    '''
+    和 Candle.strtime 一样的格式, 一次转一整个数组
+    datetime64 转成 YYYY-MM-DDTHH:MM:SS 之后, 把 T : : 三个位置换成 STRTIME_FMT 的分隔符
+    '''
+    secs = np.asarray(open_secs, dtype=np.float64)
+    if not len(secs):
+        return np.array([], dtype='U19')
+    chars = np.datetime_as_string(to_datetimes(secs), unit='s').astype('S19').view(np.uint8).reshape(len(secs), 19).copy()
+    chars[:, 10] = ord('_')
+    chars[:, 13] = ord("'")
+    chars[:, 16] = ord('"')
+    return chars.view('S19').ravel().astype('U19')
+
+def to_datetimes(open_secs) -> np.ndarray:
+    open_secs = np.asarray(open_secs, dtype=np.float64)
+    # 和 datetime.fromtimestamp 一样, 小数部分先按 round-half-even 取到微秒, 进位到 1 秒的话秒数加一
+    int_secs = np.trunc(open_secs)
+    micros = np.rint((open_secs - int_secs) * 1e6)
+    int_secs = int_secs + (micros >= 1e6) - (micros < 0)
+    return int_secs.astype(np.int64).astype('datetime64[s]')
+
+@lru_cache(maxsize=1 << 16)
+def _get_strtime(open_sec:float) -> str:
+    return utc_date(open_sec).strftime(STRTIME_FMT)
@@ -0,0 +1,167 @@
+import numpy as np
+from . import SymbolStr, CandlePeriod
+from .candle import Candle, CandleSeries
+from ..common import to_dec, utc_date
+from datetime import datetime, timezone
+import math
+
+_PERIOD_SEC_DICT = {
+    CandlePeriod.S1: 1,
+    CandlePeriod.S5: 5,
+    CandlePeriod.S10: 10,
+    CandlePeriod.S15: 15,
+    CandlePeriod.S30: 30,
+    CandlePeriod.M1: 60,
+    CandlePeriod.M2: 2 * 60,
+    CandlePeriod.M3: 3 * 60,
+    CandlePeriod.M4: 4 * 60,
+    CandlePeriod.M5: 5 * 60,
+    CandlePeriod.M10: 10 * 60,
+    CandlePeriod.M15: 15 * 60,
+    CandlePeriod.M30: 30 * 60,
+    CandlePeriod.M45: 45 * 60,
+    CandlePeriod.H1: 3600,
+    CandlePeriod.H2: 2 * 3600,
+    CandlePeriod.H3: 3 * 3600,
+    CandlePeriod.H4: 4 * 3600,
+    CandlePeriod.H12: 12 * 3600,
+    CandlePeriod.D1: 86400,
+    CandlePeriod.W1: 7 * 86400,
+}
+# 按自然月算的周期, 对齐到 1月/4月/7月/10月 这种日历边界
+_MONTH_CNT_DICT = {
+    CandlePeriod.MO1: 1,
+    CandlePeriod.MO3: 3,
+    CandlePeriod.MO6: 6,
+    CandlePeriod.Y1: 12,
+}
+# 1970-01-01 是周四, 周线从 1970-01-05 周一 00:00 UTC 开始对齐
+_WEEK_OFFSET_SEC = 4 * 86400
+_DAY_SEC = 86400
+
+def get_period_sec(period:CandlePeriod) -> int | None:
+    '''
+    固定长度周期的秒数, 按自然月算的周期返回 None
+    '''
+    return _PERIOD_SEC_DICT.get(period)
+
+def get_bucket_sec(open_sec:float, period:CandlePeriod) -> float:
+    '''
+    get_bucket_secs 的单个值版本, 不创建数组
+    '''
+    month_cnt = _MONTH_CNT_DICT.get(period)
+    if month_cnt:
+        date = utc_date(open_sec)
+        month = (date.month - 1) // month_cnt * month_cnt + 1
+        return datetime(date.year, month, 1, tzinfo=timezone.utc).timestamp()
+    sec = _PERIOD_SEC_DICT[period]
+    offset = _WEEK_OFFSET_SEC if period == CandlePeriod.W1 else 0
+    return math.floor((open_sec - offset) / sec) * sec + offset
+
+def get_bucket_secs(open_secs:np.ndarray, period:CandlePeriod) -> np.ndarray:
+    '''
+    每根蜡烛属于 period 的哪一根, 返回那一根的 open_sec
+    '''
+    open_secs = np.asarray(open_secs, dtype=np.float64)
+    month_cnt = _MONTH_CNT_DICT.get(period)
+    if month_cnt:
+        months = np.floor(open_secs).astype(np.int64).astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+        months -= months % month_cnt
+        return months.astype('datetime64[M]').astype('datetime64[s]').astype(np.float64)
+    sec = _PERIOD_SEC_DICT[period]
+    offset = _WEEK_OFFSET_SEC if period == CandlePeriod.W1 else 0
+    return np.floor((open_secs - offset) / sec) * sec + offset
+
+def is_resamplable(from_period:CandlePeriod, to_period:CandlePeriod) -> bool:
+    '''
+    from_period 的每一根蜡烛都完整地落在 to_period 的某一根里面
+    按自然月的周期都从 1 月对齐, 月数整除就能合成, 比如 MO1->MO3, MO3->Y1
+    '''
+    if from_period == to_period:
+        return False
+    from_month_cnt = _MONTH_CNT_DICT.get(from_period)
+    if from_month_cnt is not None:
+        to_month_cnt = _MONTH_CNT_DICT.get(to_period)
+        return to_month_cnt is not None and to_month_cnt % from_month_cnt == 0
+    from_sec = _PERIOD_SEC_DICT.get(from_period)
+    if from_sec is None:
+        return False
+    if to_period in _MONTH_CNT_DICT or to_period == CandlePeriod.W1:
+        return from_sec <= _DAY_SEC and _DAY_SEC % from_sec == 0
+    return _PERIOD_SEC_DICT[to_period] % from_sec == 0
+
+def resample(series:CandleSeries, to_period:CandlePeriod) -> CandleSeries:
+    '''
+    一次向量化把细周期的蜡烛合成粗周期, 每一根是 第一个 open, 最高 high, 最低 low, 最后一个 close
+    series 需要按 open_sec 排好序
+    '''
+    assert is_resamplable(series.period, to_period), f"can not resample {series.period} into {to_period}"
+    bucket_secs, o, h, l, c = _aggregate(series, to_period)
+    return CandleSeries(o=o, h=h, l=l, c=c, open_sec=bucket_secs, symstr=series.symstr, period=to_period)
+
+def _aggregate(series:CandleSeries, to_period:CandlePeriod) -> tuple:
+    if not series:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, empty, empty, empty
+    keys = get_bucket_secs(series.open_sec, to_period)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    ends = np.append(starts[1:], len(keys))
+    return (keys[starts],
+            series.o[starts],
+            np.maximum.reduceat(series.h, starts),
+            np.minimum.reduceat(series.l, starts),
+            series.c[ends - 1])
+
+
+class Resampler:
+    '''
+    增量合成, 每次 update 新的细周期蜡烛, 返回每个粗周期这次新收盘的蜡烛
+    每个粗周期只在内存里保留最后一根还没收盘的蜡烛, 新蜡烛只和它合并
+    粗周期的某一根要等到下一根的第一根细蜡烛进来才算收盘
+    '''
+    def __init__(self, symstr:SymbolStr, from_period:CandlePeriod, to_period_list:list[CandlePeriod]) -> None:
+        for to_period in to_period_list:
+            assert is_resamplable(from_period, to_period), f"can not resample {from_period} into {to_period}"
+        self._symstr = symstr
+        self._from_period = from_period
+        self._to_period_list = list(to_period_list)
+        # period -> (open_sec, o, h, l, c)
+        self._open_dict:dict[CandlePeriod, tuple] = {}
+
+    def update(self, series:CandleSeries) -> dict[CandlePeriod, CandleSeries]:
+        assert series.symstr == self._symstr and series.period == self._from_period, "series not match resampler"
+        closed_dict = {}
+        for to_period in self._to_period_list:
+            bucket_secs, o, h, l, c = _aggregate(series, to_period)
+            open_bar = self._open_dict.get(to_period)
+            if open_bar is not None and len(bucket_secs):
+                open_sec, open_o, open_h, open_l, _ = open_bar
+                if bucket_secs[0] == open_sec:
+                    o = o.copy()
+                    h = h.copy()
+                    l = l.copy()
+                    o[0] = open_o
+                    h[0] = max(h[0], open_h)
+                    l[0] = min(l[0], open_l)
+                else:
+                    bucket_secs, o, h, l, c = [
+                        np.concatenate(([open_val], col))
+                        for open_val, col in zip(open_bar, (bucket_secs, o, h, l, c))
+                    ]
+            if len(bucket_secs):
+                self._open_dict[to_period] = (bucket_secs[-1], o[-1], h[-1], l[-1], c[-1])
+            closed_dict[to_period] = CandleSeries(o=o[:-1],
+                                                  h=h[:-1],
+                                                  l=l[:-1],
+                                                  c=c[:-1],
+                                                  open_sec=bucket_secs[:-1],
+                                                  symstr=self._symstr,
+                                                  period=to_period)
+        return closed_dict
+
+    def get_open_candle(self, period:CandlePeriod) -> Candle | None:
+        open_bar = self._open_dict.get(period)
+        if open_bar is None:
+            return None
+        open_sec, o, h, l, c = open_bar
+        return Candle(o=to_dec(o), h=to_dec(h), l=to_dec(l), c=to_dec(c), open_sec=float(open_sec), symstr=self._symstr, period=period)
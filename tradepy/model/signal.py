@@ -16,4 +16,13 @@ class Signal:
         self.symstr = symstr
 
     def __str__(self) -> str:
-        return f"S(pr{self.price} sl{self.sl} tp{self.tp} sym{str(self.symstr).upper()})"
\ No newline at end of file
+        return f"S(pr{self.price} sl{self.sl} tp{self.tp} sym{str(self.symstr).upper()})"
+
+def round_to_point(price:Decimal, symstr:SymbolStr) -> Decimal:
+    '''
+    按报价的小数位数取整, 去重的 key 用
+    CandleSeries 的 sl tp 是 float 算的, list[Candle] 是 Decimal 算的, 尾数不一样, 取整之后才相等
+    '''
+    return price.quantize(_POINT_DICT[symstr])
+
+_POINT_DICT = {symstr: Decimal(1).scaleb(-symstr.point_digits) for symstr in SymbolStr}
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import Protocol
 from websockets import WebSocketClientProtocol
+from ..model.candle import Candle
 
 class Streamable(Protocol):
     @staticmethod
@@ -12,9 +13,20 @@ class Streamable(Protocol):
 
     @staticmethod
     async def received(connection:WebSocketClientProtocol, jsonstr:str):
+        # Websocket 默认的 Dispatcher 串行调用, 这里 await 同一个连接上的回复会卡死, 要等回复的话 create_task
+        pass
+
+    @staticmethod
+    async def received_batch(connection:WebSocketClientProtocol, messages:list):
+        # Websocket 打开 batch_recv 时调用, messages 是已经解析好的 json
         pass
 
     @staticmethod
     async def closed(e:Exception):
         pass
-    
+
+
+class CandleStreamable(Streamable, Protocol):
+    @staticmethod
+    async def candle_closed(candle:Candle):
+        pass
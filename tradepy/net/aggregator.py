@@ -0,0 +1,131 @@
+import json
+from typing import Callable
+from websockets import WebSocketClientProtocol
+from . import Streamable, CandleStreamable
+from ..model import SymbolStr, CandlePeriod
+from ..model.candle import Candle
+from ..model.resample import get_period_sec, get_bucket_sec, is_resamplable
+from ..common import to_dec
+
+# 蜡烛的状态都用 list 原地修改, tick 进来不创建新对象
+_OPEN_SEC, _O, _H, _L, _C = range(5)
+_END_SEC = 5
+
+class CandleAggregator(Streamable):
+    '''
+    放在 Websocket 和真正的 streamer 之间, 把 tick 合成 period_list 里每个周期的蜡烛
+    一根蜡烛收盘时调用 listener.candle_closed, 其他回调原样转给 listener
+    每个 tick 只更新最小周期的那根蜡烛, 所以不管跟踪多少个周期都是 O(1)
+    最小周期收盘时才合并进更大的周期, 更大周期的某一根在它下一根的第一个 tick 到来时收盘
+    parse_tick 把一条消息解析成 (symstr, sec, price), 不是 tick 的消息返回 None
+    parse_tick_msg 是 Websocket batch_recv 时用的版本, 参数是已经解析好的 json,
+    为 None 的话把消息重新 dumps 成字符串交给 parse_tick, 结果一样但是慢
+    batch 里不是 tick 的消息按原来的顺序交给 listener.received_batch
+    '''
+    def __init__(self,
+                 listener:CandleStreamable,
+                 period_list:list[CandlePeriod],
+                 parse_tick:Callable[[str], tuple[SymbolStr, float, float] | None],
+                 parse_tick_msg:Callable[[object], tuple[SymbolStr, float, float] | None] | None = None) -> None:
+        base_period = min(period_list, key=lambda p: get_period_sec(p) or float('inf'))
+        self._base_period = base_period
+        self._base_sec = get_period_sec(base_period)
+        assert self._base_sec, f"{base_period} can not be the smallest period"
+        self._higher_period_list = [p for p in dict.fromkeys(period_list) if p != base_period]
+        for period in self._higher_period_list:
+            assert is_resamplable(base_period, period), f"can not aggregate {base_period} into {period}"
+        self._listener = listener
+        self._parse_tick = parse_tick
+        self._parse_tick_msg = parse_tick_msg or (lambda msg: parse_tick(json.dumps(msg)))
+        self._base_bar_dict:dict[SymbolStr, list] = {}
+        self._higher_bar_dict:dict[SymbolStr, dict[CandlePeriod, list]] = {}
+
+    async def will_connect(self):
+        await self._listener.will_connect()
+
+    async def connected(self, connection:WebSocketClientProtocol):
+        await self._listener.connected(connection)
+
+    async def closed(self, e:Exception):
+        await self._listener.closed(e)
+
+    async def received_batch(self, connection:WebSocketClientProtocol, messages:list):
+        other_list = []
+        for msg in messages:
+            tick = self._parse_tick_msg(msg)
+            if tick is None:
+                other_list.append(msg)
+                continue
+            symstr, sec, price = tick
+            await self.add_tick(symstr, sec, price)
+        if other_list:
+            await self._listener.received_batch(connection, other_list)
+
+    async def received(self, connection:WebSocketClientProtocol, jsonstr:str):
+        tick = self._parse_tick(jsonstr)
+        if tick is None:
+            await self._listener.received(connection, jsonstr)
+            return
+        symstr, sec, price = tick
+        await self.add_tick(symstr, sec, price)
+
+    async def add_tick(self, symstr:SymbolStr, sec:float, price:float):
+        bar = self._base_bar_dict.get(symstr)
+        if bar is not None and sec < bar[_END_SEC]:
+            if price > bar[_H]:
+                bar[_H] = price
+            elif price < bar[_L]:
+                bar[_L] = price
+            bar[_C] = price
+            return
+        await self._roll(symstr, sec, price, bar)
+
+    def get_open_candle(self, symstr:SymbolStr, period:CandlePeriod) -> Candle | None:
+        base_bar = self._base_bar_dict.get(symstr)
+        if base_bar is None:
+            return None
+        if period == self._base_period:
+            return self._to_candle(symstr, period, base_bar)
+        bar = self._higher_bar_dict[symstr].get(period)
+        if bar is None:
+            return self._to_candle(symstr, period, [get_bucket_sec(base_bar[_OPEN_SEC], period), *base_bar[_O:_END_SEC]])
+        return self._to_candle(symstr, period, [bar[_OPEN_SEC],
+                                                bar[_O],
+                                                max(bar[_H], base_bar[_H]),
+                                                min(bar[_L], base_bar[_L]),
+                                                base_bar[_C]])
+
+    async def _roll(self, symstr:SymbolStr, sec:float, price:float, base_bar:list | None):
+        higher_bar_dict = self._higher_bar_dict.setdefault(symstr, {})
+        open_sec = get_bucket_sec(sec, self._base_period)
+        closed_list = []
+        if base_bar is not None:
+            closed_list.append(self._to_candle(symstr, self._base_period, base_bar))
+            # 最小周期收盘, 合并进更大的周期
+            for period in self._higher_period_list:
+                bar = higher_bar_dict.get(period)
+                if bar is None:
+                    higher_bar_dict[period] = [get_bucket_sec(base_bar[_OPEN_SEC], period), *base_bar[_O:_END_SEC]]
+                else:
+                    bar[_H] = max(bar[_H], base_bar[_H])
+                    bar[_L] = min(bar[_L], base_bar[_L])
+                    bar[_C] = base_bar[_C]
+        # 新的 tick 已经属于下一根的话, 更大周期的这一根就收盘了
+        for period in self._higher_period_list:
+            bar = higher_bar_dict.get(period)
+            if bar is not None and bar[_OPEN_SEC] != get_bucket_sec(open_sec, period):
+                closed_list.append(self._to_candle(symstr, period, bar))
+                higher_bar_dict[period] = None
+        self._base_bar_dict[symstr] = [open_sec, price, price, price, price, open_sec + self._base_sec]
+        for candle in closed_list:
+            await self._listener.candle_closed(candle)
+
+    @staticmethod
+    def _to_candle(symstr:SymbolStr, period:CandlePeriod, bar:list) -> Candle:
+        return Candle(o=to_dec(bar[_O]),
+                      h=to_dec(bar[_H]),
+                      l=to_dec(bar[_L]),
+                      c=to_dec(bar[_C]),
+                      open_sec=float(bar[_OPEN_SEC]),
+                      symstr=symstr,
+                      period=period)
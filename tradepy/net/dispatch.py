@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import deque
+from enum import StrEnum, unique, auto
+from typing import Awaitable, Callable, Hashable
+from websockets import WebSocketClientProtocol
+
+_logger = logging.getLogger(__name__)
+
+@unique
+class OverflowPolicy(StrEnum):
+    BLOCK = auto()          # 队列满了 put 等待
+    DROP_OLDEST = auto()    # 丢掉最早的一条
+    COALESCE = auto()       # 同一个 key 还有没处理的消息就用新的替换它, 没有的话丢掉最早的一条
+
+
+class _Lane:
+    def __init__(self, maxsize:int) -> None:
+        self.maxsize = maxsize
+        # entry 是 [key, connection, msg]
+        self.entries:deque[list] = deque()
+        # key -> 这个 key 最新的那条还没处理的 entry, COALESCE 用
+        self.latest_dict:dict[Hashable, list] = {}
+        self.cond = asyncio.Condition()
+        self.busy = False
+
+
+class Dispatcher:
+    '''
+    有界的消息分发队列, worker_cnt 个 worker 协程并发调用 handler
+    同一个 key 的消息总是分到同一个 worker, 所以同一个 key 按收到的顺序处理
+    key_func 从消息里取 key, 比如 symbol, 为 None 时所有消息同一个 key, 完全按顺序处理
+    maxsize 是所有 worker 的队列长度之和
+    handler 抛出的异常不会让 worker 退出, 计入 error_cnt 后交给 on_error(exception, msg),
+    on_error 为 None 时用 logging 打出 traceback
+    worker_cnt=1 + BLOCK 时 handler 是一条一条串行调用的, 队列满了 put 会等,
+    handler 里如果等同一个连接上的回复, 而回复要排在它后面处理, 就会卡死, 这种 handler 要自己 create_task
+    '''
+    def __init__(self,
+                 handler:Callable[[WebSocketClientProtocol, str], Awaitable],
+                 worker_cnt:int=1,
+                 maxsize:int=10000,
+                 key_func:Callable[[str], Hashable] | None = None,
+                 overflow:OverflowPolicy=OverflowPolicy.BLOCK,
+                 on_error:Callable[[Exception, str], None] | None = None) -> None:
+        assert worker_cnt >= 1 and maxsize >= worker_cnt, "need at least one slot per worker"
+        self._handler = handler
+        self._key_func = key_func
+        self._overflow = overflow
+        self._on_error = on_error
+        self._lane_list = [_Lane(maxsize // worker_cnt) for _ in range(worker_cnt)]
+        self._task_list:list[asyncio.Task] = []
+        self.dropped_cnt = 0
+        self.coalesced_cnt = 0
+        self.error_cnt = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(lane.entries) for lane in self._lane_list)
+
+    @property
+    def depth_list(self) -> list[int]:
+        return [len(lane.entries) for lane in self._lane_list]
+
+    def start(self):
+        if self._task_list:
+            return
+        self._task_list = [asyncio.create_task(self._work(lane)) for lane in self._lane_list]
+
+    async def stop(self):
+        for task in self._task_list:
+            task.cancel()
+        await asyncio.gather(*self._task_list, return_exceptions=True)
+        self._task_list = []
+
+    async def join(self):
+        '''
+        等待队列里所有消息处理完
+        '''
+        for lane in self._lane_list:
+            async with lane.cond:
+                await lane.cond.wait_for(lambda: not lane.entries and not lane.busy)
+
+    async def put(self, connection:WebSocketClientProtocol, msg:str):
+        key = self._key_func(msg) if self._key_func else None
+        lane = self._lane_list[hash(key) % len(self._lane_list)]
+        async with lane.cond:
+            if len(lane.entries) >= lane.maxsize:
+                if self._overflow == OverflowPolicy.BLOCK:
+                    await lane.cond.wait_for(lambda: len(lane.entries) < lane.maxsize)
+                elif self._overflow == OverflowPolicy.COALESCE and key in lane.latest_dict:
+                    entry = lane.latest_dict[key]
+                    entry[1] = connection
+                    entry[2] = msg
+                    self.coalesced_cnt += 1
+                    return
+                else:
+                    dropped_entry = lane.entries.popleft()
+                    self._forget(lane, dropped_entry)
+                    self.dropped_cnt += 1
+            entry = [key, connection, msg]
+            lane.entries.append(entry)
+            lane.latest_dict[key] = entry
+            lane.cond.notify_all()
+
+    async def _work(self, lane:_Lane):
+        while True:
+            async with lane.cond:
+                await lane.cond.wait_for(lambda: lane.entries)
+                entry = lane.entries.popleft()
+                self._forget(lane, entry)
+                lane.busy = True
+                lane.cond.notify_all()
+            try:
+                _, connection, msg = entry
+                await self._handler(connection, msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error_cnt += 1
+                self._report(e, entry[2])
+            finally:
+                async with lane.cond:
+                    lane.busy = False
+                    lane.cond.notify_all()
+
+    def _report(self, e:Exception, msg:str):
+        if self._on_error is None:
+            _logger.error("dispatcher handler failed on %.200s", msg, exc_info=e)
+            return
+        try:
+            self._on_error(e, msg)
+        except Exception:
+            _logger.exception("dispatcher on_error failed")
+
+    @staticmethod
+    def _forget(lane:_Lane, entry:list):
+        if lane.latest_dict.get(entry[0]) is entry:
+            del lane.latest_dict[entry[0]]
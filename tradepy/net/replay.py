@@ -0,0 +1,98 @@
+import time
+import struct
+import asyncio
+from pathlib import Path
+from typing import Iterator
+import websockets
+
+# 每一帧: 接收时间 float64, 是否二进制 uint8, 长度 uint32, 然后是内容
+_HEADER = struct.Struct('<dBI')
+
+class FrameRecorder:
+    '''
+    把 Websocket 收到的每一帧和接收时间追加写进文件, 用来离线重放
+    '''
+    def __init__(self, filepath:Path) -> None:
+        self._filepath = filepath
+        self._file = open(filepath, "ab")
+        self.frame_cnt = 0
+
+    def write(self, recv_sec:float, frame:str | bytes):
+        is_binary = isinstance(frame, bytes)
+        payload = frame if is_binary else frame.encode()
+        self._file.write(_HEADER.pack(recv_sec, is_binary, len(payload)))
+        self._file.write(payload)
+        self.frame_cnt += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_frames(filepath:Path) -> Iterator[tuple[float, str | bytes]]:
+    '''
+    按顺序返回 (接收时间, 帧), 文件最后没写完的一帧忽略
+    '''
+    with open(filepath, "rb") as file:
+        while True:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            recv_sec, is_binary, length = _HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield recv_sec, (payload if is_binary else payload.decode())
+
+
+class ReplayServer:
+    '''
+    本地 websocket 服务, 把录下来的帧按原来的时间间隔发给连上来的客户端
+    speed 是倍速, 2 就是两倍速, None 表示不等待, 尽快发送
+    客户端发来的订阅等消息都忽略, 发完之后关闭连接
+    用 Websocket(..., domain='localhost', port=server.port, use_ssl=False) 连接
+    '''
+    def __init__(self, filepath:Path, host:str='localhost', port:int=0, speed:float | None = 1.0) -> None:
+        assert speed is None or speed > 0, "speed should be positive"
+        self._filepath = filepath
+        self._host = host
+        self._port = port
+        self._speed = speed
+        self._server = None
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1] if self._server else self._port
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self._host, self._port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, connection):
+        drain_task = asyncio.create_task(self._drain(connection))
+        try:
+            first_recv_sec = None
+            start_sec = time.monotonic()
+            for recv_sec, frame in read_frames(self._filepath):
+                if first_recv_sec is None:
+                    first_recv_sec = recv_sec
+                if self._speed is not None:
+                    wait_sec = (recv_sec - first_recv_sec) / self._speed - (time.monotonic() - start_sec)
+                    if wait_sec > 0:
+                        await asyncio.sleep(wait_sec)
+                await connection.send(frame)
+            await connection.close()
+        finally:
+            drain_task.cancel()
+
+    @staticmethod
+    async def _drain(connection):
+        async for _ in connection:
+            pass
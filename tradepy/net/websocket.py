@@ -1,19 +1,98 @@
 ﻿import asyncio
 import websockets
 import ssl
+import json
+import time
+import random
 from websockets import WebSocketClientProtocol
 from . import Streamable
+from .dispatch import Dispatcher
+from .replay import FrameRecorder
+
+# 批量接收时用能找到的最快的 json 解析
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        _loads = ujson.loads
+    except ImportError:
+        _loads = json.loads
+
+class ConnectionStats:
+    def __init__(self) -> None:
+        self.connect_cnt = 0
+        self.reconnect_cnt = 0
+        self.fail_cnt = 0                                  # 连接失败或者断开的次数
+        self.stale_cnt = 0                                 # 心跳超时判定为假死的次数
+        self.last_reconnect_sec:float | None = None        # 上次从断开到重新连上用的时间
+        self.latency_sec:float | None = None               # 最近一次心跳的往返时间
+
+    def __str__(self) -> str:
+        return f"CS(conn{self.connect_cnt} reconn{self.reconnect_cnt} fail{self.fail_cnt} stale{self.stale_cnt} reconn_sec{self.last_reconnect_sec} latency{self.latency_sec})"
+
 
 class Websocket:
+    '''
+    dispatcher 为 None 时默认一个 worker + BLOCK: streamer.received 按收到的顺序串行调用, 不再是每条消息一个 task,
+    received 返回之前下一条消息不会处理, 队列满了接收也会停下来等,
+    所以 received 里不能 await 同一个连接上还没收到的回复, 否则会卡死, 需要的话在 received 里 create_task,
+    或者传一个有 key_func 和多个 worker 的 Dispatcher, 让回复分到别的 worker 上
+    '''
     def __init__(self, 
                  streamer:Streamable, 
                  auto_reconnect:bool,
                  domain:str,
-                 port:int) -> None:
+                 port:int,
+                 dispatcher:Dispatcher | None = None,
+                 batch_recv:bool=False,
+                 max_batch:int=1000,
+                 use_ssl:bool=True,
+                 backoff_base_sec:float=0.5,
+                 backoff_max_sec:float=30,
+                 heartbeat_interval_sec:float | None = 10,
+                 heartbeat_timeout_sec:float=5,
+                 recorder:FrameRecorder | None = None) -> None:
         self._domain = domain
         self._port = port
         self._streamer = streamer
         self._auto_reconnect = auto_reconnect
+        # 默认一个 worker, 按收到的顺序逐条交给 streamer.received
+        self._dispatcher = dispatcher or Dispatcher(streamer.received)
+        # batch_recv 为 True 时, 每次把连接里已经缓存的消息一次取完, 解析后交给 streamer.received_batch
+        # 处理一批的时候新消息继续在连接里缓存, 下一批会更大, 不经过 dispatcher
+        self._batch_recv = batch_recv
+        self._max_batch = max_batch
+        self.decode_error_cnt = 0
+        self._use_ssl = use_ssl
+        # 重连等待时间指数增长, 加上随机抖动, 连接稳定超过 backoff_max_sec 才重置
+        self._backoff_base_sec = backoff_base_sec
+        self._backoff_max_sec = backoff_max_sec
+        # 定时 ping, 超时没有 pong 就认为连接假死, 断开重连, None 表示不发心跳
+        self._heartbeat_interval_sec = heartbeat_interval_sec
+        self._heartbeat_timeout_sec = heartbeat_timeout_sec
+        # 订阅消息, 每次连上后在 streamer.connected 之后按顺序重新发送
+        self._subscription_dict:dict[str, None] = {}
+        self._connection:WebSocketClientProtocol | None = None
+        self.stats = ConnectionStats()
+        # 不为 None 时把收到的每一帧和接收时间录下来, 可以用 ReplayServer 重放
+        # 每批和每次断开时 flush, recorder 由调用方 close
+        self._recorder = recorder
+
+    @property
+    def dispatcher(self) -> Dispatcher:
+        return self._dispatcher
+
+    async def subscribe(self, sub_msg:str):
+        self._subscription_dict[sub_msg] = None
+        if self._connection is not None:
+            await self._connection.send(sub_msg)
+
+    async def unsubscribe(self, sub_msg:str, unsub_msg:str | None = None):
+        self._subscription_dict.pop(sub_msg, None)
+        if self._connection is not None and unsub_msg is not None:
+            await self._connection.send(unsub_msg)
 
     # def run_loop(self):
     #     asyncio.run(self._connect())
@@ -23,23 +102,119 @@ class Websocket:
         # loop.run_forever()
         
     async def connect(self):
-        url = f"wss://{self._domain}:{self._port}"
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
+        if self._use_ssl:
+            url = f"wss://{self._domain}:{self._port}"
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        else:
+            url = f"ws://{self._domain}:{self._port}"
+            ssl_context = None
+        self._dispatcher.start()
+        try:
+            await self._connect_loop(url, ssl_context)
+            # 正常结束时把已经收到的消息处理完, 被取消的话直接停
+            await self._dispatcher.join()
+        finally:
+            await self._dispatcher.stop()
+            if self._recorder is not None:
+                self._recorder.flush()
+
+    async def _connect_loop(self, url:str, ssl_context:ssl.SSLContext | None):
+        retry_cnt = 0
+        disconnected_sec = None
         while True:
             await self._streamer.will_connect()
-            async with websockets.connect(url, ssl=ssl_context, ping_interval=None) as connection:
-                await self._streamer.connected(connection)
-                try:
-                    await self._listen(connection)
-                except Exception as e:
-                    await self._streamer.closed(e)
-                finally:
-                    if not self._auto_reconnect:
-                        break
+            connected_sec = None
+            try:
+                async with websockets.connect(url, ssl=ssl_context, ping_interval=None) as connection:
+                    connected_sec = time.monotonic()
+                    self.stats.connect_cnt += 1
+                    if disconnected_sec is not None:
+                        self.stats.reconnect_cnt += 1
+                        self.stats.last_reconnect_sec = connected_sec - disconnected_sec
+                    self._connection = connection
+                    await self._streamer.connected(connection)
+                    for sub_msg in list(self._subscription_dict):
+                        await connection.send(sub_msg)
+                    heartbeat_task = asyncio.create_task(self._heartbeat(connection)) if self._heartbeat_interval_sec else None
+                    try:
+                        await self._listen(connection)
+                    finally:
+                        self._connection = None
+                        if heartbeat_task is not None:
+                            heartbeat_task.cancel()
+                        if self._recorder is not None:
+                            self._recorder.flush()
+            except Exception as e:
+                self.stats.fail_cnt += 1
+                await self._streamer.closed(e)
+            if not self._auto_reconnect:
+                break
+            if connected_sec is not None:
+                disconnected_sec = time.monotonic()
+                if disconnected_sec - connected_sec >= self._backoff_max_sec:
+                    retry_cnt = 0
+            await asyncio.sleep(self._get_backoff_sec(retry_cnt))
+            retry_cnt += 1
+
+    def _get_backoff_sec(self, retry_cnt:int) -> float:
+        backoff_sec = min(self._backoff_max_sec, self._backoff_base_sec * pow(2, retry_cnt))
+        # equal jitter, 一半固定一半随机, 避免很多客户端同时重连
+        return backoff_sec / 2 + random.uniform(0, backoff_sec / 2)
+
+    async def _heartbeat(self, connection:WebSocketClientProtocol):
+        while True:
+            await asyncio.sleep(self._heartbeat_interval_sec)
+            start_sec = time.monotonic()
+            pong_waiter = await connection.ping()
+            try:
+                await asyncio.wait_for(pong_waiter, self._heartbeat_timeout_sec)
+            except asyncio.TimeoutError:
+                self.stats.stale_cnt += 1
+                # 半开的连接 close 握手也会卡住, 直接断开传输层, recv 会马上抛异常
+                connection.transport.abort()
+                return
+            self.stats.latency_sec = time.monotonic() - start_sec
 
     async def _listen(self, connection:WebSocketClientProtocol):
+        if self._batch_recv:
+            await self._listen_batch(connection)
+            return
         while True:
             resp_jsonstr = await connection.recv()
-            asyncio.create_task(self._streamer.received(connection, resp_jsonstr))
+            if self._recorder is not None:
+                self._recorder.write(time.time(), resp_jsonstr)
+            await self._dispatcher.put(connection, resp_jsonstr)
+
+    async def _listen_batch(self, connection:WebSocketClientProtocol):
+        while True:
+            resp_jsonstr_list = [await connection.recv()]
+            if self._recorder is not None:
+                self._recorder.write(time.time(), resp_jsonstr_list[-1])
+            # 已经缓存的消息 recv 会直接返回, 不会挂起
+            while len(resp_jsonstr_list) < self._max_batch and _get_buffered_cnt(connection):
+                resp_jsonstr_list.append(await connection.recv())
+                # 每一帧 recv 之后马上记时间, 重放时才能还原一批里面的先后间隔
+                if self._recorder is not None:
+                    self._recorder.write(time.time(), resp_jsonstr_list[-1])
+            if self._recorder is not None:
+                self._recorder.flush()
+            msg_list = []
+            for resp_jsonstr in resp_jsonstr_list:
+                try:
+                    msg_list.append(_loads(resp_jsonstr))
+                except ValueError:
+                    self.decode_error_cnt += 1
+            if msg_list:
+                await self._streamer.received_batch(connection, msg_list)
+
+
+def _get_buffered_cnt(connection:WebSocketClientProtocol) -> int:
+    # legacy 的连接用 messages 缓存完整的消息, 新版的连接用 recv_messages.frames 缓存 frame
+    messages = getattr(connection, 'messages', None)
+    if messages is not None:
+        return len(messages)
+    frames = getattr(getattr(connection, 'recv_messages', None), 'frames', None)
+    return len(frames) if frames is not None else 0
+